@@ -0,0 +1,305 @@
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import AsyncIterator, Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from agent.rate_limiter import is_fatal_api_error
+from agent.run_journal import RunJournal
+from agent.schemas import Finding, VulnerabilityAnalysis
+from agent.security_agent import SecurityValidationAgent
+from tools.context_builder import estimate_tokens
+from tools.source_index import get_source_index
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GROUP_TOKENS = 8000
+
+# Tokens estimados por hallazgo dentro de un grupo (datos del hallazgo, evidencia y veredicto)
+FINDING_TOKENS = 600
+
+
+class BatchResult(NamedTuple):
+    index: int
+    finding: Finding
+    analysis: Optional[VulnerabilityAnalysis]
+    error: Optional[BaseException]
+
+
+def analyze_finding(
+    agent: SecurityValidationAgent,
+    finding: Finding,
+    journal: Optional[RunJournal] = None,
+) -> VulnerabilityAnalysis:
+    """
+    Analiza un único hallazgo con el agente. Con journal, un hallazgo ya completado en
+    una ejecución anterior se devuelve sin analizar y cada análisis nuevo se registra.
+    """
+    if journal is not None:
+        analysis = journal.completed(finding)
+        if analysis is not None:
+            return analysis
+    analysis = agent.analyze_vulnerability(
+        vulnerability_id=finding.id,
+        file_path=finding.file_path,
+        vulnerability_type=finding.vulnerability_type,
+        source_line=finding.source_line,
+        sink_line=finding.sink_line,
+        message=finding.message,
+    )
+    if journal is not None:
+        journal.record(finding, analysis)
+    return analysis
+
+
+def _run_inline(
+    agent: SecurityValidationAgent,
+    index: int,
+    finding: Finding,
+    journal: Optional[RunJournal] = None,
+) -> BatchResult:
+    try:
+        return BatchResult(index, finding, analyze_finding(agent, finding, journal), None)
+    except Exception as e:
+        return BatchResult(index, finding, None, e)
+
+
+def _collect(entry: Tuple[int, Finding, Future]) -> BatchResult:
+    index, finding, future = entry
+    try:
+        return BatchResult(index, finding, future.result(), None)
+    except Exception as e:
+        return BatchResult(index, finding, None, e)
+
+
+def iter_batch_results(
+    agent: SecurityValidationAgent,
+    findings: Iterable[Finding],
+    workers: int = 1,
+    journal: Optional[RunJournal] = None,
+) -> Iterator[BatchResult]:
+    """
+    Analiza los hallazgos con un pool acotado de hilos y devuelve los resultados
+    en el mismo orden de entrada.
+
+    Un fallo en un hallazgo se devuelve como BatchResult con error y no detiene
+    al resto. Como mucho se mantienen 2 * workers hallazgos pendientes, por lo que
+    la entrada puede ser un generador arbitrariamente grande. Con journal se omiten
+    los hallazgos ya completados (ver RunJournal).
+    """
+    if workers <= 1:
+        for index, finding in enumerate(findings):
+            yield _run_inline(agent, index, finding, journal)
+        return
+
+    window: Deque[Tuple[int, Finding, Future]] = deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for index, finding in enumerate(findings):
+            window.append((index, finding, pool.submit(analyze_finding, agent, finding, journal)))
+            if len(window) >= workers * 2:
+                yield _collect(window.popleft())
+
+        while window:
+            yield _collect(window.popleft())
+
+
+def _finding_cost(finding: Finding) -> int:
+    try:
+        index = get_source_index(finding.file_path)
+    except (OSError, UnicodeDecodeError):
+        return FINDING_TOKENS
+    cost = FINDING_TOKENS
+    spans = {index.function_span(line) for line in (finding.source_line, finding.sink_line)}
+    for span in spans:
+        if span is not None:
+            cost += estimate_tokens(index.slice(span.start_line, span.end_line))
+    return cost
+
+
+def order_by_file(findings: Iterable[Finding]) -> Iterator[Finding]:
+    """
+    Reordena los hallazgos para que los de un mismo archivo sean consecutivos (orden
+    estable: archivos por primera aparición y, dentro de cada uno, orden de entrada).
+    Así cada archivo se parsea una vez y su índice se reutiliza mientras está en caché.
+    La entrada se materializa al pedir el primer hallazgo.
+    """
+    by_file: "OrderedDict[str, List[Finding]]" = OrderedDict()
+    for finding in findings:
+        by_file.setdefault(finding.file_path, []).append(finding)
+    for entries in by_file.values():
+        yield from entries
+
+
+def group_findings(findings: Iterable[Finding], max_tokens: int = DEFAULT_GROUP_TOKENS) -> List[List[Tuple[int, Finding]]]:
+    """
+    Agrupa los hallazgos por archivo fuente sin superar max_tokens estimados por grupo.
+    Cada elemento conserva su índice de entrada; un mismo id no se repite en un grupo.
+    """
+    by_file: "OrderedDict[str, List[Tuple[int, Finding]]]" = OrderedDict()
+    for index, finding in enumerate(findings):
+        by_file.setdefault(finding.file_path, []).append((index, finding))
+
+    groups: List[List[Tuple[int, Finding]]] = []
+    for entries in by_file.values():
+        current: List[Tuple[int, Finding]] = []
+        current_ids: Set[str] = set()
+        used = 0
+        for index, finding in entries:
+            cost = _finding_cost(finding)
+            if current and (used + cost > max_tokens or finding.id in current_ids):
+                groups.append(current)
+                current, current_ids, used = [], set(), 0
+            current.append((index, finding))
+            current_ids.add(finding.id)
+            used += cost
+        if current:
+            groups.append(current)
+    return groups
+
+
+def _run_group(
+    agent: SecurityValidationAgent,
+    group: List[Tuple[int, Finding]],
+    journal: Optional[RunJournal] = None,
+) -> List[BatchResult]:
+    results = []
+    if journal is not None:
+        pending = []
+        for index, finding in group:
+            analysis = journal.completed(finding)
+            if analysis is not None:
+                results.append(BatchResult(index, finding, analysis, None))
+            else:
+                pending.append((index, finding))
+        group = pending
+        if not group:
+            return results
+
+    findings = [finding for _, finding in group]
+    checked = True
+    try:
+        analyses = agent.analyze_vulnerability_group(findings)
+    except Exception as e:
+        if is_fatal_api_error(e):
+            # Repetirlo en N peticiones individuales solo multiplicaría el mismo error
+            raise
+        logger.warning(
+            f"Análisis de grupo fallido para {len(findings)} hallazgos de {findings[0].file_path}: {e}. "
+            "Se analizan de forma individual."
+        )
+        analyses = [None] * len(findings)
+        checked = False
+
+    for (index, finding), analysis in zip(group, analyses):
+        if analysis is None:
+            # Veredicto omitido o inválido en la respuesta de grupo: análisis individual. Si
+            # el grupo llegó al LLM, caché, reporte anterior y pre-triage ya se consultaron
+            try:
+                if checked:
+                    analysis = agent.reanalyze_with_llm(finding)
+                else:
+                    analysis = analyze_finding(agent, finding)
+            except Exception as e:
+                results.append(BatchResult(index, finding, None, e))
+                continue
+        if journal is not None:
+            journal.record(finding, analysis)
+        results.append(BatchResult(index, finding, analysis, None))
+    return results
+
+
+def iter_grouped_batch_results(
+    agent: SecurityValidationAgent,
+    findings: Iterable[Finding],
+    workers: int = 1,
+    max_group_tokens: int = DEFAULT_GROUP_TOKENS,
+    journal: Optional[RunJournal] = None,
+) -> Iterator[BatchResult]:
+    """
+    Variante de iter_batch_results que envía los hallazgos de un mismo archivo en una
+    sola petición por grupo (ver group_findings). Los resultados se devuelven en orden
+    de entrada; a diferencia del modo individual, la entrada se materializa para agrupar.
+
+    Un grupo fallido se reintenta hallazgo a hallazgo, salvo ante errores de la API que
+    afectan a cualquier petición (credenciales, cuota): esos se propagan y se cancelan
+    los grupos pendientes.
+    """
+    groups = group_findings(findings, max_group_tokens)
+    ready: Dict[int, BatchResult] = {}
+    next_index = 0
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [pool.submit(_run_group, agent, group, journal) for group in groups]
+        for future in as_completed(futures):
+            try:
+                group_results = future.result()
+            except Exception:
+                for pending in futures:
+                    pending.cancel()
+                raise
+            for result in group_results:
+                ready[result.index] = result
+            while next_index in ready:
+                yield ready.pop(next_index)
+                next_index += 1
+
+
+async def analyze_finding_async(
+    agent: SecurityValidationAgent,
+    finding: Finding,
+    journal: Optional[RunJournal] = None,
+) -> VulnerabilityAnalysis:
+    """Analiza un único hallazgo con el cliente asíncrono del agente (journal: ver analyze_finding)."""
+    if journal is not None:
+        analysis = journal.completed(finding)
+        if analysis is not None:
+            return analysis
+    analysis = await agent.analyze_vulnerability_async(
+        vulnerability_id=finding.id,
+        file_path=finding.file_path,
+        vulnerability_type=finding.vulnerability_type,
+        source_line=finding.source_line,
+        sink_line=finding.sink_line,
+        message=finding.message,
+    )
+    if journal is not None:
+        journal.record(finding, analysis)
+    return analysis
+
+
+async def _run_async(
+    agent: SecurityValidationAgent,
+    index: int,
+    finding: Finding,
+    journal: Optional[RunJournal] = None,
+) -> BatchResult:
+    try:
+        return BatchResult(index, finding, await analyze_finding_async(agent, finding, journal), None)
+    except Exception as e:
+        return BatchResult(index, finding, None, e)
+
+
+async def iter_batch_results_async(
+    agent: SecurityValidationAgent,
+    findings: Iterable[Finding],
+    concurrency: int = 32,
+    journal: Optional[RunJournal] = None,
+) -> AsyncIterator[BatchResult]:
+    """
+    Analiza los hallazgos sobre un único event loop y devuelve cada resultado en
+    cuanto termina (no en orden de entrada; usar BatchResult.index para reordenar).
+
+    Se mantienen como mucho `concurrency` análisis en curso a la vez.
+    """
+    pending: Set[asyncio.Task] = set()
+    for index, finding in enumerate(findings):
+        pending.add(asyncio.create_task(_run_async(agent, index, finding, journal)))
+        if len(pending) >= concurrency:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            yield task.result()
@@ -0,0 +1,147 @@
+import ast
+import os
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from agent.batch import BatchResult
+from agent.schemas import Finding, VulnerabilityAnalysis
+from tools.rule_catalog import normalize_type
+from tools.source_index import SourceIndex, get_source_index
+
+ClusterKey = Tuple
+
+
+def _statement_calls(statement: ast.stmt) -> Iterator[ast.Call]:
+    """Llamadas de la propia sentencia, sin entrar en sentencias anidadas (cuerpos de def, if...)."""
+    pending: List[ast.AST] = list(ast.iter_child_nodes(statement))
+    while pending:
+        node = pending.pop()
+        if isinstance(node, ast.stmt):
+            continue
+        if isinstance(node, ast.Call):
+            yield node
+        pending.extend(ast.iter_child_nodes(node))
+
+
+def _sink_node(index: SourceIndex, sink_line: int) -> Tuple:
+    """
+    Posición del nodo sink: la llamada más externa de la sentencia que cubre la línea.
+    Así, un mismo sink reportado en distintas líneas de una llamada multilínea da la
+    misma clave. Sin llamada se usa la sentencia y, sin AST, la propia línea.
+    """
+    statement = index.statement_at(sink_line)
+    if statement is None:
+        return ("line", sink_line)
+    calls = list(_statement_calls(statement))
+    covering = [call for call in calls if call.lineno <= sink_line <= (call.end_lineno or call.lineno)]
+    candidates = covering or calls
+    if not candidates:
+        return ("stmt", statement.lineno, statement.col_offset)
+    # La que empieza antes y, a igual inicio, la que termina después (p. ej. a.b(x).c())
+    outermost = min(
+        candidates,
+        key=lambda call: (call.lineno, call.col_offset, -(call.end_lineno or call.lineno), -(call.end_col_offset or 0)),
+    )
+    return ("call", outermost.lineno, outermost.col_offset, outermost.end_lineno, outermost.end_col_offset)
+
+
+def finding_key(finding: Finding) -> ClusterKey:
+    """
+    Clave normalizada de un hallazgo: (archivo, función contenedora, nodo sink, tipo).
+    Dos hallazgos con la misma clave describen el mismo flujo hacia el mismo sink. El
+    tipo se normaliza con el catálogo ("SQL Injection" y "py/sql-injection" coinciden).
+    """
+    vulnerability_type = normalize_type(" ".join(finding.vulnerability_type.split()))
+    path = os.path.realpath(finding.file_path)
+    try:
+        index = get_source_index(finding.file_path)
+    except OSError:
+        return (path, None, ("line", finding.sink_line), vulnerability_type)
+    span = index.function_span(finding.sink_line)
+    function = span.qualname if span is not None else None
+    return (path, function, _sink_node(index, finding.sink_line), vulnerability_type)
+
+
+class _Cluster:
+    __slots__ = ("members", "result")
+
+    def __init__(self):
+        self.members: List[Tuple[int, Finding]] = []
+        self.result: Optional[BatchResult] = None
+
+
+def _fan_out(result: BatchResult, index: int, finding: Finding) -> BatchResult:
+    """Resultado del representante aplicado a un miembro del clúster: su id y sus líneas."""
+    if result.error is not None:
+        return BatchResult(index, finding, None, result.error)
+    analysis: VulnerabilityAnalysis = result.analysis.model_copy(update={"id": finding.id}, deep=True)
+    analysis.trace.source_line, analysis.trace.sink_line = finding.source_line, finding.sink_line
+    return BatchResult(index, finding, analysis, None)
+
+
+class FindingDeduplicator:
+    """
+    Agrupa los hallazgos equivalentes (ver finding_key) antes del análisis: solo el
+    primero de cada clúster se analiza y su veredicto se replica al resto de miembros
+    con su propio id y sus líneas de source y sink. Cuenta hallazgos y clústeres para informar del ratio de duplicados.
+    """
+
+    def __init__(self, key: Callable[[Finding], ClusterKey] = finding_key):
+        self.key = key
+        self.total = 0
+        self._clusters: Dict[ClusterKey, _Cluster] = {}
+
+    @property
+    def clusters(self) -> int:
+        return len(self._clusters)
+
+    @property
+    def duplicates(self) -> int:
+        return self.total - self.clusters
+
+    @property
+    def ratio(self) -> float:
+        """Fracción de hallazgos que no requirieron análisis propio."""
+        return self.duplicates / self.total if self.total else 0.0
+
+    def iter_results(
+        self,
+        findings: Iterable[Finding],
+        run: Callable[[Iterable[Finding]], Iterator[BatchResult]],
+    ) -> Iterator[BatchResult]:
+        """
+        Envía a run (p. ej. iter_batch_results) solo los representantes de cada clúster
+        y devuelve un BatchResult por hallazgo de entrada, con su índice original. Cada
+        duplicado se devuelve en cuanto su representante tiene resultado, por lo que el
+        orden de salida puede diferir del de entrada.
+        """
+        representatives: List[_Cluster] = []
+        ready: Deque[BatchResult] = deque()
+
+        def unique_findings() -> Iterator[Finding]:
+            for index, finding in enumerate(findings):
+                self.total += 1
+                cluster_key = self.key(finding)
+                cluster = self._clusters.get(cluster_key)
+                if cluster is None:
+                    cluster = self._clusters[cluster_key] = _Cluster()
+                    cluster.members.append((index, finding))
+                    representatives.append(cluster)
+                    yield finding
+                elif cluster.result is not None:
+                    ready.append(_fan_out(cluster.result, index, finding))
+                else:
+                    cluster.members.append((index, finding))
+
+        for result in run(unique_findings()):
+            while ready:
+                yield ready.popleft()
+            cluster = representatives[result.index]
+            (index, finding), duplicates = cluster.members[0], cluster.members[1:]
+            cluster.result = result
+            cluster.members = []
+            yield BatchResult(index, finding, result.analysis, result.error)
+            for member_index, member in duplicates:
+                yield _fan_out(result, member_index, member)
+        while ready:
+            yield ready.popleft()
@@ -0,0 +1,303 @@
+import json
+import logging
+import os
+import re
+import subprocess
+import threading
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from pydantic import ValidationError
+
+from agent.schemas import VulnerabilityAnalysis
+from ingestion.json_stream import JsonStream
+from tools.rule_catalog import normalize_type
+from tools.source_index import get_source_index
+from tools.taint_engine import get_taint_engine
+
+logger = logging.getLogger(__name__)
+
+LineRange = Tuple[int, int]
+
+_HUNK = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+class Hunk(NamedTuple):
+    old_start: int
+    old_count: int
+    new_start: int
+    new_count: int
+
+    @property
+    def new_range(self) -> LineRange:
+        """Líneas cambiadas del lado nuevo. Un borrado puro se marca en la línea anterior al hueco."""
+        if self.new_count == 0:
+            return (max(self.new_start, 1), max(self.new_start, 1))
+        return (self.new_start, self.new_start + self.new_count - 1)
+
+
+# Marca de archivo nuevo o sin seguimiento: todas sus líneas cuentan como cambiadas
+WHOLE_FILE: List[Hunk] = [Hunk(0, 0, 1, 10**9)]
+
+
+def parse_unified_diff(diff_text: str) -> Dict[str, List[Hunk]]:
+    """
+    Hunks por archivo de un diff unificado generado con --unified=0, con la ruta del
+    lado nuevo. Los archivos borrados se omiten.
+    """
+    changed: Dict[str, List[Hunk]] = {}
+    current: Optional[str] = None
+    for line in diff_text.splitlines():
+        if line.startswith("+++ "):
+            path = line[4:].strip().strip('"')
+            if path == "/dev/null":
+                current = None
+                continue
+            current = path[2:] if path.startswith("b/") else path
+            changed.setdefault(current, [])
+        elif line.startswith("@@") and current is not None:
+            match = _HUNK.match(line)
+            if match is None:
+                continue
+            old_start, old_count, new_start, new_count = match.groups()
+            changed[current].append(
+                Hunk(
+                    int(old_start),
+                    int(old_count) if old_count is not None else 1,
+                    int(new_start),
+                    int(new_count) if new_count is not None else 1,
+                )
+            )
+    return changed
+
+
+def old_line(hunks: List[Hunk], line: int) -> Optional[int]:
+    """Número de línea en la revisión anterior de una línea no cambiada; None si está en un hunk."""
+    delta = 0
+    for hunk in hunks:
+        if hunk.new_count == 0:
+            # Borrado puro: las líneas eliminadas estaban tras new_start
+            if hunk.new_start < line:
+                delta += hunk.old_count
+        elif hunk.new_start + hunk.new_count - 1 < line:
+            delta += hunk.old_count - hunk.new_count
+        elif hunk.new_start <= line:
+            return None
+    return line + delta
+
+
+def _git(repo_dir: str, *args: str) -> str:
+    try:
+        completed = subprocess.run(
+            ["git", "-c", "core.quotePath=false", *args],
+            cwd=repo_dir,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except FileNotFoundError as e:
+        raise ValueError("git no está disponible") from e
+    except subprocess.CalledProcessError as e:
+        raise ValueError(f"git {' '.join(args)} falló: {e.stderr.strip()}") from e
+    return completed.stdout
+
+
+def git_changed_lines(since: str, repo_dir: str = ".") -> Dict[str, List[Hunk]]:
+    """
+    Hunks del árbol de trabajo respecto a la revisión since, por ruta real. Los
+    archivos sin seguimiento cuentan como cambiados por completo.
+    """
+    top_level = _git(repo_dir, "rev-parse", "--show-toplevel").strip()
+    diff = _git(repo_dir, "diff", "--unified=0", "--no-color", "--no-ext-diff", since, "--")
+    changed = {
+        os.path.realpath(os.path.join(top_level, path)): hunks
+        for path, hunks in parse_unified_diff(diff).items()
+    }
+    for path in _git(repo_dir, "ls-files", "--others", "--exclude-standard", "--full-name").splitlines():
+        if path:
+            changed[os.path.realpath(os.path.join(top_level, path))] = WHOLE_FILE
+    return changed
+
+
+class PreviousVerdict(NamedTuple):
+    analysis: VulnerabilityAnalysis
+    # Tipo del hallazgo guardado junto al análisis; None en reportes que no lo incluyen
+    vulnerability_type: Optional[str]
+
+
+def load_previous_verdicts(path: str) -> List[PreviousVerdict]:
+    """Veredictos de un reporte anterior (JSON o JSONL), con el tipo de su hallazgo."""
+    verdicts: List[PreviousVerdict] = []
+
+    def add(item):
+        try:
+            vulnerability_type = item.get("vulnerability_type") if isinstance(item, dict) else None
+            verdicts.append(PreviousVerdict(VulnerabilityAnalysis(**item), vulnerability_type))
+        except (TypeError, ValidationError) as e:
+            logger.warning(f"Veredicto inválido en {path}, se ignora: {e}")
+
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    add(json.loads(line))
+            return verdicts
+        stream = JsonStream(f)
+        if stream.peek() == "[":
+            for item in stream.iter_items():
+                add(item)
+        elif stream.peek():
+            add(stream.read_value())
+    return verdicts
+
+
+def _same_file(recorded: str, file_path: str) -> bool:
+    """Indica si la ruta guardada en la traza de un veredicto designa file_path."""
+    current = os.path.realpath(file_path)
+    if os.path.isabs(recorded):
+        return os.path.realpath(recorded) == current
+    recorded = os.path.normpath(recorded)
+    return current == os.path.realpath(recorded) or current.endswith(os.sep + recorded)
+
+
+class IncrementalPlan:
+    """
+    Decide qué hallazgos hay que re-analizar tras un cambio de código.
+
+    Un hallazgo se considera tocado si alguna línea cambiada cae en la función que
+    contiene su source o su sink, en una función que la anida o en una función del
+    mismo archivo a la que llama (directa o indirectamente, según el grafo de llamadas
+    del motor de taint). Los cambios a nivel de módulo o de cuerpo de clase (imports,
+    constantes, atributos) pueden alterar cualquier flujo del archivo y marcan como
+    tocados todos sus hallazgos. Los cambios en funciones de otros archivos no se
+    siguen.
+
+    Un hallazgo no tocado reutiliza el veredicto anterior del mismo tipo de
+    vulnerabilidad (normalizado con el catálogo) cuya traza está en el mismo archivo y
+    en las mismas líneas de source y sink, trasladadas a la revisión anterior con los
+    hunks del diff. Los ids no se usan para emparejar: SARIF sin guid y JSON sin id
+    numeran los hallazgos por posición. Si no hay exactamente un veredicto así, o el
+    reporte anterior no guarda el tipo, el hallazgo se analiza.
+    """
+
+    def __init__(self, changed: Dict[str, List[Hunk]], previous: Iterable[PreviousVerdict]):
+        self.changed = changed
+        self.previous: Dict[Tuple[int, int], List[PreviousVerdict]] = {}
+        for verdict in previous:
+            trace = verdict.analysis.trace
+            self.previous.setdefault((trace.source_line, trace.sink_line), []).append(verdict)
+        self.reused = 0
+        self.touched = 0
+        self.unknown = 0
+        self._files: Dict[str, Tuple[bool, Set[str]]] = {}
+        self._lock = threading.Lock()
+
+    def _file_changes(self, path: str, hunks: List[Hunk]) -> Tuple[bool, Set[str]]:
+        """(cambio a nivel de módulo, funciones afectadas por el cambio) de un archivo."""
+        with self._lock:
+            cached = self._files.get(path)
+        if cached is not None:
+            return cached
+
+        index = get_source_index(path)
+        module_level = False
+        changed: Set[str] = set()
+        for hunk in hunks:
+            start, end = hunk.new_range
+            for line_number in range(start, min(end, index.line_count) + 1):
+                text = index.line(line_number).strip()
+                if not text or text.startswith("#"):
+                    continue
+                span = index.function_span(line_number)
+                if span is None:
+                    module_level = True
+                    break
+                changed.update(scope.qualname for scope in self._function_chain(index, span))
+            if module_level:
+                break
+
+        affected = set() if module_level else self._callers(path, changed)
+        result = (module_level, affected)
+        with self._lock:
+            self._files[path] = result
+        return result
+
+    @staticmethod
+    def _callers(path: str, functions: Set[str]) -> Set[str]:
+        """Las funciones dadas y todas las del archivo que las llaman, directa o indirectamente."""
+        callers: Dict[str, Set[str]] = {}
+        for caller, callees in get_taint_engine(path).call_graph.items():
+            for callee in callees:
+                callers.setdefault(callee, set()).add(caller)
+        affected = set(functions)
+        queue = deque(functions)
+        while queue:
+            for caller in callers.get(queue.popleft(), ()):
+                if caller not in affected:
+                    affected.add(caller)
+                    queue.append(caller)
+        return affected
+
+    @staticmethod
+    def _function_chain(index, span) -> Iterable:
+        """La función y todas las funciones que la contienen."""
+        while span is not None:
+            if span.kind == "function":
+                yield span
+            span = index.scopes[span.parent] if span.parent is not None else None
+
+    def is_touched(self, file_path: str, lines: Iterable[int]) -> bool:
+        hunks = self.changed.get(os.path.realpath(file_path))
+        if hunks is None:
+            return False
+        try:
+            module_level, affected = self._file_changes(file_path, hunks)
+            index = get_source_index(file_path)
+        except OSError:
+            return True
+        if module_level:
+            return True
+        for line_number in lines:
+            span = index.function_span(line_number)
+            if span is None:
+                return True
+            # Un cambio en una función contenedora puede alterar las variables capturadas
+            if any(scope.qualname in affected for scope in self._function_chain(index, span)):
+                return True
+        return False
+
+    def _previous_at(
+        self, file_path: str, vulnerability_type: str, source_line: int, sink_line: int
+    ) -> Optional[VulnerabilityAnalysis]:
+        hunks = self.changed.get(os.path.realpath(file_path), [])
+        old_source, old_sink = old_line(hunks, source_line), old_line(hunks, sink_line)
+        if old_source is None or old_sink is None:
+            return None
+        key = normalize_type(vulnerability_type)
+        candidates = [
+            verdict.analysis for verdict in self.previous.get((old_source, old_sink), [])
+            if verdict.vulnerability_type is not None
+            and normalize_type(verdict.vulnerability_type) == key
+            and _same_file(verdict.analysis.trace.file, file_path)
+        ]
+        return candidates[0] if len(candidates) == 1 else None
+
+    def prior_verdict(
+        self, vulnerability_id: str, file_path: str, vulnerability_type: str, source_line: int, sink_line: int
+    ) -> Optional[VulnerabilityAnalysis]:
+        """Veredicto anterior reutilizable (con el id actual), o None si el hallazgo hay que analizarlo."""
+        if self.is_touched(file_path, (source_line, sink_line)):
+            with self._lock:
+                self.touched += 1
+            return None
+        analysis = self._previous_at(file_path, vulnerability_type, source_line, sink_line)
+        with self._lock:
+            if analysis is None:
+                self.unknown += 1
+            else:
+                self.reused += 1
+        if analysis is None:
+            return None
+        reused = analysis.model_copy(update={"id": vulnerability_id}, deep=True)
+        reused.trace.source_line, reused.trace.sink_line = source_line, sink_line
+        return reused
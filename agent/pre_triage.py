@@ -0,0 +1,235 @@
+import ast
+import logging
+import threading
+from typing import List, NamedTuple, Optional, Set
+
+from agent.schemas import SanitizerInfo, TracePath, VulnerabilityAnalysis
+from tools.rule_catalog import normalize_type
+from tools.sink_resolution import SinkCallAnalysis, analyze_sink_calls
+from tools.taint_engine import MODULE_SCOPE, TaintEngine, get_taint_engine
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PRE_TRIAGE_THRESHOLD = 0.9
+
+# Severidad asignada a un True Positive determinista según el tipo de vulnerabilidad
+SEVERITY_BY_TYPE = {
+    "command injection": "Critical",
+    "sql injection": "High",
+    "ssrf": "High",
+    "xss": "Medium",
+}
+
+# Confianza de cada regla de decisión
+CONFIDENCE_CONSTANT_ARG = 0.99
+CONFIDENCE_PARAMETERIZED = 0.95
+CONFIDENCE_LIST_ARGS = 0.92
+CONFIDENCE_SANITIZED = 0.85
+CONFIDENCE_NO_FLOW = 0.8
+# Por debajo del umbral por defecto: un True Positive solo evita el LLM si se baja
+# --pre-triage-threshold de forma explícita
+CONFIDENCE_DIRECT_FLOW = 0.8
+
+# Conversiones que, aplicadas al dato, pueden neutralizar la inyección (p. ej. n = int(n))
+CAST_CALLS = {"int", "float", "bool", "complex", "ord", "len", "abs", "round"}
+
+
+class PreTriageDecision(NamedTuple):
+    analysis: VulnerabilityAnalysis
+    confidence: float
+    rule: str
+
+
+def _false_positive_rule(call: SinkCallAnalysis) -> Optional[tuple]:
+    """Motivo y confianza por los que una llamada sink concreta no es explotable, o None."""
+    if call.dangerous_is_constant:
+        return "constant_argument", CONFIDENCE_CONSTANT_ARG, f"el argumento peligroso de '{call.call}' es una constante"
+    if call.parameterized and not call.tainted:
+        return "parameterized_query", CONFIDENCE_PARAMETERIZED, f"'{call.call}' usa una consulta parametrizada y el texto SQL no recibe datos del source"
+    if call.list_args and not call.shell:
+        return "subprocess_list_args", CONFIDENCE_LIST_ARGS, f"'{call.call}' recibe una lista de argumentos sin shell=True"
+    if call.sanitized_by:
+        return "sanitized", CONFIDENCE_SANITIZED, f"el flujo hacia '{call.call}' pasa por {', '.join(call.sanitized_by)}"
+    if not call.tainted:
+        return "no_flow", CONFIDENCE_NO_FLOW, f"ningún dato del source alcanza el argumento peligroso de '{call.call}'"
+    return None
+
+
+def _loaded_names(node: ast.AST) -> Set[str]:
+    return {n.id for n in ast.walk(node) if isinstance(n, ast.Name) and isinstance(n.ctx, ast.Load)}
+
+
+def _exits(body: List[ast.stmt]) -> bool:
+    return any(isinstance(stmt, (ast.Return, ast.Raise, ast.Break, ast.Continue)) for stmt in body)
+
+
+def _ambiguous_flow(engine: TaintEngine, source_line: int, sink_line: int, path: List[str]) -> Optional[str]:
+    """
+    Motivo por el que un flujo directo no es concluyente: una variable del camino se
+    reasigna a partir de sí misma, pasa por una conversión de tipo o aparece en una
+    condición de guarda que corta la ejecución (allowlist, regex, assert) antes del sink.
+    """
+    names = {entry.split(":")[-1] for entry in path if "()" not in entry}
+    span = engine.index.function_span(sink_line)
+    root = span.node if span is not None else engine.index.tree
+    first_line = span.start_line if span is not None else min(source_line, sink_line)
+    sink_statement = engine.index.statement_at(sink_line)
+    last_line = sink_statement.lineno if sink_statement is not None else sink_line
+
+    for node in ast.walk(root):
+        if isinstance(node, ast.Call):
+            if (
+                isinstance(node.func, ast.Name)
+                and node.func.id in CAST_CALLS
+                and first_line <= node.lineno <= sink_line
+                and names & {n for arg in node.args for n in _loaded_names(arg)}
+            ):
+                return f"conversión {node.func.id}() sobre el dato"
+            continue
+        if not isinstance(node, ast.stmt) or not first_line <= node.lineno < last_line:
+            continue
+        if isinstance(node, (ast.Assign, ast.AnnAssign)) and node.value is not None:
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            stored = {n.id for t in targets for n in ast.walk(t) if isinstance(n, ast.Name)}
+            reassigned = names & stored & _loaded_names(node.value)
+            if reassigned:
+                return f"reasignación de '{sorted(reassigned)[0]}' en la línea {node.lineno}"
+        elif isinstance(node, (ast.If, ast.While)) and names & _loaded_names(node.test):
+            if _exits(node.body) or _exits(node.orelse):
+                return f"condición de guarda en la línea {node.lineno}"
+        elif isinstance(node, ast.Assert) and names & _loaded_names(node.test):
+            return f"assert en la línea {node.lineno}"
+        elif isinstance(node, ast.Try) and any(_exits(handler.body) for handler in node.handlers):
+            if names & {n for stmt in node.body for n in _loaded_names(stmt)}:
+                return f"validación con try/except en la línea {node.lineno}"
+    return None
+
+
+def pre_triage(
+    vulnerability_id: str,
+    file_path: str,
+    vulnerability_type: str,
+    source_line: int,
+    sink_line: int,
+) -> Optional[PreTriageDecision]:
+    """
+    Clasifica de forma determinista un hallazgo evidente a partir del motor de taint y
+    de la resolución AST de sinks y sanitizers. Devuelve None si el caso es ambiguo
+    (sink no resuelto, source sin variables, resultados mixtos, o un flujo directo con
+    reasignaciones, conversiones o guardas sobre sus variables) y debe ir al LLM.
+    """
+    try:
+        engine = get_taint_engine(file_path)
+    except (OSError, UnicodeDecodeError):
+        return None
+    if engine.index.tree is None or not engine.seeds_at(source_line):
+        return None
+
+    calls = analyze_sink_calls(file_path, sink_line, vulnerability_type, source_line=source_line)
+    if not calls:
+        return None
+
+    scope = engine.scope_at(sink_line)
+    function = scope if scope != MODULE_SCOPE else "<module>"
+
+    tainted = [c for c in calls if c.tainted and not (c.list_args and not c.shell)]
+    if tainted:
+        call = tainted[0]
+        reason = _ambiguous_flow(engine, source_line, sink_line, call.path)
+        if reason is not None:
+            logger.debug(f"Pre-triage: flujo directo no concluyente para {vulnerability_id} ({reason})")
+            return None
+        analysis = VulnerabilityAnalysis(
+            id=vulnerability_id,
+            classification="True Positive",
+            severity=SEVERITY_BY_TYPE.get(normalize_type(vulnerability_type), "High"),
+            trace=TracePath(
+                file=file_path,
+                function=function,
+                source_line=source_line,
+                sink_line=sink_line,
+                flow=call.path,
+            ),
+            sanitizers=[],
+            assumptions=[
+                f"El valor de la línea {source_line} es controlado por el usuario, como indica el hallazgo SAST.",
+                "No existen validaciones externas al archivo analizado.",
+            ],
+            justification=(
+                f"Clasificación determinista (pre-triage): la llamada '{call.call}' de la línea {call.line} "
+                f"es un sink de {vulnerability_type} y su argumento peligroso recibe datos del source sin "
+                f"pasar por ningún sanitizer. Flujo: {' -> '.join(call.path)}."
+            ),
+        )
+        return PreTriageDecision(analysis, CONFIDENCE_DIRECT_FLOW, "direct_flow")
+
+    reasons = [_false_positive_rule(c) for c in calls]
+    if any(r is None for r in reasons):
+        return None
+
+    rule, confidence, _ = min(reasons, key=lambda r: r[1])
+    sanitizers: List[SanitizerInfo] = [
+        SanitizerInfo(
+            name=name,
+            line=call.line,
+            sufficient=True,
+            explanation=f"Protege el argumento peligroso de '{call.call}'.",
+        )
+        for call in calls for name in call.sanitized_by
+    ]
+    explanation = "; ".join(r[2] for r in reasons)
+    analysis = VulnerabilityAnalysis(
+        id=vulnerability_id,
+        classification="False Positive",
+        severity="Low",
+        trace=TracePath(
+            file=file_path,
+            function=function,
+            source_line=source_line,
+            sink_line=sink_line,
+            flow=calls[0].path,
+        ),
+        sanitizers=sanitizers,
+        assumptions=["El análisis se limita al archivo indicado en el hallazgo."],
+        justification=f"Clasificación determinista (pre-triage): {explanation}.",
+        counterexample=f"Cualquier valor en la línea {source_line} deja intacta la llamada de la línea {sink_line}: {explanation}.",
+    )
+    return PreTriageDecision(analysis, confidence, rule)
+
+
+class PreTriage:
+    """Etapa de pre-clasificación con umbral de confianza y contadores de uso."""
+
+    def __init__(self, threshold: float = DEFAULT_PRE_TRIAGE_THRESHOLD):
+        self.threshold = threshold
+        self.evaluated = 0
+        self.short_circuited = 0
+        self._lock = threading.Lock()
+
+    def decide(
+        self,
+        vulnerability_id: str,
+        file_path: str,
+        vulnerability_type: str,
+        source_line: int,
+        sink_line: int,
+    ) -> Optional[VulnerabilityAnalysis]:
+        """Veredicto determinista si su confianza alcanza el umbral; None para enviar el hallazgo al LLM."""
+        try:
+            decision = pre_triage(vulnerability_id, file_path, vulnerability_type, source_line, sink_line)
+        except Exception as e:
+            logger.warning(f"Pre-triage fallido para {vulnerability_id}: {e}")
+            decision = None
+
+        accepted = decision is not None and decision.confidence >= self.threshold
+        with self._lock:
+            self.evaluated += 1
+            if accepted:
+                self.short_circuited += 1
+        if accepted:
+            logger.info(
+                f"Pre-triage: {vulnerability_id} clasificado como {decision.analysis.classification} "
+                f"sin LLM (regla {decision.rule}, confianza {decision.confidence:.2f})"
+            )
+            return decision.analysis
+        return None
@@ -0,0 +1,322 @@
+import asyncio
+import logging
+import random
+import re
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional
+
+import openai
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENCY = 64
+DEFAULT_MAX_RETRIES = 6
+BASE_BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 60.0
+
+# AIMD: +1 petición concurrente por ventana completa sin errores, mitad tras un 429
+ADDITIVE_INCREASE = 1.0
+MULTIPLICATIVE_DECREASE = 0.5
+# Un mismo pico de 429 (varias peticiones rechazadas a la vez) solo reduce la ventana una vez
+DECREASE_COOLDOWN_SECONDS = 1.0
+
+# Intervalo de sondeo cuando se espera a que quede un hueco en la ventana
+_POLL_SECONDS = 0.05
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+_RETRYABLE_ERRORS = (openai.APIConnectionError, openai.InternalServerError)
+_RETRYABLE_STATUS = {408, 409}
+# Errores de cuenta o configuración: ninguna otra petición con las mismas credenciales puede tener éxito
+_FATAL_ERRORS = (openai.AuthenticationError, openai.PermissionDeniedError, openai.NotFoundError)
+
+
+def parse_reset(value: Optional[str]) -> Optional[float]:
+    """Convierte un x-ratelimit-reset-* ("20ms", "1.5s", "6m0s") a segundos."""
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """Espera indicada por el proveedor (retry-after-ms o retry-after, en segundos)."""
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+def is_fatal_api_error(error: BaseException) -> bool:
+    """Indica si un error de la API afecta a cualquier petición (credenciales, permisos, modelo o cuota agotada)."""
+    if isinstance(error, openai.RateLimitError):
+        return getattr(error, "code", None) == "insufficient_quota"
+    return isinstance(error, _FATAL_ERRORS)
+
+
+class _Budget:
+    """
+    Cubo de capacidad por minuto (peticiones o tokens). Se rellena de forma continua a
+    razón de limit / 60 por segundo y se corrige con las cabeceras x-ratelimit-*.
+    """
+
+    def __init__(self, limit: Optional[float]):
+        self.limit = limit
+        self.available = limit
+        self.rate = limit / 60 if limit else None
+        self._updated = time.monotonic()
+
+    def refill(self, now: float):
+        if self.limit is not None:
+            self.available = min(self.limit, self.available + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_for(self, amount: float) -> float:
+        """Segundos hasta disponer de amount (0 si ya hay capacidad o no hay límite)."""
+        if self.limit is None:
+            return 0.0
+        # Una petición mayor que el límite completo solo espera a tener el cubo lleno
+        amount = min(amount, self.limit)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / self.rate
+
+    def take(self, amount: float):
+        if self.limit is not None:
+            self.available -= amount
+
+    def observe(self, limit: Optional[str], remaining: Optional[str], reset: Optional[str], pending: float = 0):
+        """
+        Ajusta el cubo al estado informado por el proveedor (límite, restante y reinicio).
+        pending es lo reservado por peticiones aún en vuelo, que el proveedor no ha descontado.
+        """
+        try:
+            new_limit = float(limit) if limit is not None else self.limit
+            new_remaining = float(remaining) if remaining is not None else None
+        except ValueError:
+            return
+        if not new_limit or new_remaining is None:
+            return
+        self.limit = new_limit
+        self.available = min(new_limit, new_remaining) - pending
+        # reset es el tiempo hasta recuperar el límite completo: fija el ritmo de relleno
+        seconds = parse_reset(reset)
+        if seconds and new_remaining < new_limit:
+            self.rate = (new_limit - new_remaining) / seconds
+        else:
+            self.rate = new_limit / 60
+        self._updated = time.monotonic()
+
+
+class RateLimitScheduler:
+    """
+    Planificador de peticiones al LLM consciente de los límites de la API.
+
+    - Presupuestos de peticiones por minuto (rpm) y tokens por minuto (tpm): una
+      petición solo sale si ambos cubos tienen capacidad para ella; los valores se
+      sincronizan con las cabeceras x-ratelimit-* de cada respuesta.
+    - Concurrencia adaptativa AIMD: la ventana de peticiones en vuelo crece en
+      ADDITIVE_INCREASE por cada ventana completada sin errores y se reduce a la mitad
+      ante un 429, entre 1 y max_concurrency.
+    - Reintentos con backoff exponencial y jitter (o el retry-after del proveedor)
+      para 429, errores de conexión y 5xx. Tras un 429 todas las peticiones se pausan
+      hasta que vence la espera, para no rebotar en bloque contra el límite.
+
+    Es seguro compartirlo entre hilos; la variante asíncrona sondea el mismo estado y
+    no depende de un event loop concreto.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+    ):
+        self.max_concurrency = max(1, max_concurrency or DEFAULT_MAX_CONCURRENCY)
+        self.max_retries = max_retries
+        self.limit = float(self.max_concurrency)
+        self.in_flight = 0
+        self.tokens_in_flight = 0
+        self.requests = _Budget(requests_per_minute)
+        self.tokens = _Budget(tokens_per_minute)
+
+        self.sent = 0
+        self.retries = 0
+        self.rate_limited = 0
+
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    # ------------------------------------------------------------------ admisión
+
+    def _try_acquire(self, tokens: int) -> float:
+        """Reserva un hueco si es posible (devuelve 0) o los segundos a esperar. Requiere el lock."""
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self.in_flight >= int(self.limit):
+            return _POLL_SECONDS
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        wait = max(self.requests.wait_for(1), self.tokens.wait_for(tokens))
+        if wait > 0:
+            return wait
+        self.requests.take(1)
+        self.tokens.take(tokens)
+        self.in_flight += 1
+        self.tokens_in_flight += tokens
+        self.sent += 1
+        return 0.0
+
+    def acquire(self, tokens: int):
+        with self._cond:
+            while True:
+                wait = self._try_acquire(tokens)
+                if not wait:
+                    return
+                self._cond.wait(timeout=wait)
+
+    async def acquire_async(self, tokens: int):
+        while True:
+            with self._cond:
+                wait = self._try_acquire(tokens)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def release(self, tokens: int):
+        with self._cond:
+            self.in_flight -= 1
+            self.tokens_in_flight -= tokens
+            self._cond.notify_all()
+
+    # ------------------------------------------------------------------ retroalimentación
+
+    def _observe_headers(self, headers: Optional[Mapping[str, str]]):
+        if not headers:
+            return
+        self.requests.observe(
+            headers.get("x-ratelimit-limit-requests"),
+            headers.get("x-ratelimit-remaining-requests"),
+            headers.get("x-ratelimit-reset-requests"),
+            self.in_flight,
+        )
+        self.tokens.observe(
+            headers.get("x-ratelimit-limit-tokens"),
+            headers.get("x-ratelimit-remaining-tokens"),
+            headers.get("x-ratelimit-reset-tokens"),
+            self.tokens_in_flight,
+        )
+
+    def _on_success(self, headers: Optional[Mapping[str, str]], estimated: int, used: Optional[int]):
+        with self._cond:
+            self._observe_headers(headers)
+            if used is not None and not (headers and headers.get("x-ratelimit-remaining-tokens")):
+                # Sin cabeceras de tokens: se corrige la estimación con el uso real
+                self.tokens.take(used - estimated)
+            self.limit = min(self.max_concurrency, self.limit + ADDITIVE_INCREASE / self.limit)
+            self._cond.notify_all()
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """Espera antes del siguiente intento, o None si el error no se reintenta."""
+        if attempt >= self.max_retries:
+            return None
+        headers = getattr(getattr(error, "response", None), "headers", None)
+        if is_fatal_api_error(error):
+            return None
+        if not isinstance(error, openai.RateLimitError) and not (
+            isinstance(error, _RETRYABLE_ERRORS)
+            or (isinstance(error, openai.APIStatusError) and error.status_code in _RETRYABLE_STATUS)
+        ):
+            return None
+
+        backoff = random.uniform(0, min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2 ** attempt))
+        delay = max(backoff, retry_after(headers) or 0.0)
+
+        with self._cond:
+            self.retries += 1
+            self._observe_headers(headers)
+            if isinstance(error, openai.RateLimitError):
+                self.rate_limited += 1
+                now = time.monotonic()
+                if now - self._last_decrease >= DECREASE_COOLDOWN_SECONDS:
+                    self.limit = max(1.0, self.limit * MULTIPLICATIVE_DECREASE)
+                    self._last_decrease = now
+                self._paused_until = max(self._paused_until, now + delay)
+        logger.warning(f"Reintento {attempt + 1}/{self.max_retries} en {delay:.2f}s tras error de la API: {error}")
+        return delay
+
+    # ------------------------------------------------------------------ ejecución
+
+    @staticmethod
+    def _unwrap(raw: Any):
+        """Admite respuestas crudas (with_raw_response) o ya parseadas."""
+        if hasattr(raw, "parse"):
+            return raw.parse(), raw.headers
+        return raw, None
+
+    @staticmethod
+    def _used_tokens(response: Any) -> Optional[int]:
+        return getattr(getattr(response, "usage", None), "total_tokens", None)
+
+    def run(self, send: Callable[[], Any], estimated_tokens: int) -> Any:
+        """Ejecuta send() respetando límites y ventana, con reintentos."""
+        attempt = 0
+        while True:
+            self.acquire(estimated_tokens)
+            try:
+                response, headers = self._unwrap(send())
+            except Exception as e:
+                self.release(estimated_tokens)
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self.release(estimated_tokens)
+            self._on_success(headers, estimated_tokens, self._used_tokens(response))
+            return response
+
+    async def run_async(self, send: Callable[[], Awaitable[Any]], estimated_tokens: int) -> Any:
+        """Equivalente asíncrono de run."""
+        attempt = 0
+        while True:
+            await self.acquire_async(estimated_tokens)
+            try:
+                response, headers = self._unwrap(await send())
+            except Exception as e:
+                self.release(estimated_tokens)
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self.release(estimated_tokens)
+            self._on_success(headers, estimated_tokens, self._used_tokens(response))
+            return response
+
+    def summary(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "sent": self.sent,
+                "retries": self.retries,
+                "rate_limited": self.rate_limited,
+                "concurrency": round(self.limit, 2),
+            }
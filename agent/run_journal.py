@@ -0,0 +1,109 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Dict, Optional, Set
+
+from pydantic import ValidationError
+
+from agent.schemas import Finding, VulnerabilityAnalysis
+
+logger = logging.getLogger(__name__)
+
+
+class RunJournal:
+    """
+    Diario de ejecución append-only (JSONL) con los hallazgos ya completados.
+
+    Cada línea guarda la clave del hallazgo, su id y el VulnerabilityAnalysis
+    serializado; se escribe y se vuelca a disco en cuanto termina cada análisis. Al
+    reanudar se cargan las entradas existentes (una última línea truncada por un
+    corte se descarta) y esos hallazgos no se vuelven a analizar. Tras una ejecución
+    completa sin errores el llamante lo elimina con discard(): un diario que sigue en
+    disco corresponde a una ejecución que se puede reanudar.
+    """
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self.resumed = 0
+        self._entries: Dict[str, VulnerabilityAnalysis] = {}
+        self._loaded: Set[str] = set()
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        if resume and os.path.exists(path):
+            self._load()
+        elif os.path.exists(path) and os.path.getsize(path):
+            logger.warning(f"El diario {path} de una ejecución anterior se reinicia; usa --resume para reanudarla")
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+
+    @staticmethod
+    def finding_key(finding: Finding) -> str:
+        """Identidad del hallazgo: todos sus campos, no solo el id (que puede repetirse entre archivos)."""
+        payload = json.dumps(finding.model_dump(), sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _load(self):
+        complete = 0
+        with open(self.path, "rb") as f:
+            for number, raw in enumerate(f, start=1):
+                if not raw.endswith(b"\n"):
+                    # Escritura interrumpida: se descarta para que la siguiente entrada empiece en línea nueva
+                    logger.warning(f"Entrada {number} del diario {self.path} incompleta, se descarta")
+                    break
+                complete += len(raw)
+                if not raw.strip():
+                    continue
+                try:
+                    entry = json.loads(raw)
+                    self._entries[entry["key"]] = VulnerabilityAnalysis(**entry["analysis"])
+                except (json.JSONDecodeError, KeyError, TypeError, ValidationError) as e:
+                    logger.warning(f"Entrada {number} del diario {self.path} ignorada: {e}")
+        if complete < os.path.getsize(self.path):
+            os.truncate(self.path, complete)
+        self._loaded = set(self._entries)
+        logger.info(f"Diario {self.path}: {len(self._entries)} hallazgos ya completados")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def completed(self, finding: Finding) -> Optional[VulnerabilityAnalysis]:
+        """
+        Análisis ya registrado para el hallazgo, o None. Solo cuentan como reanudados
+        (resumed) los cargados de una ejecución anterior, no los repetidos en esta.
+        """
+        key = self.finding_key(finding)
+        with self._lock:
+            analysis = self._entries.get(key)
+            if analysis is not None and key in self._loaded:
+                self.resumed += 1
+        return analysis
+
+    def record(self, finding: Finding, analysis: VulnerabilityAnalysis):
+        """Añade el hallazgo completado al diario y lo vuelca a disco."""
+        key = self.finding_key(finding)
+        line = json.dumps({"key": key, "id": finding.id, "analysis": analysis.model_dump()}, ensure_ascii=False)
+        with self._lock:
+            self._entries[key] = analysis
+            if self._file is None:
+                return
+            self._file.write(line + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def discard(self):
+        """Cierra y elimina el diario (ejecución terminada: no queda nada que reanudar)."""
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
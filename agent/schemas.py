@@ -63,3 +63,12 @@ class VulnerabilityAnalysis(BaseModel):
         None,
         description="Contraejemplo mínimo que demuestra no explotabilidad si es False Positive"
     )
+
+
+class Finding(BaseModel):
+    id: str = Field(..., description="Identificador único del hallazgo")
+    vulnerability_type: str = Field(..., description="Tipo de vulnerabilidad reportada por la herramienta SAST")
+    file_path: str = Field(..., description="Archivo fuente donde se reporta el hallazgo")
+    source_line: int = Field(..., description="Línea donde entra el input controlado por el usuario")
+    sink_line: int = Field(..., description="Línea donde ocurre el sink vulnerable")
+    message: Optional[str] = Field(None, description="Mensaje original de la herramienta SAST")
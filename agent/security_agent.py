@@ -1,13 +1,23 @@
+import asyncio
+import hashlib
 import json
 import logging
 import os
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 from pydantic import ValidationError
 
-from agent.schemas import VulnerabilityAnalysis
+from agent.incremental import IncrementalPlan
+from agent.pre_triage import PreTriage
+from agent.rate_limiter import DEFAULT_MAX_RETRIES, RateLimitScheduler, is_fatal_api_error
+from agent.schemas import Finding, VulnerabilityAnalysis
 from agent.tool_registry import SmartToolRegistry
+from agent.tracing import Tracer
+from agent.usage import UsageStats, usage_counts
+from agent.verdict_cache import VerdictCache
+from tools.context_builder import estimate_tokens
+from tools.source_index import get_source_index
 from tools.code_context_tool import (
     CodeContextInput,
     code_context_tool,
@@ -28,28 +38,129 @@ from tools.sanitizer_detector_tool import (
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+DEFAULT_MODEL = "gpt-4o"
+
+# Líneas de contexto alrededor de source/sink fuera de funciones en el modo por grupos
+GROUP_CONTEXT_RADIUS = 5
+
+# Tokens de respuesta reservados por petición en el presupuesto tpm (se corrigen con el uso real)
+RESPONSE_TOKENS_ESTIMATE = 800
+
+# Incrementar al modificar el prompt de usuario: forma parte de prompt_fingerprint, que
+# además cambia sola con el prompt del sistema o las herramientas e invalida la caché de veredictos
+PROMPT_VERSION = "1"
+
+
+def prompt_fingerprint(system_prompt: str, tool_definitions: List[Dict[str, Any]]) -> str:
+    """
+    Huella del prompt: PROMPT_VERSION, prompt del sistema y definiciones de herramientas.
+    Cambia con cualquier modificación del prefijo, por lo que sirve de clave para
+    cachés y reportes.
+    """
+    digest = hashlib.sha256()
+    digest.update(PROMPT_VERSION.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(system_prompt.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(json.dumps(tool_definitions, sort_keys=True, separators=(",", ":")).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
 
 class SecurityValidationAgent:
     """
     Agente que orquesta el análisis de vulnerabilidades utilizando Function Calling.
     """
 
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        max_concurrent_requests: Optional[int] = None,
+        model: str = DEFAULT_MODEL,
+        verdict_cache: Optional[VerdictCache] = None,
+        refresh_cache: bool = False,
+        memoize_tools: bool = False,
+        pre_triage_threshold: Optional[float] = None,
+        prefetch_tools: bool = False,
+        tool_workers: int = 4,
+        tool_process_threshold: Optional[int] = None,
+        context_max_tokens: Optional[int] = None,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        tracer: Optional[Tracer] = None,
+        incremental: Optional[IncrementalPlan] = None,
+    ):
         """
         Inicializa el agente con un cliente de OpenAI y registra las herramientas.
+
+        Las llamadas al LLM pasan por un RateLimitScheduler: max_concurrent_requests es
+        el techo de la ventana adaptativa de peticiones en vuelo, requests_per_minute y
+        tokens_per_minute los presupuestos iniciales (se ajustan con las cabeceras de
+        la API) y max_retries el número de reintentos ante 429, 5xx o errores de red.
+        Con tracer se registran spans por fase: prompt, llamadas al LLM (latencia y
+        tokens), herramientas, parseo y validación de la respuesta.
+        Con incremental, los hallazgos cuyas funciones no han cambiado (según el diff)
+        reutilizan el veredicto de un reporte anterior sin volver a analizarse.
+        Si se proporciona verdict_cache, los veredictos se reutilizan mientras no cambien
+        el archivo fuente, el hallazgo, el modelo o el prompt; refresh_cache fuerza
+        el re-análisis y sobrescribe la entrada.
+        memoize_tools activa la memoización de herramientas deterministas en el registro.
+        Con pre_triage_threshold, los hallazgos evidentes se clasifican con reglas
+        deterministas sin llamar al LLM cuando la confianza alcanza el umbral.
+        prefetch_tools ejecuta las cuatro herramientas localmente antes de la primera
+        llamada e incluye sus resultados en el prompt, de modo que el modelo pueda
+        emitir el veredicto en una sola petición.
+        tool_workers limita cuántas herramientas de un mismo turno se ejecutan en
+        paralelo; las herramientas AST con snippets de al menos tool_process_threshold
+        caracteres se ejecutan en un pool de procesos.
+        context_max_tokens acota el contexto de código precalculado: se conservan source,
+        sink, firma y slice entre ambos y el resto se omite con marcas.
         """
+        self.model = model
+        self.verdict_cache = verdict_cache
+        self.refresh_cache = refresh_cache
+        self.prefetch_tools = prefetch_tools
+        self.context_max_tokens = context_max_tokens
+        self.pre_triage = PreTriage(pre_triage_threshold) if pre_triage_threshold is not None else None
+        self.tracer = tracer if tracer is not None else Tracer(enabled=False)
+        self.incremental = incremental
+
+        # Los reintentos los gestiona el planificador, no el cliente
         if api_key:
-            self.client = OpenAI(api_key=api_key)
+            self.client = OpenAI(api_key=api_key, max_retries=0)
         else:
-            self.client = OpenAI()
+            self.client = OpenAI(max_retries=0)
 
-        self.registry = SmartToolRegistry()
+        self._api_key = api_key
+        self._async_client: Optional[AsyncOpenAI] = None
+        self._async_client_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.scheduler = RateLimitScheduler(
+            max_concurrency=max_concurrent_requests,
+            requests_per_minute=requests_per_minute,
+            tokens_per_minute=tokens_per_minute,
+            max_retries=max_retries,
+        )
+
+        self.registry = SmartToolRegistry(
+            memoize=memoize_tools,
+            max_workers=tool_workers,
+            process_snippet_threshold=tool_process_threshold,
+            tracer=self.tracer,
+        )
         self._register_tools()
 
+        # Prefijo estable (prompt del sistema + herramientas) construido una sola vez,
+        # byte a byte idéntico entre peticiones para aprovechar la caché de prompts del proveedor
+        self._tool_definitions = self.registry.get_tool_definitions()
+        self._system_prompt = self._build_system_prompt()
+        self.prompt_fingerprint = prompt_fingerprint(self._system_prompt, self._tool_definitions)
+        self._tool_tokens = estimate_tokens(json.dumps(self._tool_definitions))
+        self.usage = UsageStats()
+
     def _register_tools(self):
         """Registra las herramientas disponibles para el agente."""
         self.registry.register("get_code_context", code_context_tool, CodeContextInput)
-        self.registry.register("detect_taint_flow", taint_trace_tool, TaintTraceInput)
+        self.registry.register("detect_taint_flow", taint_trace_tool, TaintTraceInput, cpu_bound=True)
         self.registry.register("detect_sink", sink_detector_tool, SinkDetectorInput)
         self.registry.register("detect_sanitizers", sanitizer_detector_tool, SanitizerDetectorInput)
 
@@ -65,48 +176,260 @@ class SecurityValidationAgent:
         """
         Punto de entrada principal para analizar una vulnerabilidad.
         """
-        system_prompt = self._construct_system_prompt()
-        user_prompt = self._construct_user_prompt(
-            vulnerability_id, file_path, vulnerability_type, source_line, sink_line, message
-        )
+        with self.tracer.span("analyze_vulnerability", finding_id=vulnerability_id, vulnerability_type=vulnerability_type) as span:
+            cache_key = self._cache_key(
+                vulnerability_id, file_path, vulnerability_type, source_line, sink_line, message
+            )
+            cached = self._cached_verdict(cache_key)
+            if cached is not None:
+                span.set_attribute("outcome", "cache")
+                return cached
 
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ]
+            analysis = self._prior_verdict(vulnerability_id, file_path, vulnerability_type, source_line, sink_line)
+            if analysis is not None:
+                span.set_attribute("outcome", "previous_report")
+                return analysis
 
-        tools_schema = self.registry.get_tool_definitions()
+            analysis = self._pre_triage(vulnerability_id, file_path, vulnerability_type, source_line, sink_line)
+            if analysis is not None:
+                span.set_attribute("outcome", "pre_triage")
+                return analysis
 
-        response_1 = self.client.chat.completions.create(
-            model="gpt-4o",
-            messages=messages,
-            tools=tools_schema,
-            tool_choice="auto"
-        )
+            span.set_attribute("outcome", "llm")
+            analysis = self._analyze_with_llm(
+                vulnerability_id, file_path, vulnerability_type, source_line, sink_line, message
+            )
+            self._store_verdict(cache_key, analysis)
+            return analysis
+
+    def _analyze_with_llm(
+        self,
+        vulnerability_id: str,
+        file_path: str,
+        vulnerability_type: str,
+        source_line: int,
+        sink_line: int,
+        message: str,
+    ) -> VulnerabilityAnalysis:
+        """
+        Ejecuta el protocolo de Function Calling contra el LLM. Con prefetch_tools la
+        evidencia ya va en el prompt y el bucle de herramientas solo se usa si el
+        modelo pide más.
+        """
+        evidence = None
+        if self.prefetch_tools:
+            with self.tracer.span("tools.prefetch"):
+                evidence = self._prefetch_evidence(file_path, vulnerability_type, source_line, sink_line)
+        with self.tracer.span("prompt.build"):
+            messages = self._build_messages(
+                vulnerability_id, file_path, vulnerability_type, source_line, sink_line, message, evidence
+            )
+
+        response_1 = self._create_completion(**self._first_request(messages, evidence))
         
         message_1 = response_1.choices[0].message
         messages.append(message_1)
 
         if message_1.tool_calls:
-            for tool_call in message_1.tool_calls:
-                function_name = tool_call.function.name
-                arguments = tool_call.function.arguments
-                
-                logger.info(f"Llamando a herramienta: {function_name} con argumentos: {arguments}")
-                
-                tool_result = self.registry.execute(function_name, arguments)
-                
-                messages.append(
-                    {
-                        "tool_call_id": tool_call.id,
-                        "role": "tool",
-                        "name": function_name,
-                        "content": tool_result,
-                    }
-                )
+            self._run_tool_calls(message_1.tool_calls, messages)
             
-            response_2 = self.client.chat.completions.create(
-                model="gpt-4o",
+            response_2 = self._create_completion(
+                model=self.model,
+                messages=messages,
+                response_format={"type": "json_object"}
+            )
+            final_message = response_2.choices[0].message.content
+        else:
+            final_message = message_1.content
+
+        return self._parse_final_message(final_message)
+
+    def analyze_vulnerability_group(self, findings: List[Finding]) -> List[Optional[VulnerabilityAnalysis]]:
+        """
+        Analiza en una sola petición varios hallazgos del mismo archivo, compartiendo
+        el prompt del sistema y el contexto de código. Cada veredicto se valida por
+        separado; la posición queda en None si el modelo lo omite, lo devuelve mal
+        formado o la petición falla, para que el llamante lo re-analice con
+        reanalyze_with_llm (la caché, el reporte anterior y el pre-triage ya se han
+        consultado). Los errores de la API que afectan a cualquier petición
+        (credenciales, cuota) se propagan.
+        """
+        with self.tracer.span("analyze_vulnerability_group", findings=len(findings)):
+            return self._analyze_group(findings)
+
+    def reanalyze_with_llm(self, finding: Finding) -> VulnerabilityAnalysis:
+        """Análisis individual con el LLM de un hallazgo que quedó sin veredicto en analyze_vulnerability_group."""
+        with self.tracer.span("analyze_vulnerability", finding_id=finding.id, vulnerability_type=finding.vulnerability_type) as span:
+            span.set_attribute("outcome", "llm")
+            analysis = self._analyze_with_llm(
+                finding.id, finding.file_path, finding.vulnerability_type, finding.source_line, finding.sink_line, finding.message
+            )
+            self._store_verdict(
+                self._cache_key(
+                    finding.id, finding.file_path, finding.vulnerability_type, finding.source_line, finding.sink_line, finding.message
+                ),
+                analysis,
+            )
+            return analysis
+
+    def _analyze_group(self, findings: List[Finding]) -> List[Optional[VulnerabilityAnalysis]]:
+        results: List[Optional[VulnerabilityAnalysis]] = [None] * len(findings)
+        cache_keys = []
+        pending = []
+        for position, f in enumerate(findings):
+            cache_key = self._cache_key(f.id, f.file_path, f.vulnerability_type, f.source_line, f.sink_line, f.message)
+            cache_keys.append(cache_key)
+            analysis = self._cached_verdict(cache_key)
+            if analysis is None:
+                analysis = self._prior_verdict(f.id, f.file_path, f.vulnerability_type, f.source_line, f.sink_line)
+            if analysis is None:
+                analysis = self._pre_triage(f.id, f.file_path, f.vulnerability_type, f.source_line, f.sink_line)
+            if analysis is not None:
+                results[position] = analysis
+            else:
+                pending.append(position)
+
+        if not pending:
+            return results
+        try:
+            if len(pending) == 1:
+                f = findings[pending[0]]
+                batched = [self._analyze_with_llm(f.id, f.file_path, f.vulnerability_type, f.source_line, f.sink_line, f.message)]
+            else:
+                batched = self._analyze_group_with_llm([findings[p] for p in pending])
+        except Exception as e:
+            if is_fatal_api_error(e):
+                raise
+            logger.warning(
+                f"Petición de grupo fallida para {len(pending)} hallazgos de {findings[0].file_path}: {e}. "
+                "Se analizarán de forma individual."
+            )
+            return results
+
+        for position, analysis in zip(pending, batched):
+            if analysis is not None:
+                self._store_verdict(cache_keys[position], analysis)
+                results[position] = analysis
+        return results
+
+    def _analyze_group_with_llm(self, findings: List[Finding]) -> List[Optional[VulnerabilityAnalysis]]:
+        """Una petición para todo el grupo: contexto compartido y evidencia precalculada por hallazgo."""
+        with self.tracer.span("prompt.build", findings=len(findings)):
+            messages = [
+                {"role": "system", "content": self._construct_system_prompt()},
+                {"role": "user", "content": self._construct_group_prompt(findings)},
+            ]
+        response = self._create_completion(
+            model=self.model,
+            messages=messages,
+            response_format={"type": "json_object"},
+        )
+        return self._parse_group_message(response.choices[0].message.content, findings)
+
+    def _parse_group_message(
+        self, final_message: Optional[str], findings: List[Finding]
+    ) -> List[Optional[VulnerabilityAnalysis]]:
+        """Valida por separado cada veredicto del grupo; los ausentes o inválidos quedan en None."""
+        try:
+            with self.tracer.span("response.parse"):
+                clean_content = (final_message or "").replace("```json", "").replace("```", "").strip()
+                data = json.loads(clean_content)
+        except json.JSONDecodeError as e:
+            logger.error(f"Respuesta de grupo no es JSON válido: {e}")
+            return [None] * len(findings)
+
+        items = data.get("analyses", []) if isinstance(data, dict) else data
+        by_id: Dict[str, VulnerabilityAnalysis] = {}
+        with self.tracer.span("response.validate", findings=len(findings)):
+            for item in items if isinstance(items, list) else []:
+                try:
+                    analysis = VulnerabilityAnalysis(**item)
+                except (TypeError, ValidationError) as e:
+                    logger.warning(f"Veredicto de grupo inválido, se re-analizará individualmente: {e}")
+                    continue
+                by_id.setdefault(analysis.id, analysis)
+
+        results = [by_id.get(f.id) for f in findings]
+        missing = [f.id for f, analysis in zip(findings, results) if analysis is None]
+        if missing:
+            logger.warning(f"Hallazgos sin veredicto válido en la respuesta de grupo: {missing}")
+        return results
+
+    async def analyze_vulnerability_async(
+        self,
+        vulnerability_id: str,
+        file_path: str,
+        vulnerability_type: str,
+        source_line: int,
+        sink_line: int,
+        message: str,
+    ) -> VulnerabilityAnalysis:
+        """
+        Versión asíncrona de analyze_vulnerability basada en el cliente AsyncOpenAI.
+
+        Las herramientas se ejecutan en un hilo auxiliar para no bloquear el event loop.
+        """
+        with self.tracer.span("analyze_vulnerability", finding_id=vulnerability_id, vulnerability_type=vulnerability_type) as span:
+            cache_key = self._cache_key(
+                vulnerability_id, file_path, vulnerability_type, source_line, sink_line, message
+            )
+            cached = self._cached_verdict(cache_key)
+            if cached is not None:
+                span.set_attribute("outcome", "cache")
+                return cached
+
+            analysis = await asyncio.to_thread(
+                self._prior_verdict, vulnerability_id, file_path, vulnerability_type, source_line, sink_line
+            )
+            if analysis is not None:
+                span.set_attribute("outcome", "previous_report")
+                return analysis
+
+            analysis = await asyncio.to_thread(
+                self._pre_triage, vulnerability_id, file_path, vulnerability_type, source_line, sink_line
+            )
+            if analysis is not None:
+                span.set_attribute("outcome", "pre_triage")
+                return analysis
+
+            span.set_attribute("outcome", "llm")
+            analysis = await self._analyze_with_llm_async(
+                vulnerability_id, file_path, vulnerability_type, source_line, sink_line, message
+            )
+            self._store_verdict(cache_key, analysis)
+            return analysis
+
+    async def _analyze_with_llm_async(
+        self,
+        vulnerability_id: str,
+        file_path: str,
+        vulnerability_type: str,
+        source_line: int,
+        sink_line: int,
+        message: str,
+    ) -> VulnerabilityAnalysis:
+        """Equivalente asíncrono de _analyze_with_llm."""
+        evidence = None
+        if self.prefetch_tools:
+            with self.tracer.span("tools.prefetch"):
+                evidence = await asyncio.to_thread(
+                    self._prefetch_evidence, file_path, vulnerability_type, source_line, sink_line
+                )
+        with self.tracer.span("prompt.build"):
+            messages = self._build_messages(
+                vulnerability_id, file_path, vulnerability_type, source_line, sink_line, message, evidence
+            )
+
+        response_1 = await self._create_completion_async(**self._first_request(messages, evidence))
+
+        message_1 = response_1.choices[0].message
+        messages.append(message_1)
+
+        if message_1.tool_calls:
+            await asyncio.to_thread(self._run_tool_calls, message_1.tool_calls, messages)
+
+            response_2 = await self._create_completion_async(
+                model=self.model,
                 messages=messages,
                 response_format={"type": "json_object"}
             )
@@ -114,19 +437,269 @@ class SecurityValidationAgent:
         else:
             final_message = message_1.content
 
+        return self._parse_final_message(final_message)
+
+    def _prior_verdict(
+        self, vulnerability_id: str, file_path: str, vulnerability_type: str, source_line: int, sink_line: int
+    ) -> Optional[VulnerabilityAnalysis]:
+        if self.incremental is None:
+            return None
+        with self.tracer.span("incremental.check") as span:
+            analysis = self.incremental.prior_verdict(vulnerability_id, file_path, vulnerability_type, source_line, sink_line)
+            span.set_attribute("reused", analysis is not None)
+        if analysis is not None:
+            logger.info(f"Veredicto reutilizado del reporte anterior para {vulnerability_id} (sin cambios en sus funciones)")
+        return analysis
+
+    def _pre_triage(
+        self,
+        vulnerability_id: str,
+        file_path: str,
+        vulnerability_type: str,
+        source_line: int,
+        sink_line: int,
+    ) -> Optional[VulnerabilityAnalysis]:
+        if self.pre_triage is None:
+            return None
+        with self.tracer.span("pre_triage") as span:
+            analysis = self.pre_triage.decide(vulnerability_id, file_path, vulnerability_type, source_line, sink_line)
+            span.set_attribute("decided", analysis is not None)
+            return analysis
+
+    def _cache_key(
+        self,
+        vulnerability_id: str,
+        file_path: str,
+        vulnerability_type: str,
+        source_line: int,
+        sink_line: int,
+        message: str,
+    ) -> Optional[str]:
+        """Calcula la clave de la caché de veredictos, o None si no hay caché o no se puede leer el archivo."""
+        if self.verdict_cache is None:
+            return None
+
+        try:
+            with open(file_path, "rb") as f:
+                source_bytes = f.read()
+        except OSError:
+            return None
+
+        finding = {
+            "id": vulnerability_id,
+            "file_path": file_path,
+            "type": vulnerability_type,
+            "source_line": source_line,
+            "sink_line": sink_line,
+            "message": message,
+        }
+        return VerdictCache.make_key(source_bytes, finding, self.model, self.prompt_fingerprint)
+
+    def _cached_verdict(self, cache_key: Optional[str]) -> Optional[VulnerabilityAnalysis]:
+        if cache_key is None or self.refresh_cache:
+            return None
+
+        with self.tracer.span("verdict_cache.lookup") as span:
+            analysis = self.verdict_cache.get(cache_key)
+            span.set_attribute("hit", analysis is not None)
+        if analysis is not None:
+            logger.info(f"Veredicto recuperado de caché para {analysis.id}")
+        return analysis
+
+    def _store_verdict(self, cache_key: Optional[str], analysis: VulnerabilityAnalysis):
+        if cache_key is not None:
+            self.verdict_cache.put(cache_key, analysis)
+
+    def _build_messages(
+        self,
+        vulnerability_id: str,
+        file_path: str,
+        vulnerability_type: str,
+        source_line: int,
+        sink_line: int,
+        message: str,
+        evidence: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Construye la conversación inicial (system + user) para un hallazgo."""
+        system_prompt = self._construct_system_prompt()
+        user_prompt = self._construct_user_prompt(
+            vulnerability_id, file_path, vulnerability_type, source_line, sink_line, message
+        )
+        if evidence is not None:
+            user_prompt += f"""
+The following tool results were gathered in advance for this finding. Base your verdict on them and
+answer directly with the JSON object. Call a tool only if this evidence is not enough.
+
+{evidence}
+"""
+
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ]
+
+    def _first_request(self, messages: List[Dict[str, Any]], evidence: Optional[str]) -> Dict[str, Any]:
+        """Parámetros de la primera petición; con evidencia precalculada se pide ya el JSON final."""
+        request = {
+            "model": self.model,
+            "messages": messages,
+            "tools": self._tool_definitions,
+            "tool_choice": "auto",
+        }
+        if evidence is not None:
+            request["response_format"] = {"type": "json_object"}
+        return request
+
+    def _prefetch_calls(
+        self, file_path: str, vulnerability_type: str, source_line: int, sink_line: int
+    ) -> List[Tuple[str, Dict[str, Any]]]:
+        """Llamadas a herramientas cuyos argumentos se conocen ya a partir del hallazgo."""
+        ast_args = {
+            "vulnerability_type": vulnerability_type,
+            "file_path": file_path,
+            "mode": "ast",
+            "sink_line": sink_line,
+            "source_line": source_line,
+        }
+        context_args = {"file_path": file_path, "source_line": source_line, "sink_line": sink_line, "mode": "function"}
+        if self.context_max_tokens is not None:
+            context_args["max_tokens"] = self.context_max_tokens
+        return [
+            ("get_code_context", context_args),
+            ("detect_taint_flow", {"file_path": file_path, "source_line": source_line, "sink_line": sink_line}),
+            ("detect_sink", ast_args),
+            ("detect_sanitizers", ast_args),
+        ]
+
+    def _prefetch_evidence(self, file_path: str, vulnerability_type: str, source_line: int, sink_line: int) -> str:
+        """Ejecuta localmente las herramientas deterministas y devuelve sus resultados como texto para el prompt."""
+        sections = []
+        calls = [
+            (name, json.dumps(args, ensure_ascii=False))
+            for name, args in self._prefetch_calls(file_path, vulnerability_type, source_line, sink_line)
+        ]
+        for name, arguments in calls:
+            logger.info(f"Pre-ejecutando herramienta: {name} con argumentos: {arguments}")
+        for (name, arguments), result in zip(calls, self.registry.execute_many(calls)):
+            sections.append(f"### {name}({arguments})\n{result}")
+        return "\n\n".join(sections)
+
+    def _run_tool_calls(self, tool_calls, messages: List[Any]):
+        """
+        Ejecuta de forma concurrente las herramientas solicitadas por el LLM y añade
+        sus resultados a la conversación en el orden original.
+        """
+        calls = []
+        for tool_call in tool_calls:
+            logger.info(f"Llamando a herramienta: {tool_call.function.name} con argumentos: {tool_call.function.arguments}")
+            calls.append((tool_call.function.name, tool_call.function.arguments))
+
+        tool_results = self.registry.execute_many(calls)
+
+        for tool_call, tool_result in zip(tool_calls, tool_results):
+            messages.append(
+                {
+                    "tool_call_id": tool_call.id,
+                    "role": "tool",
+                    "name": tool_call.function.name,
+                    "content": tool_result,
+                }
+            )
+
+    def _parse_final_message(self, final_message: Optional[str]) -> VulnerabilityAnalysis:
+        """Limpia y valida la respuesta final del LLM contra el esquema."""
         logger.info("Respuesta final recibida del LLM")
         try:
             if not final_message:
                 raise ValueError("Respuesta vacía del LLM")
             
-            clean_content = final_message.replace("```json", "").replace("```", "").strip()
-            data = json.loads(clean_content)
-            return VulnerabilityAnalysis(**data)
+            with self.tracer.span("response.parse"):
+                clean_content = final_message.replace("```json", "").replace("```", "").strip()
+                data = json.loads(clean_content)
+            with self.tracer.span("response.validate"):
+                return VulnerabilityAnalysis(**data)
         except (json.JSONDecodeError, ValidationError) as e:
             logger.error(f"Validación fallida: {e}")
             raise ValueError(f"Fallo al validar la salida: {e}")
 
+    def _estimate_request_tokens(self, kwargs: Dict[str, Any]) -> int:
+        """Tokens aproximados de una petición (prompt, herramientas y respuesta) para el presupuesto tpm."""
+        tokens = RESPONSE_TOKENS_ESTIMATE
+        if kwargs.get("tools"):
+            tokens += self._tool_tokens
+        for message in kwargs.get("messages", []):
+            if isinstance(message, dict):
+                content = message.get("content")
+            else:
+                content = getattr(message, "content", None)
+                for tool_call in getattr(message, "tool_calls", None) or []:
+                    tokens += estimate_tokens(tool_call.function.arguments)
+            if isinstance(content, str):
+                tokens += estimate_tokens(content)
+        return tokens
+
+    def _create_completion(self, **kwargs):
+        """Envía una petición al LLM a través del planificador de límites de la API."""
+        estimated_tokens = self._estimate_request_tokens(kwargs)
+        with self.tracer.span("llm.call", **self._llm_span_attributes(kwargs, estimated_tokens)) as span:
+            response = self.scheduler.run(
+                lambda: self.client.chat.completions.with_raw_response.create(**kwargs),
+                estimated_tokens,
+            )
+            span.set_attributes(self._llm_usage_attributes(response))
+        self.usage.record(response)
+        return response
+
+    def _llm_span_attributes(self, kwargs: Dict[str, Any], estimated_tokens: int) -> Dict[str, Any]:
+        return {
+            "gen_ai.request.model": kwargs.get("model", self.model),
+            "llm.tools": bool(kwargs.get("tools")),
+            "llm.estimated_tokens": estimated_tokens,
+        }
+
+    @staticmethod
+    def _llm_usage_attributes(response: Any) -> Dict[str, Any]:
+        counts = usage_counts(response)
+        choices = getattr(response, "choices", None) or []
+        return {
+            "gen_ai.usage.input_tokens": counts["prompt_tokens"],
+            "gen_ai.usage.output_tokens": counts["completion_tokens"],
+            "gen_ai.usage.cached_input_tokens": counts["cached_tokens"],
+            "gen_ai.response.finish_reason": getattr(choices[0], "finish_reason", None) if choices else None,
+        }
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        """Cliente AsyncOpenAI del event loop en curso, creado bajo demanda con las mismas credenciales."""
+        # El pool HTTP del cliente queda ligado al event loop en el que se usa por primera vez:
+        # cada asyncio.run() necesita su propio cliente
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_client_loop is not loop:
+            if self._api_key:
+                self._async_client = AsyncOpenAI(api_key=self._api_key, max_retries=0)
+            else:
+                self._async_client = AsyncOpenAI(max_retries=0)
+            self._async_client_loop = loop
+        return self._async_client
+
+    async def _create_completion_async(self, **kwargs):
+        """Equivalente asíncrono de _create_completion."""
+        estimated_tokens = self._estimate_request_tokens(kwargs)
+        with self.tracer.span("llm.call", **self._llm_span_attributes(kwargs, estimated_tokens)) as span:
+            response = await self.scheduler.run_async(
+                lambda: self.async_client.chat.completions.with_raw_response.create(**kwargs),
+                estimated_tokens,
+            )
+            span.set_attributes(self._llm_usage_attributes(response))
+        self.usage.record(response)
+        return response
+
     def _construct_system_prompt(self) -> str:
+        """Prompt del sistema, construido una vez por instancia."""
+        return self._system_prompt
+
+    @staticmethod
+    def _build_system_prompt() -> str:
         """Construye el prompt del sistema incluyendo el esquema de salida."""
         schema_json = json.dumps(VulnerabilityAnalysis.model_json_schema(), indent=2)
         
@@ -147,6 +720,75 @@ IMPORTANT:
 
 If the vulnerability is a True Positive, you must provide a proof of concept trace.
 If it is a False Positive, you must explain why (e.g., sanitizer found, broken flow) and provide a counterexample if possible.
+"""
+
+    def _group_context(self, file_path: str, findings: List[Finding]) -> str:
+        """
+        Código compartido del grupo: las funciones que contienen cada source y sink (o
+        unas líneas alrededor si están a nivel de módulo), fusionadas y numeradas.
+        """
+        index = get_source_index(file_path)
+        ranges = []
+        for f in findings:
+            for line in (f.source_line, f.sink_line):
+                span = index.function_span(line)
+                if span is not None:
+                    ranges.append((span.start_line, span.end_line))
+                else:
+                    ranges.append((line - GROUP_CONTEXT_RADIUS, line + GROUP_CONTEXT_RADIUS))
+
+        merged: List[List[int]] = []
+        for start, end in sorted(ranges):
+            start, end = max(1, start), min(index.line_count, end)
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+
+        blocks = []
+        for start, end in merged:
+            blocks.append("\n".join(
+                f"{number:>5} | {index.line(number).rstrip()}" for number in range(start, end + 1)
+            ))
+        return "\n   ...\n".join(blocks)
+
+    def _construct_group_prompt(self, findings: List[Finding]) -> str:
+        """Prompt de usuario para un grupo de hallazgos del mismo archivo."""
+        file_path = findings[0].file_path
+        sections = []
+        for f in findings:
+            calls = [
+                (name, json.dumps(args, ensure_ascii=False))
+                for name, args in self._prefetch_calls(file_path, f.vulnerability_type, f.source_line, f.sink_line)
+                if name != "get_code_context"
+            ]
+            evidence = "\n".join(
+                f"- {name}: {result}" for (name, _), result in zip(calls, self.registry.execute_many(calls))
+            )
+            sections.append(
+                f"""ID: {f.id}
+Type: {f.vulnerability_type}
+Message: {f.message}
+Source Line: {f.source_line}
+Sink Line: {f.sink_line}
+Tool results:
+{evidence}"""
+            )
+
+        findings_text = "\n\n".join(sections)
+        return f"""Analyze these {len(findings)} findings from the same file. No tools are available in this request:
+the relevant code and the tool results for each finding are already included below.
+
+File: {file_path}
+Code:
+{self._group_context(file_path, findings)}
+
+Findings:
+
+{findings_text}
+
+Answer with a JSON object {{"analyses": [...]}} containing exactly one object per finding, each one
+strictly following the output schema and with "id" equal to the finding ID.
 """
 
     def _construct_user_prompt(
@@ -1,7 +1,14 @@
 import json
-from typing import Any, Callable, Dict, List, Type
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple, Type
 from pydantic import BaseModel
 
+from agent.tracing import Tracer
+
 class ToolRegistry:
     def __init__(self):
         self._tools: Dict[str, Callable] = {}
@@ -57,32 +64,209 @@ class ToolRegistry:
         
         return "Not implemented yet"
 
+def _run_tool(func: Callable, input_data: BaseModel) -> str:
+    """Ejecuta una herramienta y serializa su resultado; a nivel de módulo para poder enviarse a un proceso."""
+    result = func(input_data)
+
+    # If result is a Pydantic model, dump to JSON
+    if isinstance(result, BaseModel):
+        return result.model_dump_json()
+    return str(result)
+
+
+def _run_tool_timed(name: str, func: Callable, input_data: BaseModel) -> Tuple[str, bool, int, int]:
+    """
+    Ejecuta la herramienta y devuelve (salida, fallida, inicio, fin) con marcas time_ns,
+    medidas en el propio hilo o proceso de ejecución (sin contar la espera en el pool).
+    """
+    start = time.time_ns()
+    try:
+        output, failed = _run_tool(func, input_data), False
+    except Exception as e:
+        output, failed = f"Error executing tool '{name}': {str(e)}", True
+    return output, failed, start, time.time_ns()
+
+
 class SmartToolRegistry(ToolRegistry):
-    def __init__(self):
+    def __init__(
+        self,
+        memoize: bool = False,
+        memo_max_entries: int = 1024,
+        max_workers: int = 4,
+        process_snippet_threshold: Optional[int] = None,
+        tracer: Optional[Tracer] = None,
+    ):
+        """
+        memoize activa una caché LRU de resultados de herramientas, indexada por el
+        nombre de la herramienta y los argumentos validados y canonicalizados (con los
+        valores por defecto aplicados). Para herramientas
+        que leen archivos (argumento file_path) la clave incluye mtime y tamaño.
+
+        max_workers limita cuántas herramientas de un mismo turno se ejecutan a la vez
+        en execute_many. Las herramientas registradas como cpu_bound cuyo snippet supera
+        process_snippet_threshold caracteres se envían a un pool de procesos.
+
+        Con tracer, cada ejecución (o acierto de memo) se registra como un span tool.<nombre>.
+        """
         super().__init__()
         self._models: Dict[str, Type[BaseModel]] = {}
+        self._cpu_bound: Set[str] = set()
+        self.memoize = memoize
+        self.memo_max_entries = memo_max_entries
+        self._memo: "OrderedDict[Tuple, str]" = OrderedDict()
+        self._memo_lock = threading.Lock()
+        self.memo_hits = 0
+        self.memo_misses = 0
 
-    def register(self, name: str, func: Callable, input_model: Type[BaseModel]):
+        self.max_workers = max_workers
+        self.process_snippet_threshold = process_snippet_threshold
+        self._pool_lock = threading.Lock()
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self.tracer = tracer if tracer is not None else Tracer(enabled=False)
+
+    def register(self, name: str, func: Callable, input_model: Type[BaseModel], cpu_bound: bool = False):
         # Call parent register which now handles logic
         super().register(name, func, input_model)
+        if cpu_bound:
+            self._cpu_bound.add(name)
 
     def execute(self, name: str, arguments_json: str) -> str:
+        return self.execute_many([(name, arguments_json)])[0]
+
+    def execute_many(self, calls: Sequence[Tuple[str, str]]) -> List[str]:
+        """
+        Ejecuta varias llamadas (nombre, argumentos JSON) de forma concurrente y
+        devuelve los resultados en el mismo orden. El coste de un turno con varias
+        herramientas pasa a ser el de la más lenta en lugar de la suma.
+        """
+        outputs: List[Optional[str]] = [None] * len(calls)
+        pending = []
+        for position, (name, arguments_json) in enumerate(calls):
+            output, input_data, memo_key = self._prepare(name, arguments_json)
+            if output is not None:
+                outputs[position] = output
+            else:
+                pending.append((position, name, input_data, memo_key))
+
+        if len(pending) <= 1 or self.max_workers <= 1:
+            executors = ["inline"] * len(pending)
+            results = [self._call_inline(name, input_data) for _, name, input_data, _ in pending]
+        else:
+            executors, futures = [], []
+            for _, name, input_data, _ in pending:
+                executor = self._executor_for(name, input_data)
+                executors.append("process" if executor is self._process_pool else "thread")
+                futures.append((time.time_ns(), executor.submit(_run_tool_timed, name, self._tools[name], input_data)))
+            results = [
+                self._collect(name, future, submitted) for (_, name, _, _), (submitted, future) in zip(pending, futures)
+            ]
+
+        for (position, name, _, memo_key), executor, (output, failed, start, end) in zip(pending, executors, results):
+            outputs[position] = output
+            self.tracer.record(f"tool.{name}", start, end, error=output if failed else None, executor=executor)
+            if memo_key is not None and not failed:
+                self._remember(memo_key, output)
+        return outputs
+
+    def _call_inline(self, name: str, input_data: BaseModel) -> Tuple[str, bool, int, int]:
+        return _run_tool_timed(name, self._tools[name], input_data)
+
+    @staticmethod
+    def _collect(name: str, future, submitted: int) -> Tuple[str, bool, int, int]:
+        try:
+            return future.result()
+        except Exception as e:
+            # Fallo del propio pool (p. ej. proceso caído): se mide desde el envío
+            return f"Error executing tool '{name}': {str(e)}", True, submitted, time.time_ns()
+
+    def shutdown(self):
+        """Libera los pools de ejecución de herramientas."""
+        with self._pool_lock:
+            pools = [self._thread_pool, self._process_pool]
+            self._thread_pool = self._process_pool = None
+        for pool in pools:
+            if pool is not None:
+                pool.shutdown(wait=True)
+
+    def _prepare(self, name: str, arguments_json: str) -> Tuple[Optional[str], Optional[BaseModel], Optional[Tuple]]:
+        """
+        Valida la llamada y consulta la memoización. Devuelve (salida inmediata, entrada
+        validada, clave de memo); la salida inmediata es un error o un acierto de memo.
+        """
         if name not in self._tools:
-            return f"Error: Tool '{name}' not found."
-        
+            return f"Error: Tool '{name}' not found.", None, None
+
         try:
             args_dict = json.loads(arguments_json)
+        except json.JSONDecodeError:
+            return "Error: Invalid JSON arguments.", None, None
+
+        try:
             model_class = self._models[name]
             input_data = model_class(**args_dict)
-            
-            result = self._tools[name](input_data)
-            
-            # If result is a Pydantic model, dump to JSON
-            if isinstance(result, BaseModel):
-                return result.model_dump_json()
-            return str(result)
-            
-        except json.JSONDecodeError:
-            return "Error: Invalid JSON arguments."
         except Exception as e:
-            return f"Error executing tool '{name}': {str(e)}"
+            return f"Error executing tool '{name}': {str(e)}", None, None
+
+        # La clave sale de la entrada validada: un argumento omitido y su valor por defecto coinciden
+        memo_key = self._memo_key(name, input_data.model_dump(mode="json")) if self.memoize else None
+        if memo_key is not None:
+            with self._memo_lock:
+                cached = self._memo.get(memo_key)
+                if cached is not None:
+                    self._memo.move_to_end(memo_key)
+                    self.memo_hits += 1
+                    now = time.time_ns()
+                    self.tracer.record(f"tool.{name}", now, now, memo_hit=True)
+                    return cached, None, None
+                self.memo_misses += 1
+        return None, input_data, memo_key
+
+    def _executor_for(self, name: str, input_data: BaseModel) -> Executor:
+        snippet = getattr(input_data, "snippet", None) or ""
+        use_processes = (
+            name in self._cpu_bound
+            and self.process_snippet_threshold is not None
+            and len(snippet) >= self.process_snippet_threshold
+        )
+        with self._pool_lock:
+            if use_processes:
+                if self._process_pool is None:
+                    self._process_pool = ProcessPoolExecutor(max_workers=self.max_workers)
+                return self._process_pool
+            if self._thread_pool is None:
+                self._thread_pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tool")
+            return self._thread_pool
+
+    def memo_stats(self) -> Dict[str, int]:
+        """Devuelve los contadores de la caché de resultados de herramientas."""
+        with self._memo_lock:
+            return {"hits": self.memo_hits, "misses": self.memo_misses, "entries": len(self._memo)}
+
+    def clear_memo(self):
+        with self._memo_lock:
+            self._memo.clear()
+
+    def _memo_key(self, name: str, args_dict: Any) -> Optional[Tuple]:
+        """Clave canónica de memoización; None si los argumentos no son cacheables."""
+        try:
+            canonical_args = json.dumps(args_dict, sort_keys=True, separators=(",", ":"))
+        except (TypeError, ValueError):
+            return None
+
+        file_stamp = None
+        if isinstance(args_dict, dict) and isinstance(args_dict.get("file_path"), str):
+            try:
+                stat = os.stat(args_dict["file_path"])
+            except OSError:
+                return None
+            file_stamp = (stat.st_mtime_ns, stat.st_size)
+
+        return (name, canonical_args, file_stamp)
+
+    def _remember(self, memo_key: Tuple, output: str):
+        with self._memo_lock:
+            self._memo[memo_key] = output
+            self._memo.move_to_end(memo_key)
+            while len(self._memo) > self.memo_max_entries:
+                self._memo.popitem(last=False)
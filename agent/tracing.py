@@ -0,0 +1,183 @@
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("triage_current_span", default=None)
+
+# Prefijo de los atributos de uso de tokens (convenciones semánticas GenAI de OpenTelemetry)
+USAGE_PREFIX = "gen_ai.usage."
+
+
+def _iso(time_ns: int) -> str:
+    return datetime.fromtimestamp(time_ns / 1e9, tz=timezone.utc).isoformat()
+
+
+class Span:
+    """Intervalo medido de una fase del análisis, con atributos y relación padre-hijo."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict[str, Any], start_ns: Optional[int] = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.start_ns = start_ns if start_ns is not None else time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = dict(attributes)
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: Dict[str, Any]):
+        self.attributes.update(attributes)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Formato compatible con el exportador JSON de spans de OpenTelemetry."""
+        return {
+            "name": self.name,
+            "context": {"trace_id": f"0x{self.trace_id}", "span_id": f"0x{self.span_id}"},
+            "parent_id": f"0x{self.parent_id}" if self.parent_id else None,
+            "start_time": _iso(self.start_ns),
+            "end_time": _iso(self.end_ns or self.start_ns),
+            "duration_ms": round(self.duration_ms, 3),
+            "status": {"status_code": "ERROR", "description": self.error} if self.error else {"status_code": "OK"},
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def set_attributes(self, attributes: Dict[str, Any]):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _PhaseStats:
+    def __init__(self):
+        self.durations: List[float] = []
+        self.errors = 0
+        self.usage: Dict[str, int] = {}
+
+
+class Tracer:
+    """
+    Registro de spans por fase (construcción del prompt, llamadas al LLM, herramientas,
+    parseo y validación). Cada span se agrega en memoria para el resumen de --profile
+    y, si se indica trace_path, se escribe como una línea JSONL.
+
+    Deshabilitado (enabled=False), span() no mide nada y su coste es despreciable.
+    """
+
+    def __init__(self, trace_path: Optional[str] = None, enabled: bool = True):
+        self.enabled = enabled
+        self.trace_path = trace_path
+        self._phases: Dict[str, _PhaseStats] = {}
+        self._lock = threading.Lock()
+        self._file = None
+        if enabled and trace_path:
+            directory = os.path.dirname(os.path.abspath(trace_path))
+            os.makedirs(directory, exist_ok=True)
+            self._file = open(trace_path, "w", encoding="utf-8")
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Any]:
+        """Mide el bloque como un span hijo del span activo en el contexto actual."""
+        if not self.enabled:
+            yield _NOOP_SPAN
+            return
+        span = Span(name, _current_span.get(), attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end_ns = time.time_ns()
+            self._finish(span)
+
+    def record(self, name: str, start_ns: int, end_ns: int, error: Optional[str] = None, **attributes):
+        """Registra un span medido fuera del contexto actual (p. ej. en un pool de procesos)."""
+        if not self.enabled:
+            return
+        span = Span(name, _current_span.get(), attributes, start_ns=start_ns)
+        span.end_ns = end_ns
+        span.error = error
+        self._finish(span)
+
+    def _finish(self, span: Span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str) if self._file is not None else None
+        with self._lock:
+            phase = self._phases.setdefault(span.name, _PhaseStats())
+            phase.durations.append(span.duration_ms)
+            if span.error:
+                phase.errors += 1
+            for key, value in span.attributes.items():
+                if key.startswith(USAGE_PREFIX) and isinstance(value, int):
+                    name = key[len(USAGE_PREFIX):]
+                    phase.usage[name] = phase.usage.get(name, 0) + value
+            if line is not None:
+                self._file.write(line + "\n")
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Estadísticas por fase, ordenadas por tiempo total descendente."""
+        rows = []
+        with self._lock:
+            for name, phase in self._phases.items():
+                ordered = sorted(phase.durations)
+                total = sum(ordered)
+                rows.append(
+                    {
+                        "phase": name,
+                        "count": len(ordered),
+                        "errors": phase.errors,
+                        "total_ms": total,
+                        "mean_ms": total / len(ordered),
+                        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+                        "max_ms": ordered[-1],
+                        "usage": dict(phase.usage),
+                    }
+                )
+        rows.sort(key=lambda row: row["total_ms"], reverse=True)
+        return rows
+
+    def format_summary(self) -> str:
+        """Tabla de texto con el resumen por fase."""
+        rows = self.summary()
+        if not rows:
+            return "Sin spans registrados."
+        header = f"{'Fase':<32} {'n':>6} {'err':>4} {'total (s)':>10} {'media (ms)':>11} {'p95 (ms)':>10} {'máx (ms)':>10}"
+        lines = [header, "-" * len(header)]
+        for row in rows:
+            lines.append(
+                f"{row['phase']:<32} {row['count']:>6} {row['errors']:>4} {row['total_ms'] / 1000:>10.3f} "
+                f"{row['mean_ms']:>11.1f} {row['p95_ms']:>10.1f} {row['max_ms']:>10.1f}"
+            )
+        for row in rows:
+            if row["usage"]:
+                usage = ", ".join(f"{key}={value}" for key, value in sorted(row["usage"].items()))
+                lines.append(f"Tokens en {row['phase']}: {usage}")
+        return "\n".join(lines)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
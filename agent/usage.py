@@ -0,0 +1,46 @@
+import threading
+from typing import Any, Dict
+
+
+def usage_counts(response: Any) -> Dict[str, int]:
+    """Tokens de una respuesta de chat.completions (0 en los campos ausentes)."""
+    usage = getattr(response, "usage", None)
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        "cached_tokens": getattr(details, "cached_tokens", 0) or 0,
+    }
+
+
+class UsageStats:
+    """
+    Acumula el uso de tokens reportado por la API (campo usage de cada respuesta),
+    separando los tokens de prompt servidos desde la caché del proveedor.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0
+        self.completion_tokens = 0
+        self._lock = threading.Lock()
+
+    def record(self, response: Any):
+        """Suma el uso de una respuesta de chat.completions; ignora respuestas sin usage."""
+        counts = usage_counts(response)
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += counts["prompt_tokens"]
+            self.cached_prompt_tokens += counts["cached_tokens"]
+            self.completion_tokens += counts["completion_tokens"]
+
+    def summary(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_prompt_tokens": self.cached_prompt_tokens,
+                "uncached_prompt_tokens": self.prompt_tokens - self.cached_prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+            }
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from pydantic import ValidationError
+
+from agent.schemas import VulnerabilityAnalysis
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = ".triage_cache.sqlite"
+
+
+class VerdictCache:
+    """
+    Caché persistente (SQLite) de veredictos del LLM, direccionada por contenido.
+
+    La clave combina el hash del archivo fuente, los campos del hallazgo, el modelo
+    y la versión del prompt, de modo que cualquier cambio invalida la entrada.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        max_entries: int = 50_000,
+        max_age_seconds: Optional[float] = 30 * 24 * 3600,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS verdicts (
+                key TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_verdicts_accessed ON verdicts (accessed_at)")
+        self._conn.commit()
+        self.evict()
+
+    @staticmethod
+    def make_key(source_bytes: bytes, finding: Dict[str, Any], model: str, prompt_version: str) -> str:
+        """Calcula la clave de caché a partir del contenido y los parámetros del análisis."""
+        digest = hashlib.sha256()
+        digest.update(hashlib.sha256(source_bytes).digest())
+        digest.update(json.dumps(finding, sort_keys=True, default=str).encode("utf-8"))
+        digest.update(model.encode("utf-8"))
+        digest.update(prompt_version.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[VulnerabilityAnalysis]:
+        """Devuelve el veredicto almacenado o None si no existe o ha caducado."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, created_at FROM verdicts WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or self._expired(row[1], now):
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE verdicts SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+
+        try:
+            analysis = VulnerabilityAnalysis.model_validate_json(row[0])
+        except ValidationError as e:
+            logger.warning(f"Entrada de caché inválida descartada ({key[:12]}): {e}")
+            self.delete(key)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return analysis
+
+    def put(self, key: str, analysis: VulnerabilityAnalysis):
+        """Guarda (o reemplaza) un veredicto."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO verdicts (key, payload, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, analysis.model_dump_json(), now, now),
+            )
+            self._conn.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM verdicts WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def evict(self):
+        """Elimina entradas caducadas y, si se supera max_entries, las menos usadas recientemente."""
+        with self._lock:
+            if self.max_age_seconds is not None:
+                self._conn.execute(
+                    "DELETE FROM verdicts WHERE created_at < ?", (time.time() - self.max_age_seconds,)
+                )
+            self._conn.execute(
+                """DELETE FROM verdicts WHERE key IN (
+                    SELECT key FROM verdicts ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )""",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def close(self):
+        self.evict()
+        with self._lock:
+            self._conn.close()
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.max_age_seconds is not None and now - created_at > self.max_age_seconds
@@ -0,0 +1,292 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+_FIELD = re.compile(r"^(ID|Type|File|Source Line|Sink Line):\s*(.+)$", re.MULTILINE)
+
+
+class MockSettings:
+    """Parámetros de comportamiento del servidor simulado."""
+
+    def __init__(
+        self,
+        latency: float = 0.2,
+        jitter: float = 0.05,
+        error_rate: float = 0.0,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+
+
+class _Bucket:
+    def __init__(self, limit: Optional[float]):
+        self.limit = limit
+        self.available = limit
+        self._updated = time.monotonic()
+
+    def take(self, amount: float) -> bool:
+        if self.limit is None:
+            return True
+        now = time.monotonic()
+        self.available = min(self.limit, self.available + (now - self._updated) * self.limit / 60)
+        self._updated = now
+        if self.available < amount:
+            return False
+        self.available -= amount
+        return True
+
+    def headers(self, kind: str) -> Dict[str, str]:
+        if self.limit is None:
+            return {}
+        remaining = max(0, int(self.available))
+        reset = (self.limit - remaining) * 60 / self.limit
+        return {
+            f"x-ratelimit-limit-{kind}": str(int(self.limit)),
+            f"x-ratelimit-remaining-{kind}": str(remaining),
+            f"x-ratelimit-reset-{kind}": f"{reset:.3f}s",
+        }
+
+
+class MockState:
+    """Estado compartido entre peticiones: límites simulados y contadores."""
+
+    def __init__(self, settings: MockSettings):
+        self.settings = settings
+        self.requests = _Bucket(settings.requests_per_minute)
+        self.tokens = _Bucket(settings.tokens_per_minute)
+        self.lock = threading.Lock()
+        self.served = 0
+        self.rejected = 0
+
+    def admit(self, tokens: int) -> Tuple[bool, Dict[str, str]]:
+        """Aplica los límites simulados; devuelve (aceptada, cabeceras x-ratelimit-*)."""
+        with self.lock:
+            injected = random.random() < self.settings.error_rate
+            accepted = not injected and self.requests.take(1) and self.tokens.take(tokens)
+            headers = {**self.requests.headers("requests"), **self.tokens.headers("tokens")}
+            if accepted:
+                self.served += 1
+            else:
+                self.rejected += 1
+        return accepted, headers
+
+
+def _estimate_tokens(payload: Dict[str, Any]) -> int:
+    return len(json.dumps(payload.get("messages", []), default=str)) // 4 + 1
+
+
+def _message_text(message: Dict[str, Any]) -> str:
+    content = message.get("content")
+    return content if isinstance(content, str) else ""
+
+
+def _prompt_fields(text: str) -> Dict[str, str]:
+    return {key: value.strip() for key, value in _FIELD.findall(text)}
+
+
+def _analysis(finding_id: str, file_path: str, source_line: int, sink_line: int) -> Dict[str, Any]:
+    return {
+        "id": finding_id,
+        "classification": "True Positive",
+        "severity": "High",
+        "trace": {
+            "file": file_path,
+            "function": "unknown",
+            "source_line": source_line,
+            "sink_line": sink_line,
+            "flow": ["source", "sink"],
+        },
+        "sanitizers": [],
+        "assumptions": ["Respuesta simulada del servidor de benchmark"],
+        "justification": "Veredicto sintético generado por el servidor simulado.",
+        "counterexample": None,
+    }
+
+
+def _int(value: Optional[str], default: int = 1) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _tool_calls(fields: Dict[str, str], tool_names: List[str]) -> List[Dict[str, Any]]:
+    """Llamadas a herramientas equivalentes a las que pediría el modelo para un hallazgo."""
+    file_path = fields.get("File", "")
+    source_line = _int(fields.get("Source Line"))
+    sink_line = _int(fields.get("Sink Line"))
+    vulnerability_type = fields.get("Type", "")
+    arguments = {
+        "get_code_context": {"file_path": file_path, "source_line": source_line, "sink_line": sink_line, "mode": "function"},
+        "detect_taint_flow": {"file_path": file_path, "source_line": source_line, "sink_line": sink_line},
+        "detect_sink": {
+            "vulnerability_type": vulnerability_type, "file_path": file_path,
+            "mode": "ast", "sink_line": sink_line, "source_line": source_line,
+        },
+        "detect_sanitizers": {
+            "vulnerability_type": vulnerability_type, "file_path": file_path,
+            "mode": "ast", "sink_line": sink_line, "source_line": source_line,
+        },
+    }
+    return [
+        {
+            "id": f"call_{uuid.uuid4().hex[:12]}",
+            "type": "function",
+            "function": {"name": name, "arguments": json.dumps(arguments[name])},
+        }
+        for name in tool_names
+        if name in arguments
+    ]
+
+
+def build_reply(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Respuesta determinista a una petición chat.completions:
+    - petición de grupo (prompt con "analyses"): un veredicto por ID del prompt;
+    - primera petición con herramientas y sin evidencia: tool_calls a las cuatro herramientas;
+    - en otro caso (resultados de herramientas o evidencia precalculada): el veredicto JSON.
+    """
+    messages = payload.get("messages", [])
+    user_text = "\n".join(_message_text(m) for m in messages if m.get("role") == "user")
+    fields = _prompt_fields(user_text)
+    has_tool_results = any(m.get("role") == "tool" for m in messages)
+    tool_names = [t.get("function", {}).get("name") for t in payload.get("tools") or []]
+
+    message: Dict[str, Any] = {"role": "assistant", "content": None}
+    finish_reason = "stop"
+    if '"analyses"' in user_text:
+        ids = re.findall(r"^ID:\s*(.+)$", user_text, re.MULTILINE)
+        lines = re.findall(r"^(Source Line|Sink Line):\s*(\d+)$", user_text, re.MULTILINE)
+        pairs = [(int(lines[i][1]), int(lines[i + 1][1])) for i in range(0, len(lines) - 1, 2)]
+        analyses = [
+            _analysis(finding_id.strip(), fields.get("File", ""), *(pairs[n] if n < len(pairs) else (1, 1)))
+            for n, finding_id in enumerate(ids)
+        ]
+        message["content"] = json.dumps({"analyses": analyses})
+    elif tool_names and not has_tool_results and not payload.get("response_format"):
+        message["tool_calls"] = _tool_calls(fields, tool_names)
+        finish_reason = "tool_calls"
+    else:
+        message["content"] = json.dumps(
+            _analysis(
+                fields.get("ID", "unknown"),
+                fields.get("File", ""),
+                _int(fields.get("Source Line")),
+                _int(fields.get("Sink Line")),
+            )
+        )
+
+    prompt_tokens = _estimate_tokens(payload)
+    completion_tokens = len(json.dumps(message)) // 4 + 1
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": payload.get("model", "mock"),
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason, "logprobs": None}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "MockOpenAI/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send(400, {"error": {"message": "JSON inválido", "type": "invalid_request_error"}})
+            return
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send(404, {"error": {"message": f"Ruta no soportada: {self.path}", "type": "invalid_request_error"}})
+            return
+
+        state: MockState = self.server.state
+        settings = state.settings
+        accepted, headers = state.admit(_estimate_tokens(payload))
+        if not accepted:
+            headers["retry-after-ms"] = "200"
+            self._send(
+                429,
+                {"error": {"message": "Rate limit reached (simulado)", "type": "requests", "code": "rate_limit_exceeded"}},
+                headers,
+            )
+            return
+
+        time.sleep(max(0.0, random.gauss(settings.latency, settings.jitter)))
+        self._send(200, build_reply(payload), headers)
+
+
+class MockOpenAIServer(ThreadingHTTPServer):
+    """Servidor HTTP local que imita /v1/chat/completions (incluido Function Calling)."""
+
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, settings: Optional[MockSettings] = None):
+        super().__init__((host, port), _Handler)
+        self.state = MockState(settings or MockSettings())
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que simula la API de chat.completions de OpenAI")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0, help="Puerto (0 = libre)")
+    parser.add_argument("--latency", type=float, default=0.2, help="Latencia media por petición (segundos)")
+    parser.add_argument("--jitter", type=float, default=0.05, help="Desviación de la latencia (segundos)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probabilidad de responder 429 a una petición")
+    parser.add_argument("--rpm", type=float, help="Límite simulado de peticiones por minuto")
+    parser.add_argument("--tpm", type=float, help="Límite simulado de tokens por minuto")
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(
+        args.host,
+        args.port,
+        MockSettings(args.latency, args.jitter, args.error_rate, args.rpm, args.tpm),
+    )
+    # La primera línea de salida es la URL base, para que el runner pueda leerla
+    print(server.base_url, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmark.workload import DEFAULT_TEMPLATE_FINDINGS, DEFAULT_TEMPLATE_SOURCE, generate_workload
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = ("cli", "agent")
+
+# Métricas comparadas con el baseline: (clave, etiqueta, mayor es mejor)
+METRICS = [
+    ("findings_per_sec", "hallazgos/s", True),
+    ("latency_p50_ms", "latencia p50 (ms)", False),
+    ("latency_p95_ms", "latencia p95 (ms)", False),
+    ("tool_seconds", "tiempo en herramientas (s)", False),
+    ("peak_rss_mb", "RSS máximo (MB)", False),
+    ("requests", "peticiones al LLM", False),
+    ("retries", "reintentos", False),
+]
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Percentil q (0-100) por interpolación lineal; 0 si no hay valores."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def peak_rss_mb() -> float:
+    """RSS máximo del proceso actual en MB (0 si la plataforma no lo expone)."""
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa en KB y macOS en bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+# ---------------------------------------------------------------------- proceso hijo
+
+
+class Timings:
+    """Latencias por hallazgo y tiempo en herramientas recogidos durante una ejecución."""
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.tool_seconds = 0.0
+        self.agent = None
+        self._lock = threading.Lock()
+
+    def add_latency(self, seconds: float, count: int = 1):
+        with self._lock:
+            self.latencies.extend([seconds] * count)
+
+    def add_tool_time(self, seconds: float):
+        with self._lock:
+            self.tool_seconds += seconds
+
+
+def instrument(timings: Timings):
+    """
+    Envuelve los puntos de medida del pipeline sin modificarlo: análisis por hallazgo
+    (individual y por grupo), ejecución de herramientas y creación del agente.
+    """
+    import agent.batch as batch
+    from agent.security_agent import SecurityValidationAgent
+    from agent.tool_registry import SmartToolRegistry
+
+    analyze_finding = batch.analyze_finding
+    run_group = batch._run_group
+    execute_many = SmartToolRegistry.execute_many
+    agent_init = SecurityValidationAgent.__init__
+
+    def timed_analyze_finding(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return analyze_finding(*args, **kwargs)
+        finally:
+            timings.add_latency(time.perf_counter() - start)
+
+    def timed_run_group(agent, group, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return run_group(agent, group, *args, **kwargs)
+        finally:
+            # La latencia de un hallazgo agrupado es la de su grupo
+            timings.add_latency(time.perf_counter() - start, len(group))
+
+    def timed_execute_many(self, calls):
+        start = time.perf_counter()
+        try:
+            return execute_many(self, calls)
+        finally:
+            timings.add_tool_time(time.perf_counter() - start)
+
+    def tracked_init(self, *args, **kwargs):
+        agent_init(self, *args, **kwargs)
+        timings.agent = self
+
+    batch.analyze_finding = timed_analyze_finding
+    batch._run_group = timed_run_group
+    SmartToolRegistry.execute_many = timed_execute_many
+    SecurityValidationAgent.__init__ = tracked_init
+
+
+def _run_cli(findings_path: str, output_dir: str, workers: int, pre_triage: bool, cli_args: List[str]) -> Tuple[int, int]:
+    import cli
+
+    argv = [
+        "cli.py",
+        findings_path,
+        "--output", os.path.join(output_dir, "report.json"),
+        "--workers", str(workers),
+        "--no-cache",
+    ]
+    if not pre_triage:
+        argv.append("--no-pre-triage")
+    sys.argv = argv + cli_args
+    cli.main()
+    with open(os.path.join(output_dir, "report.json"), "r", encoding="utf-8") as f:
+        analyzed = len(json.load(f))
+    return analyzed, 0
+
+
+def _run_agent(findings_path: str, workers: int, pre_triage: bool) -> Tuple[int, int]:
+    from agent.batch import iter_batch_results
+    from agent.pre_triage import DEFAULT_PRE_TRIAGE_THRESHOLD
+    from agent.security_agent import SecurityValidationAgent
+    from ingestion.readers import iter_findings
+
+    agent = SecurityValidationAgent(
+        max_concurrent_requests=max(1, workers),
+        pre_triage_threshold=DEFAULT_PRE_TRIAGE_THRESHOLD if pre_triage else None,
+    )
+    analyzed = errors = 0
+    try:
+        for result in iter_batch_results(agent, iter_findings(findings_path), workers=workers):
+            if result.error is None:
+                analyzed += 1
+            else:
+                errors += 1
+    finally:
+        agent.registry.shutdown()
+    return analyzed, errors
+
+
+def run_child(target: str, findings_path: str, output_dir: str, workers: int, pre_triage: bool, cli_args: List[str]) -> Dict[str, Any]:
+    """Ejecuta un objetivo instrumentado en el proceso actual y devuelve sus métricas."""
+    timings = Timings()
+    instrument(timings)
+    # Los logs INFO por petición distorsionan la medida
+    logging.disable(logging.INFO)
+
+    start = time.perf_counter()
+    if target == "cli":
+        analyzed, errors = _run_cli(findings_path, output_dir, workers, pre_triage, cli_args)
+    else:
+        analyzed, errors = _run_agent(findings_path, workers, pre_triage)
+    elapsed = time.perf_counter() - start
+
+    requests = retries = 0
+    if timings.agent is not None:
+        requests = timings.agent.usage.summary()["requests"]
+        retries = timings.agent.scheduler.summary()["retries"]
+    latencies_ms = [seconds * 1000 for seconds in timings.latencies]
+    return {
+        "target": target,
+        "findings": analyzed + errors,
+        "analyzed": analyzed,
+        "errors": errors,
+        "wall_seconds": round(elapsed, 3),
+        "findings_per_sec": round(analyzed / elapsed, 2) if elapsed else 0.0,
+        "latency_p50_ms": round(percentile(latencies_ms, 50), 1),
+        "latency_p95_ms": round(percentile(latencies_ms, 95), 1),
+        "tool_seconds": round(timings.tool_seconds, 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "requests": requests,
+        "retries": retries,
+    }
+
+
+# ---------------------------------------------------------------------- proceso padre
+
+
+def start_mock_server(args: argparse.Namespace) -> Tuple[subprocess.Popen, str]:
+    """Arranca el servidor simulado en un proceso aparte y devuelve (proceso, URL base)."""
+    command = [
+        sys.executable, "-m", "benchmark.mock_server",
+        "--latency", str(args.latency),
+        "--jitter", str(args.jitter),
+        "--error-rate", str(args.error_rate),
+    ]
+    if args.mock_rpm:
+        command += ["--rpm", str(args.mock_rpm)]
+    if args.mock_tpm:
+        command += ["--tpm", str(args.mock_tpm)]
+    process = subprocess.Popen(command, cwd=REPO_ROOT, stdout=subprocess.PIPE, text=True)
+    base_url = process.stdout.readline().strip()
+    if not base_url:
+        process.kill()
+        raise RuntimeError("El servidor simulado no arrancó")
+    return process, base_url
+
+
+def run_target(
+    target: str,
+    base_url: str,
+    findings_path: str,
+    workdir: str,
+    args: argparse.Namespace,
+    cli_args: List[str],
+) -> Dict[str, Any]:
+    """Ejecuta un objetivo en un proceso hijo (RSS aislado) contra el servidor simulado."""
+    output_dir = os.path.join(workdir, f"out_{target}")
+    os.makedirs(output_dir, exist_ok=True)
+    stats_path = os.path.join(output_dir, "stats.json")
+    command = [
+        sys.executable, "-m", "benchmark.runner", "--child", target,
+        "--stats-out", stats_path,
+        "--findings-path", findings_path,
+        "--output-dir", output_dir,
+        "--workers", str(args.workers),
+    ]
+    if args.pre_triage:
+        command.append("--pre-triage")
+    command += cli_args
+
+    env = dict(os.environ, OPENAI_BASE_URL=base_url, OPENAI_API_KEY="mock")
+    completed = subprocess.run(
+        command, cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+    if completed.returncode != 0 or not os.path.exists(stats_path):
+        raise RuntimeError(f"Fallo al ejecutar '{target}':\n{completed.stderr[-2000:]}")
+    with open(stats_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def format_results(results: Dict[str, Dict[str, Any]], baseline: Optional[Dict[str, Any]] = None) -> str:
+    """Tabla de métricas por objetivo, con la variación respecto al baseline si se indica."""
+    lines = []
+    for target, stats in results.items():
+        lines.append(
+            f"\n[{target}] {stats['analyzed']}/{stats['findings']} hallazgos en {stats['wall_seconds']}s"
+            + (f" ({stats['errors']} errores)" if stats["errors"] else "")
+        )
+        previous = (baseline or {}).get("results", {}).get(target)
+        for key, label, higher_is_better in METRICS:
+            line = f"  {label:<28} {stats[key]:>10}"
+            if previous and previous.get(key):
+                delta = (stats[key] - previous[key]) / previous[key] * 100
+                better = (delta > 0) == higher_is_better
+                line += f"   baseline {previous[key]:>10}  {delta:+6.1f}%" + (" mejor" if better and delta else "")
+            lines.append(line)
+    return "\n".join(lines)
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> Tuple[argparse.Namespace, List[str]]:
+    parser = argparse.ArgumentParser(
+        description="Benchmark offline del pipeline contra un servidor OpenAI simulado. "
+        "Los argumentos no reconocidos se pasan a cli.py."
+    )
+    parser.add_argument("--target", choices=TARGETS + ("both",), default="both", help="Qué medir")
+    parser.add_argument("--files", type=int, default=10, help="Archivos fuente sintéticos")
+    parser.add_argument("--copies-per-file", type=int, default=5, help="Copias de la plantilla por archivo")
+    parser.add_argument("--template-source", default=DEFAULT_TEMPLATE_SOURCE)
+    parser.add_argument("--template-findings", default=DEFAULT_TEMPLATE_FINDINGS)
+    parser.add_argument("--workdir", help="Directorio de trabajo (por defecto uno temporal)")
+    parser.add_argument("--workers", type=int, default=4, help="Hallazgos en paralelo")
+    parser.add_argument("--pre-triage", action="store_true", help="Mantiene el pre-triage determinista activo")
+    parser.add_argument("--latency", type=float, default=0.2, help="Latencia media simulada por petición (s)")
+    parser.add_argument("--jitter", type=float, default=0.05, help="Desviación de la latencia simulada (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probabilidad de inyectar un 429")
+    parser.add_argument("--mock-rpm", type=float, help="Límite simulado de peticiones por minuto")
+    parser.add_argument("--mock-tpm", type=float, help="Límite simulado de tokens por minuto")
+    parser.add_argument("--save", help="Guarda los resultados en JSON (para usar como baseline)")
+    parser.add_argument("--baseline", help="Resultados previos (--save) con los que comparar")
+    # Uso interno: ejecución instrumentada de un objetivo en el proceso hijo
+    parser.add_argument("--child", choices=TARGETS, help=argparse.SUPPRESS)
+    parser.add_argument("--stats-out", help=argparse.SUPPRESS)
+    parser.add_argument("--findings-path", help=argparse.SUPPRESS)
+    parser.add_argument("--output-dir", help=argparse.SUPPRESS)
+    return parser.parse_known_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args, cli_args = _parse_args(argv)
+
+    if args.child:
+        stats = run_child(args.child, args.findings_path, args.output_dir, args.workers, args.pre_triage, cli_args)
+        with open(args.stats_out, "w", encoding="utf-8") as f:
+            json.dump(stats, f)
+        return
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="triage_bench_")
+    findings_path, count = generate_workload(
+        os.path.join(workdir, "workload"),
+        files=args.files,
+        copies_per_file=args.copies_per_file,
+        template_source=args.template_source,
+        template_findings=args.template_findings,
+    )
+    print(f"Carga: {count} hallazgos en {args.files} archivos ({workdir})")
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    targets = TARGETS if args.target == "both" else (args.target,)
+    server, base_url = start_mock_server(args)
+    results: Dict[str, Dict[str, Any]] = {}
+    try:
+        for target in targets:
+            print(f"Ejecutando {target}...")
+            results[target] = run_target(target, base_url, findings_path, workdir, args, cli_args)
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(format_results(results, baseline))
+
+    if args.save:
+        config = {
+            key: getattr(args, key)
+            for key in ("files", "copies_per_file", "workers", "pre_triage", "latency", "jitter", "error_rate", "mock_rpm", "mock_tpm")
+        }
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"config": config, "cli_args": cli_args, "results": results}, f, indent=2)
+        print(f"\nResultados guardados en {args.save}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import argparse
+import json
+import os
+import re
+from typing import Any, Dict, List, Tuple
+
+DEFAULT_TEMPLATE_SOURCE = os.path.join("sample", "sample.py")
+DEFAULT_TEMPLATE_FINDINGS = os.path.join("sample", "findings.json")
+
+_IMPORT = re.compile(r"^(import|from)\s")
+_TOP_LEVEL_DEF = re.compile(r"^(?:async\s+)?def\s+(\w+)|^class\s+(\w+)", re.MULTILINE)
+
+
+def _split_template(source: str) -> Tuple[List[str], List[str]]:
+    """Separa las importaciones iniciales del cuerpo y descarta el bloque if __name__ final."""
+    lines = source.splitlines()
+    header_end = 0
+    for number, line in enumerate(lines):
+        if _IMPORT.match(line) or not line.strip():
+            header_end = number + 1
+            continue
+        break
+    body = lines[header_end:]
+    for number, line in enumerate(body):
+        if line.startswith("if __name__"):
+            body = body[:number]
+            break
+    while body and not body[-1].strip():
+        body.pop()
+    return lines[:header_end], body
+
+
+def _rename(body: List[str], suffix: str) -> List[str]:
+    """Renombra las funciones y clases de nivel superior (y sus usos) para que cada copia sea distinta."""
+    text = "\n".join(body)
+    names = {match.group(1) or match.group(2) for match in _TOP_LEVEL_DEF.finditer(text)}
+    if names:
+        pattern = re.compile(r"\b(" + "|".join(sorted(map(re.escape, names))) + r")\b")
+        text = pattern.sub(lambda m: f"{m.group(1)}{suffix}", text)
+    return text.splitlines()
+
+
+def _load_template_findings(path: str) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return data.get("vulnerabilities", []) if isinstance(data, dict) else data
+
+
+def generate_workload(
+    output_dir: str,
+    files: int = 10,
+    copies_per_file: int = 5,
+    template_source: str = DEFAULT_TEMPLATE_SOURCE,
+    template_findings: str = DEFAULT_TEMPLATE_FINDINGS,
+    jsonl: bool = False,
+) -> Tuple[str, int]:
+    """
+    Genera `files` archivos Python sintéticos, cada uno con `copies_per_file` copias
+    renombradas del cuerpo de la plantilla, y un archivo de hallazgos con las líneas
+    de la plantilla desplazadas a cada copia.
+
+    Devuelve (ruta del archivo de hallazgos, número de hallazgos).
+    """
+    with open(template_source, "r", encoding="utf-8") as f:
+        header, body = _split_template(f.read())
+    header_offset = len(header)
+    template = _load_template_findings(template_findings)
+
+    src_dir = os.path.join(output_dir, "src")
+    os.makedirs(src_dir, exist_ok=True)
+    findings: List[Dict[str, Any]] = []
+
+    for file_number in range(files):
+        file_path = os.path.join(src_dir, f"module_{file_number:04d}.py")
+        lines = list(header)
+        for copy in range(copies_per_file):
+            # Desplazamiento de la línea 1 de la plantilla dentro de esta copia
+            shift = len(lines) - header_offset
+            lines.extend(_rename(body, f"_{copy}"))
+            lines.extend(["", ""])
+            for raw in template:
+                finding = dict(raw)
+                finding["id"] = f"{raw.get('id')}_{file_number}_{copy}"
+                finding["file_path"] = file_path
+                for key in ("source_line", "sink_line"):
+                    if isinstance(raw.get(key), int) and raw[key] > header_offset:
+                        finding[key] = raw[key] + shift
+                findings.append(finding)
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    if jsonl:
+        findings_path = os.path.join(output_dir, "findings.jsonl")
+        with open(findings_path, "w", encoding="utf-8") as f:
+            for finding in findings:
+                f.write(json.dumps(finding, ensure_ascii=False) + "\n")
+    else:
+        findings_path = os.path.join(output_dir, "findings.json")
+        with open(findings_path, "w", encoding="utf-8") as f:
+            json.dump({"vulnerabilities": findings}, f, indent=2, ensure_ascii=False)
+    return findings_path, len(findings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generador de cargas sintéticas para el benchmark")
+    parser.add_argument("output_dir", help="Directorio de salida")
+    parser.add_argument("--files", type=int, default=10, help="Número de archivos fuente")
+    parser.add_argument("--copies-per-file", type=int, default=5, help="Copias de la plantilla por archivo")
+    parser.add_argument("--template-source", default=DEFAULT_TEMPLATE_SOURCE, help="Archivo fuente de plantilla")
+    parser.add_argument("--template-findings", default=DEFAULT_TEMPLATE_FINDINGS, help="Hallazgos de plantilla")
+    parser.add_argument("--jsonl", action="store_true", help="Escribe los hallazgos en formato JSONL")
+    args = parser.parse_args()
+
+    path, count = generate_workload(
+        args.output_dir,
+        files=args.files,
+        copies_per_file=args.copies_per_file,
+        template_source=args.template_source,
+        template_findings=args.template_findings,
+        jsonl=args.jsonl,
+    )
+    print(f"{count} hallazgos generados en {path}")
+
+
+if __name__ == "__main__":
+    main()
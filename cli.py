@@ -1,19 +1,131 @@
 import argparse
-import json
 import sys
 import os
+import traceback
+from agent.batch import DEFAULT_GROUP_TOKENS, iter_batch_results, iter_grouped_batch_results, order_by_file
+from agent.dedupe import FindingDeduplicator
+from agent.incremental import IncrementalPlan, git_changed_lines, load_previous_verdicts
+from agent.pre_triage import DEFAULT_PRE_TRIAGE_THRESHOLD
+from agent.rate_limiter import DEFAULT_MAX_RETRIES
+from agent.run_journal import RunJournal
 from agent.security_agent import SecurityValidationAgent
-from reporting.report_generator import JSONReporter, HTMLReporter
+from agent.tracing import Tracer
+from agent.verdict_cache import DEFAULT_CACHE_PATH, VerdictCache
+from ingestion.readers import iter_findings
+from reporting.report_generator import HTMLReporter, JSONLReporter, JSONReporter
+from tools.source_index import configure_source_index_cache, source_index_cache_stats
+
 
 def main():
     """
     Función principal del CLI para orquestar la validación de vulnerabilidades.
     """
     parser = argparse.ArgumentParser(description="AI Triage CLI - Validación de Análisis Estático")
-    parser.add_argument("file", help="Ruta al archivo JSON de vulnerabilidad")
-    parser.add_argument("--source", help="Ruta al archivo fuente Python a analizar", required=True)
+    parser.add_argument("file", help="Ruta al archivo de hallazgos (JSON, JSONL o SARIF)")
+    parser.add_argument(
+        "--source",
+        help="Ruta al archivo fuente Python a analizar; si se omite se usa la ruta de cada hallazgo",
+    )
+    parser.add_argument(
+        "--repo-root",
+        help="Raíz del repositorio: la ruta de cada hallazgo se resuelve dentro de ella y el análisis se agrupa por archivo",
+    )
+    parser.add_argument(
+        "--index-cache-mb",
+        type=int,
+        default=512,
+        help="Memoria aproximada máxima para los archivos parseados en caché; se descartan los menos usados",
+    )
     parser.add_argument("--api-key", help="Clave API de OpenAI (opcional, o configurar variable de entorno OPENAI_API_KEY)")
     parser.add_argument("--output", help="Ruta para guardar el reporte de salida (JSON)", default="report.json")
+    parser.add_argument("--workers", type=int, default=1, help="Número de hallazgos a analizar en paralelo")
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        help="Máximo de peticiones simultáneas al LLM durante la ejecución (por defecto igual a --workers); "
+        "la concurrencia real se adapta por debajo de este techo según los límites de la API",
+    )
+    parser.add_argument("--rpm", type=float, help="Presupuesto inicial de peticiones por minuto a la API")
+    parser.add_argument("--tpm", type=float, help="Presupuesto inicial de tokens por minuto a la API")
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=DEFAULT_MAX_RETRIES,
+        help="Reintentos por petición ante límites de la API (429), errores 5xx o de red",
+    )
+    parser.add_argument(
+        "--memoize-tools",
+        action="store_true",
+        help="Reutiliza resultados de herramientas con argumentos idénticos dentro de la ejecución",
+    )
+    parser.add_argument("--cache-path", default=DEFAULT_CACHE_PATH, help="Ruta de la caché persistente de veredictos (SQLite)")
+    parser.add_argument("--no-cache", action="store_true", help="Desactiva la caché de veredictos")
+    parser.add_argument("--refresh", action="store_true", help="Ignora la caché al leer pero actualiza sus entradas")
+    parser.add_argument("--cache-max-entries", type=int, default=50_000, help="Número máximo de veredictos en caché")
+    parser.add_argument("--cache-max-age-days", type=float, default=30, help="Antigüedad máxima de un veredicto en caché (días)")
+    parser.add_argument(
+        "--pre-triage-threshold",
+        type=float,
+        default=DEFAULT_PRE_TRIAGE_THRESHOLD,
+        help="Confianza mínima para clasificar un hallazgo con reglas deterministas sin llamar al LLM",
+    )
+    parser.add_argument("--no-pre-triage", action="store_true", help="Envía todos los hallazgos al LLM")
+    parser.add_argument(
+        "--context-max-tokens",
+        type=int,
+        help="Presupuesto aproximado de tokens del contexto de código precalculado (--prefetch-tools)",
+    )
+    parser.add_argument("--tool-workers", type=int, default=4, help="Herramientas de un mismo turno ejecutadas en paralelo")
+    parser.add_argument(
+        "--tool-process-threshold",
+        type=int,
+        help="Tamaño de snippet (caracteres) a partir del cual las herramientas AST se ejecutan en un pool de procesos",
+    )
+    parser.add_argument(
+        "--group-by-file",
+        action="store_true",
+        help="Analiza en una sola petición los hallazgos de un mismo archivo, con contexto compartido",
+    )
+    parser.add_argument(
+        "--group-max-tokens",
+        type=int,
+        default=DEFAULT_GROUP_TOKENS,
+        help="Presupuesto aproximado de tokens de prompt por grupo en --group-by-file",
+    )
+    parser.add_argument(
+        "--prefetch-tools",
+        action="store_true",
+        help="Ejecuta las herramientas antes de la primera llamada al LLM para obtener el veredicto en una sola petición",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Muestra al final un resumen de tiempos y tokens por fase (prompt, LLM, herramientas, validación)",
+    )
+    parser.add_argument("--trace", help="Escribe los spans de cada fase en un archivo JSONL (formato OpenTelemetry)")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Reanuda una ejecución interrumpida: omite los hallazgos ya registrados en el diario",
+    )
+    parser.add_argument(
+        "--journal",
+        help="Ruta del diario de ejecución (por defecto <output>.journal.jsonl)",
+    )
+    parser.add_argument(
+        "--dedupe",
+        action="store_true",
+        help="Agrupa los hallazgos equivalentes (archivo, función, llamada sink, tipo) y analiza uno por grupo",
+    )
+    parser.add_argument(
+        "--since",
+        metavar="REV",
+        help="Re-triage incremental: solo re-analiza los hallazgos en funciones cambiadas desde la revisión git REV",
+    )
+    parser.add_argument(
+        "--previous-report",
+        help="Reporte JSON/JSONL anterior cuyos veredictos se reutilizan con --since (por defecto el de --output)",
+    )
     
     args = parser.parse_args()
     
@@ -30,75 +142,230 @@ def main():
         print(f"Error: Archivo de hallazgos '{args.file}' no encontrado.")
         sys.exit(1)
 
-    if not os.path.exists(args.source):
+    if args.source and not os.path.exists(args.source):
         print(f"Error: Archivo fuente '{args.source}' no encontrado.")
         sys.exit(1)
-        
-    try:
-        with open(args.file, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    except FileNotFoundError:
-        print(f"Error: Archivo no encontrado: {args.file}")
+
+    if args.source and args.repo_root:
+        print("Error: --source y --repo-root son incompatibles.")
         sys.exit(1)
-    except json.JSONDecodeError:
-        print(f"Error: Archivo JSON inválido: {args.file}")
+
+    if args.repo_root and not os.path.isdir(args.repo_root):
+        print(f"Error: Directorio '{args.repo_root}' no encontrado.")
         sys.exit(1)
 
-    if isinstance(data, list):
-        vulnerabilities = data
-    elif "vulnerabilities" in data:
-        vulnerabilities = data["vulnerabilities"]
+    configure_source_index_cache(args.index_cache_mb * 1024 * 1024)
+
+    # El reporte anterior se lee antes de abrir los reporters, que lo sobrescriben
+    incremental = None
+    if args.since:
+        if args.previous_report:
+            previous_path = args.previous_report
+        elif args.output.endswith(".jsonl"):
+            previous_path = args.output
+        else:
+            previous_path = f"{os.path.splitext(args.output)[0]}.json"
+        try:
+            changed = git_changed_lines(args.since, args.repo_root or ".")
+            if os.path.exists(previous_path):
+                previous = load_previous_verdicts(previous_path)
+            elif args.previous_report:
+                print(f"Error: Reporte anterior '{previous_path}' no encontrado.")
+                sys.exit(1)
+            else:
+                print(f"Aviso: no hay reporte anterior en '{previous_path}'; se analizarán todos los hallazgos.")
+                previous = []
+        except ValueError as e:
+            print(f"Error: No se pudo preparar el re-triage incremental: {e}")
+            sys.exit(1)
+        incremental = IncrementalPlan(changed, previous)
+        print(
+            f"Re-triage incremental desde '{args.since}': {len(changed)} archivos cambiados, "
+            f"{len(previous)} veredictos previos en '{previous_path}'."
+        )
+
+    max_in_flight = args.max_in_flight or max(1, args.workers)
+    verdict_cache = None
+    if not args.no_cache:
+        verdict_cache = VerdictCache(
+            args.cache_path,
+            max_entries=args.cache_max_entries,
+            max_age_seconds=args.cache_max_age_days * 24 * 3600,
+        )
+
+    tracer = Tracer(trace_path=args.trace, enabled=args.profile or bool(args.trace))
+
+    agent = SecurityValidationAgent(
+        api_key=args.api_key,
+        max_concurrent_requests=max_in_flight,
+        verdict_cache=verdict_cache,
+        refresh_cache=args.refresh,
+        memoize_tools=args.memoize_tools,
+        pre_triage_threshold=None if args.no_pre_triage else args.pre_triage_threshold,
+        prefetch_tools=args.prefetch_tools,
+        tool_workers=args.tool_workers,
+        tool_process_threshold=args.tool_process_threshold,
+        context_max_tokens=args.context_max_tokens,
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm,
+        max_retries=args.max_retries,
+        tracer=tracer,
+        incremental=incremental,
+    )
+
+    # Reportes incrementales: cada resultado se escribe en cuanto se valida
+    metadata = {"Modelo": agent.model, "Huella del prompt": agent.prompt_fingerprint}
+    output_dir = os.path.dirname(args.output)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    if args.output.endswith(".jsonl"):
+        reporters = [JSONLReporter(metadata).open(args.output)]
     else:
-        vulnerabilities = [data]
+        reporters = [JSONReporter(metadata).open(f"{os.path.splitext(args.output)[0]}.json")]
+        if args.output.endswith(".html"):
+            reporters.append(HTMLReporter(metadata).open(args.output))
+    analyzed = 0
+
+    # Diario de ejecución: cada hallazgo completado se registra para poder reanudar con --resume
+    journal_path = args.journal or f"{os.path.splitext(args.output)[0]}.journal.jsonl"
+    journal = RunJournal(journal_path, resume=args.resume)
+    if args.resume:
+        print(f"Reanudando desde '{journal_path}' ({len(journal)} hallazgos ya completados).")
 
-    if args.output.endswith(".html"):
-        reporter = HTMLReporter()
+    # Los hallazgos se leen de forma incremental: el análisis empieza antes de terminar de leer el archivo
+    findings = iter_findings(
+        args.file,
+        file_path=args.source,
+        on_invalid=lambda index, error: print(f"Hallazgo #{index+1} inválido, se omite: {error}"),
+        repo_root=args.repo_root,
+    )
+    if args.repo_root and not args.group_by_file:
+        # Los hallazgos de un mismo archivo se analizan seguidos: un parseo por archivo
+        findings = order_by_file(findings)
+    if args.source:
+        print(f"Analizando hallazgos de '{args.file}' sobre '{args.source}'.\n")
+    elif args.repo_root:
+        print(f"Analizando hallazgos de '{args.file}' en el repositorio '{args.repo_root}'.\n")
     else:
-        reporter = JSONReporter()
+        print(f"Analizando hallazgos de '{args.file}'.\n")
 
-    agent = SecurityValidationAgent(api_key=args.api_key)
-    results = []
+    def run(findings):
+        if args.group_by_file:
+            return iter_grouped_batch_results(
+                agent, findings, workers=args.workers, max_group_tokens=args.group_max_tokens, journal=journal
+            )
+        return iter_batch_results(agent, findings, workers=args.workers, journal=journal)
 
-    print(f"Se encontraron {len(vulnerabilities)} hallazgos para analizar sobre '{args.source}'.\n")
+    # Con --dedupe solo se analiza un hallazgo por clúster; el veredicto se replica al resto
+    deduplicator = FindingDeduplicator() if args.dedupe else None
+    batch_results = deduplicator.iter_results(findings, run) if deduplicator is not None else run(findings)
 
-    for i, vuln in enumerate(vulnerabilities):
-        vuln_id = vuln.get("id", f"VULN-{i+1}")
-        print(f"[{i+1}/{len(vulnerabilities)}] Analizando {vuln_id} ({vuln.get('type') or vuln.get('vulnerability_type')})...")
-        
-        # Usar siempre el archivo fuente proporcionado por CLI
-        file_path = args.source
+    input_error = None
+    completed = False
+    failed = 0
+    try:
+        for result in batch_results:
+            finding = result.finding
+            print(f"[{result.index+1}] {finding.id} ({finding.vulnerability_type})...")
+            if result.error is None:
+                for reporter in reporters:
+                    reporter.write_one(result.analysis, finding.vulnerability_type)
+                analyzed += 1
+                print("  Ok.")
+            else:
+                failed += 1
+                print(f"  Error: {result.error}")
+                traceback.print_exception(result.error)
+        completed = True
+    except ValueError as e:
+        input_error = e
+    finally:
+        # Un reporte anterior solo se sustituye si el lote termina con algún análisis: es el
+        # --previous-report de --since
+        for reporter in reporters:
+            reporter.close(commit=completed and analyzed > 0)
+        if completed and not failed:
+            # Sin hallazgos fallidos no hay nada que reanudar
+            journal.discard()
+        else:
+            journal.close()
+        tracer.close()
 
+    if input_error is not None:
+        # JSON mal formado a mitad de archivo: los resultados ya obtenidos quedan en los .partial
+        print(f"Error: Archivo de hallazgos inválido: {args.file}: {input_error}")
+        for reporter in reporters:
+            print(f"Resultados parciales en: {reporter.partial_path} ({reporter.count} análisis)")
+        agent.registry.shutdown()
+        sys.exit(1)
 
-        try:
-            analysis = agent.analyze_vulnerability(
-                vulnerability_id=vuln_id,
-                file_path=file_path,
-                vulnerability_type=vuln.get("type") or vuln.get("vulnerability_type"),
-                source_line=vuln.get("source_line"),
-                sink_line=vuln.get("sink_line"),
-                message=vuln.get("message"),
-            )
-            results.append(analysis)
-            print("  Ok.")
-        except Exception as e:
-            print(f"  Error: {e}")
-            import traceback
-            traceback.print_exc()
-
-    if results:
-        base_output = os.path.splitext(args.output)[0]
-        json_output = f"{base_output}.json"
-        
-        json_reporter = JSONReporter()
-        json_reporter.generate_report(results, json_output)
-        print(f"\nReporte JSON generado en: {json_output}")
+    agent.registry.shutdown()
 
-        if args.output.endswith(".html"):
-            html_reporter = HTMLReporter()
-            html_reporter.generate_report(results, args.output)
-            print(f"Reporte HTML generado en: {args.output}")
+    usage = agent.usage.summary()
+    if usage["requests"]:
+        print(
+            f"\nUso de tokens ({usage['requests']} peticiones, prompt {agent.prompt_fingerprint}): "
+            f"{usage['prompt_tokens']} de prompt ({usage['cached_prompt_tokens']} en caché, "
+            f"{usage['uncached_prompt_tokens']} sin caché), {usage['completion_tokens']} de respuesta."
+        )
+
+    scheduling = agent.scheduler.summary()
+    if scheduling["retries"]:
+        print(
+            f"\nLímites de la API: {scheduling['rate_limited']} respuestas 429, {scheduling['retries']} reintentos; "
+            f"concurrencia final {scheduling['concurrency']}."
+        )
+
+    if journal.resumed:
+        print(f"\nReanudación: {journal.resumed} hallazgos recuperados del diario sin volver a analizarlos.")
+    if failed:
+        print(f"\nDiario conservado en '{journal_path}': --resume re-analiza solo los {failed} hallazgos fallidos.")
+
+    if deduplicator is not None:
+        print(
+            f"\nDeduplicación: {deduplicator.total} hallazgos en {deduplicator.clusters} clústeres; "
+            f"{deduplicator.duplicates} duplicados resueltos sin análisis propio ({deduplicator.ratio:.0%})."
+        )
+
+    if incremental is not None:
+        print(
+            f"\nRe-triage incremental: {incremental.reused} veredictos reutilizados, "
+            f"{incremental.touched} hallazgos tocados por el diff, {incremental.unknown} sin veredicto previo."
+        )
+
+    if agent.pre_triage is not None:
+        print(
+            f"\nPre-triage determinista: {agent.pre_triage.short_circuited} de "
+            f"{agent.pre_triage.evaluated} hallazgos resueltos sin LLM."
+        )
+
+    if args.memoize_tools:
+        stats = agent.registry.memo_stats()
+        print(f"\nMemoización de herramientas: {stats['hits']} aciertos, {stats['misses']} fallos.")
+
+    if verdict_cache is not None:
+        print(f"\nCaché de veredictos: {verdict_cache.hits} aciertos, {verdict_cache.misses} fallos.")
+        verdict_cache.close()
+
+    if args.repo_root:
+        index_stats = source_index_cache_stats()
+        print(
+            f"\nCaché de archivos parseados: {index_stats['loads']} parseos, {index_stats['hits']} reutilizaciones, "
+            f"{index_stats['evictions']} descartes por memoria."
+        )
+
+    if args.profile:
+        print("\nPerfil de ejecución por fase:")
+        print(tracer.format_summary())
+
+    if args.trace:
+        print(f"\nTraza de spans escrita en: {args.trace}")
+
+    if analyzed:
+        for reporter in reporters:
+            print(f"\nReporte generado en: {reporter.output_path} ({reporter.count} análisis)")
     else:
-        print("\nNo se generaron resultados exitosos.")
+        print("\nNo se generaron resultados exitosos; no se modifica ningún reporte anterior.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,178 @@
+import json
+from typing import Any, Iterator, TextIO
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+_WHITESPACE = " \t\r\n"
+
+# Caracteres que pueden seguir a un escalar completo (número, true, false, null)
+_DELIMITERS = _WHITESPACE + ",:]}"
+
+# Un valor truncado falla al final del buffer (como mucho un literal o un escape \uXXXX
+# antes); un error más atrás es de sintaxis y no se arregla leyendo más
+_TRUNCATION_MARGIN = 16
+
+
+class JsonStream:
+    """
+    Lector JSON incremental sobre un archivo de texto.
+
+    Permite recorrer objetos y arrays miembro a miembro y decodificar solo los valores
+    de interés (json.JSONDecoder.raw_decode sobre un buffer que crece por bloques). Los
+    valores que no interesan se saltan carácter a carácter sin construirlos, por lo que
+    la memoria depende del tamaño del elemento más grande, no del archivo.
+    """
+
+    def __init__(self, f: TextIO, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self._f = f
+        self._chunk_size = chunk_size
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    # ------------------------------------------------------------------ buffer
+
+    def _fill(self, min_size: int = 0) -> bool:
+        """Lee otro bloque; descarta lo ya consumido. Devuelve False al final del archivo."""
+        if self._eof:
+            return False
+        if self._pos:
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        chunk = self._f.read(max(self._chunk_size, min_size))
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer += chunk
+        return True
+
+    def _skip_ws(self):
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer) or not self._fill():
+                return
+
+    def peek(self) -> str:
+        """Siguiente carácter significativo sin consumirlo ('' al final del archivo)."""
+        self._skip_ws()
+        return self._buffer[self._pos] if self._pos < len(self._buffer) else ""
+
+    def _expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"JSON inválido: se esperaba '{char}' y se encontró '{self.peek() or 'EOF'}'")
+        self._pos += 1
+
+    # ------------------------------------------------------------------ valores
+
+    def _truncated(self, error: json.JSONDecodeError) -> bool:
+        """Indica si un error de decodificación puede deberse a que el buffer corta el valor."""
+        if error.msg.startswith("Unterminated string"):
+            return True
+        return error.pos >= len(self._buffer) - _TRUNCATION_MARGIN
+
+    def _delimited(self, end: int) -> bool:
+        """Indica si tras la posición end hay un delimitador que cierra el escalar."""
+        return any(char in _DELIMITERS for char in self._buffer[end:])
+
+    def read_value(self) -> Any:
+        """Decodifica el siguiente valor completo."""
+        self._skip_ws()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError as e:
+                if not self._truncated(e) or not self._fill(len(self._buffer)):
+                    raise
+                continue
+            # Un escalar sin delimitador detrás puede estar truncado: "12" de "123", "1" de "1.5"
+            if not isinstance(value, (dict, list, str)) and not self._eof and not self._delimited(end):
+                if self._fill():
+                    continue
+            self._pos = end
+            return value
+
+    def skip_value(self):
+        """Salta el siguiente valor sin construirlo."""
+        self._skip_ws()
+        depth = 0
+        in_string = False
+        escaped = False
+        while True:
+            if self._pos >= len(self._buffer):
+                if not self._fill():
+                    return
+            char = self._buffer[self._pos]
+            self._pos += 1
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == "\\":
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+                    if depth == 0:
+                        return
+                continue
+            if char == '"':
+                in_string = True
+            elif char in "[{":
+                depth += 1
+            elif char in "]}":
+                if depth == 0:
+                    # Cierre del contenedor padre tras un escalar
+                    self._pos -= 1
+                    return
+                depth -= 1
+                if depth == 0:
+                    return
+            elif depth == 0 and char in ",:" + _WHITESPACE:
+                # Fin de un escalar de nivel superior (número, true, false, null)
+                self._pos -= 1
+                return
+
+    # ------------------------------------------------------------------ contenedores
+
+    def iter_array(self) -> Iterator[None]:
+        """
+        Recorre un array: en cada iteración el cursor queda al inicio de un elemento,
+        que el llamante debe consumir (read_value, skip_value o descender).
+        """
+        self._expect("[")
+        if self.peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield None
+            separator = self.peek()
+            self._pos += 1
+            if separator == "]":
+                return
+            if separator != ",":
+                raise ValueError(f"JSON inválido: separador inesperado '{separator or 'EOF'}' en array")
+
+    def iter_items(self) -> Iterator[Any]:
+        """Decodifica uno a uno los elementos de un array."""
+        for _ in self.iter_array():
+            yield self.read_value()
+
+    def iter_object(self) -> Iterator[str]:
+        """
+        Recorre un objeto: devuelve cada clave dejando el cursor al inicio de su valor,
+        que el llamante debe consumir.
+        """
+        self._expect("{")
+        if self.peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self.read_value()
+            self._expect(":")
+            yield key
+            separator = self.peek()
+            self._pos += 1
+            if separator == "}":
+                return
+            if separator != ",":
+                raise ValueError(f"JSON inválido: separador inesperado '{separator or 'EOF'}' en objeto")
@@ -0,0 +1,190 @@
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from pydantic import ValidationError
+
+from agent.schemas import Finding
+from ingestion.json_stream import JsonStream
+
+logger = logging.getLogger(__name__)
+
+JSONL_EXTENSIONS = (".jsonl", ".ndjson")
+
+InvalidHandler = Callable[[int, Exception], None]
+
+
+def resolve_source_path(path: Optional[str], repo_root: str) -> str:
+    """
+    Resuelve la ruta de un hallazgo dentro de repo_root. Las rutas relativas se unen a
+    la raíz; una ruta absoluta inexistente (escaneo hecho en otra máquina) se prueba
+    como sufijo relativo a la raíz, del más largo al más corto.
+    """
+    if not path:
+        raise ValueError("el hallazgo no indica el archivo fuente")
+    if not os.path.isabs(path):
+        candidate = os.path.normpath(os.path.join(repo_root, path))
+        if os.path.isfile(candidate):
+            return candidate
+    elif os.path.isfile(path):
+        return path
+    else:
+        parts = [part for part in path.replace("\\", "/").split("/") if part]
+        for start in range(1, len(parts)):
+            candidate = os.path.join(repo_root, *parts[start:])
+            if os.path.isfile(candidate):
+                return candidate
+    raise ValueError(f"archivo '{path}' no encontrado en {repo_root}")
+
+
+def to_finding(
+    raw: Dict[str, Any],
+    index: int,
+    file_path: Optional[str] = None,
+    repo_root: Optional[str] = None,
+) -> Finding:
+    """
+    Normaliza un hallazgo del archivo de entrada al modelo Finding. file_path, si se
+    indica, sustituye a la ruta del hallazgo (opción --source del CLI); con repo_root
+    la ruta de cada hallazgo se resuelve dentro del repositorio (opción --repo-root).
+    """
+    path = file_path or raw.get("file_path") or raw.get("file")
+    if repo_root and not file_path:
+        path = resolve_source_path(path, repo_root)
+    return Finding(
+        id=raw.get("id", f"VULN-{index+1}"),
+        vulnerability_type=raw.get("type") or raw.get("vulnerability_type"),
+        file_path=path,
+        source_line=raw.get("source_line"),
+        sink_line=raw.get("sink_line"),
+        message=raw.get("message"),
+    )
+
+
+def _region_line(location: Dict[str, Any]) -> Optional[int]:
+    return (location.get("physicalLocation") or {}).get("region", {}).get("startLine")
+
+
+def _artifact_uri(location: Dict[str, Any]) -> Optional[str]:
+    uri = (location.get("physicalLocation") or {}).get("artifactLocation", {}).get("uri")
+    if uri and uri.startswith("file://"):
+        uri = uri[len("file://"):]
+    return uri
+
+
+def sarif_result_to_raw(result: Dict[str, Any], rules: Dict[str, Dict[str, Any]], index: int) -> Dict[str, Any]:
+    """
+    Convierte un result SARIF al formato plano de hallazgo. El sink es la ubicación
+    principal; el source, la primera ubicación del primer codeFlow (o la primera
+    relatedLocation; si no hay, el propio sink).
+    """
+    rule_id = result.get("ruleId") or (result.get("rule") or {}).get("id") or "unknown"
+    rule = rules.get(rule_id, {})
+    locations = result.get("locations") or [{}]
+    primary = locations[0]
+
+    source_location = None
+    for code_flow in result.get("codeFlows") or []:
+        for thread_flow in code_flow.get("threadFlows") or []:
+            flow_locations = thread_flow.get("locations") or []
+            if flow_locations:
+                source_location = flow_locations[0].get("location")
+                break
+        if source_location:
+            break
+    if source_location is None and result.get("relatedLocations"):
+        source_location = result["relatedLocations"][0]
+
+    sink_line = _region_line(primary)
+    source_line = _region_line(source_location) if source_location else None
+
+    return {
+        "id": result.get("guid") or result.get("correlationGuid") or f"{rule_id}-{index+1}",
+        "type": rule.get("name") or rule_id,
+        "file_path": _artifact_uri(primary),
+        "source_line": source_line or sink_line,
+        "sink_line": sink_line,
+        "message": (result.get("message") or {}).get("text"),
+    }
+
+
+def _iter_sarif_runs(stream: JsonStream) -> Iterator[Dict[str, Any]]:
+    """Recorre runs[*] y devuelve cada result convertido, sin cargar el archivo completo."""
+    index = 0
+    for _ in stream.iter_array():
+        rules: Dict[str, Dict[str, Any]] = {}
+        for key in stream.iter_object():
+            if key == "tool":
+                driver = (stream.read_value() or {}).get("driver", {})
+                rules = {r.get("id"): r for r in driver.get("rules", []) if isinstance(r, dict)}
+            elif key == "results":
+                for result in stream.iter_items():
+                    yield sarif_result_to_raw(result, rules, index)
+                    index += 1
+            else:
+                stream.skip_value()
+
+
+def _iter_json(stream: JsonStream) -> Iterator[Dict[str, Any]]:
+    """Array de hallazgos, {"vulnerabilities": [...]}, SARIF ({"runs": [...]}) u objeto único."""
+    if stream.peek() == "[":
+        yield from stream.iter_items()
+        return
+
+    single: Dict[str, Any] = {}
+    container_found = False
+    for key in stream.iter_object():
+        if key == "vulnerabilities":
+            container_found = True
+            yield from stream.iter_items()
+        elif key == "runs":
+            container_found = True
+            yield from _iter_sarif_runs(stream)
+        elif container_found:
+            stream.skip_value()
+        else:
+            single[key] = stream.read_value()
+    if not container_found:
+        yield single
+
+
+def iter_raw_findings(path: str) -> Iterator[Dict[str, Any]]:
+    """Devuelve los hallazgos del archivo uno a uno (JSONL, JSON o SARIF) a medida que se leen."""
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(JSONL_EXTENSIONS):
+            for number, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"Línea {number} de {path} no es JSON válido: {e}") from e
+            return
+        yield from _iter_json(JsonStream(f))
+
+
+def iter_findings(
+    path: str,
+    file_path: Optional[str] = None,
+    on_invalid: Optional[InvalidHandler] = None,
+    repo_root: Optional[str] = None,
+) -> Iterator[Finding]:
+    """
+    Generador de Finding sobre un archivo de hallazgos de cualquier tamaño. Los
+    hallazgos inválidos (incluidos los de archivos inexistentes en repo_root) se
+    notifican a on_invalid (índice, error) y se omiten.
+    """
+    for index, raw in enumerate(iter_raw_findings(path)):
+        try:
+            if not isinstance(raw, dict):
+                raise ValueError(f"se esperaba un objeto JSON, se encontró {type(raw).__name__}")
+            finding = to_finding(raw, index, file_path, repo_root)
+        except (ValidationError, ValueError) as e:
+            if on_invalid is not None:
+                on_invalid(index, e)
+            else:
+                logger.warning(f"Hallazgo #{index+1} inválido, se omite: {e}")
+            continue
+        yield finding
@@ -1,43 +1,154 @@
 import json
+import os
 from abc import ABC, abstractmethod
-from typing import List, Union
+from typing import Dict, List, Optional, TextIO, Union
 from agent.schemas import VulnerabilityAnalysis
 
 class Reporter(ABC):
     """
     Clase base abstracta para generadores de reportes.
+
+    Los reportes se escriben de forma incremental en <output_path>.partial: open() crea
+    ese archivo, write_one() añade un análisis y lo vuelca a disco en el momento, y
+    close() cierra el documento y lo renombra a output_path. Si el proceso muere a mitad
+    de lote, o se cierra con commit=False, lo ya escrito se conserva en el .partial y un
+    reporte anterior en output_path no se toca. generate_report() se mantiene para
+    escribir una lista completa de una vez.
     """
     from typing import List, Union
 
-    @abstractmethod
+    def __init__(self, metadata: Optional[Dict[str, str]] = None):
+        """metadata: datos de la ejecución (modelo, huella del prompt...) que el reporte puede mostrar."""
+        self.metadata = metadata or {}
+        self.output_path: Optional[str] = None
+        self.partial_path: Optional[str] = None
+        self.count = 0
+        self._file: Optional[TextIO] = None
+
+    def open(self, output_path: str) -> "Reporter":
+        self.output_path = output_path
+        self.partial_path = f"{output_path}.partial"
+        self.count = 0
+        self._file = open(self.partial_path, "w", encoding="utf-8")
+        self._write_header()
+        self._file.flush()
+        return self
+
+    def write_one(self, analysis: VulnerabilityAnalysis, vulnerability_type: Optional[str] = None):
+        """
+        Añade un análisis al reporte y lo vuelca a disco. vulnerability_type (el del
+        hallazgo) se guarda junto al análisis para emparejar veredictos con --since.
+        """
+        if self._file is None:
+            raise RuntimeError("El reporte no está abierto: llama a open() antes de write_one()")
+        self._write_item(analysis, vulnerability_type)
+        self.count += 1
+        self._file.flush()
+
+    def close(self, commit: bool = True):
+        """Cierra el documento; con commit lo publica en output_path, si no queda en partial_path."""
+        if self._file is None:
+            return
+        try:
+            self._write_footer()
+        finally:
+            self._file.close()
+            self._file = None
+        if commit:
+            os.replace(self.partial_path, self.output_path)
+
+    def __enter__(self) -> "Reporter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(commit=exc_type is None)
+
     def generate_report(self, analysis: Union[VulnerabilityAnalysis, List[VulnerabilityAnalysis]], output_path: str):
         """Genera un reporte a partir del análisis y lo guarda en la ruta especificada."""
+        items = analysis if isinstance(analysis, list) else [analysis]
+        with self.open(output_path):
+            for item in items:
+                self.write_one(item)
+
+    def _write_header(self):
+        pass
+
+    @abstractmethod
+    def _write_item(self, analysis: VulnerabilityAnalysis, vulnerability_type: Optional[str] = None):
+        pass
+
+    @staticmethod
+    def _record(analysis: VulnerabilityAnalysis, vulnerability_type: Optional[str]) -> Dict:
+        record = analysis.model_dump()
+        if vulnerability_type is not None:
+            record["vulnerability_type"] = vulnerability_type
+        return record
+
+    def _write_footer(self):
         pass
 
 class JSONReporter(Reporter):
     """
-    Generador de reportes en formato JSON.
+    Generador de reportes en formato JSON: un array que se escribe elemento a elemento.
     """
     def generate_report(self, analysis: Union[VulnerabilityAnalysis, List[VulnerabilityAnalysis]], output_path: str):
         """Escribe el reporte en formato JSON."""
-        with open(output_path, "w", encoding="utf-8") as f:
-            if isinstance(analysis, list):
-                f.write(json.dumps([a.model_dump() for a in analysis], indent=2))
-            else:
+        if isinstance(analysis, list):
+            super().generate_report(analysis, output_path)
+        else:
+            with open(output_path, "w", encoding="utf-8") as f:
                 f.write(analysis.model_dump_json(indent=2))
 
+    def _write_header(self):
+        self._file.write("[")
+
+    def _write_item(self, analysis: VulnerabilityAnalysis, vulnerability_type: Optional[str] = None):
+        item = json.dumps(self._record(analysis, vulnerability_type), indent=2).replace("\n", "\n  ")
+        self._file.write(("," if self.count else "") + "\n  " + item)
+
+    def _write_footer(self):
+        self._file.write("\n]" if self.count else "]")
+
+class JSONLReporter(Reporter):
+    """
+    Generador de reportes JSONL: un análisis por línea, legible aunque el proceso se interrumpa.
+    """
+    def _write_item(self, analysis: VulnerabilityAnalysis, vulnerability_type: Optional[str] = None):
+        self._file.write(json.dumps(self._record(analysis, vulnerability_type), ensure_ascii=False, separators=(",", ":")) + "\n")
+
 class HTMLReporter(Reporter):
     """
-    Generador de reportes en formato HTML.
+    Generador de reportes en formato HTML. Cada análisis se escribe como una sección
+    en cuanto se produce; el total se añade al cerrar el documento.
     """
-    def generate_report(self, analysis: Union[VulnerabilityAnalysis, List[VulnerabilityAnalysis]], output_path: str):
-        """Genera y guarda un reporte HTML estilizado."""
-        
-        items = analysis if isinstance(analysis, list) else [analysis]
+    def _write_header(self):
+        metadata_html = ''.join(
+            f'<p style="font-size:0.8em; color:#666">{key}: {value}</p>' for key, value in self.metadata.items()
+        )
+        self._file.write(f"""
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <title>Reporte Consolidado AI Triage</title>
+            <style>
+                body {{ font-family: Arial, sans-serif; margin: 20px; }}
+                .container {{ max_width: 900px; margin: auto; }}
+                .header {{ background-color: #f4f4f4; padding: 10px; border-radius: 5px; margin-top:30px; }}
+                .section {{ margin-left: 10px; }}
+                .critical {{ color: red; font-weight:bold; }}
+                .high {{ color: orange; font-weight:bold; }}
+                .medium {{ color: #b8860b; font-weight:bold; }}
+                .low {{ color: green; font-weight:bold; }}
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <h1>Reporte de Vulnerabilidades</h1>
+                {metadata_html}
+        """)
 
-        rows_html = ""
-        for item in items:
-            rows_html += f"""
+    def _write_item(self, item: VulnerabilityAnalysis, vulnerability_type: Optional[str] = None):
+        self._file.write(f"""
             <div class="header">
                 <h2>{item.id} <span style="font-size:0.6em; color:#666">source:{item.trace.source_line} -> sink:{item.trace.sink_line}</span></h2>
                 <p><strong>Clasificación:</strong> {item.classification} | <strong>Severidad:</strong> <span class="{item.severity.lower()}">{item.severity}</span></p>
@@ -64,33 +175,12 @@ class HTMLReporter(Reporter):
                 </ul>
                 <hr>
             </div>
-            """
+            """)
 
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>Reporte Consolidado AI Triage</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 20px; }}
-                .container {{ max_width: 900px; margin: auto; }}
-                .header {{ background-color: #f4f4f4; padding: 10px; border-radius: 5px; margin-top:30px; }}
-                .section {{ margin-left: 10px; }}
-                .critical {{ color: red; font-weight:bold; }}
-                .high {{ color: orange; font-weight:bold; }}
-                .medium {{ color: #b8860b; font-weight:bold; }}
-                .low {{ color: green; font-weight:bold; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <h1>Reporte de Vulnerabilidades</h1>
-                <p>Total analizado: {len(items)}</p>
-                {rows_html}
+    def _write_footer(self):
+        self._file.write(f"""
+                <p>Total analizado: {self.count}</p>
             </div>
         </body>
         </html>
-        """
-        
-        with open(output_path, "w", encoding="utf-8") as f:
-            f.write(html_content)
+        """)
@@ -0,0 +1,56 @@
+import textwrap
+
+from agent.batch import BatchResult
+from agent.dedupe import FindingDeduplicator
+from agent.schemas import Finding, TracePath, VulnerabilityAnalysis
+
+SOURCE = textwrap.dedent(
+    """\
+    def lookup(cur, name):
+        query = "SELECT * FROM users WHERE name = '" + name + "'"
+        cur.execute(
+            query
+        )
+    """
+)
+
+
+def _analysis(finding: Finding) -> VulnerabilityAnalysis:
+    return VulnerabilityAnalysis(
+        id=finding.id,
+        classification="True Positive",
+        severity="High",
+        trace=TracePath(
+            file=finding.file_path,
+            function="lookup",
+            source_line=finding.source_line,
+            sink_line=finding.sink_line,
+            flow=["name", "query"],
+        ),
+        sanitizers=[],
+        assumptions=[],
+        justification="Concatenación directa.",
+    )
+
+
+def _run(findings):
+    for index, finding in enumerate(findings):
+        yield BatchResult(index, finding, _analysis(finding), None)
+
+
+def test_equivalent_types_share_a_cluster_and_keep_their_lines(tmp_path):
+    path = tmp_path / "queries.py"
+    path.write_text(SOURCE, encoding="utf-8")
+    findings = [
+        Finding(id="a", vulnerability_type="SQL Injection", file_path=str(path), source_line=1, sink_line=3),
+        Finding(id="b", vulnerability_type="py/sql-injection", file_path=str(path), source_line=2, sink_line=4),
+    ]
+
+    deduplicator = FindingDeduplicator()
+    results = sorted(deduplicator.iter_results(findings, _run), key=lambda r: r.index)
+
+    assert deduplicator.clusters == 1
+    member = results[1].analysis
+    assert member.id == "b"
+    assert (member.trace.source_line, member.trace.sink_line) == (2, 4)
+    assert (results[0].analysis.trace.source_line, results[0].analysis.trace.sink_line) == (1, 3)
@@ -0,0 +1,39 @@
+from agent.incremental import IncrementalPlan, PreviousVerdict, load_previous_verdicts
+from agent.schemas import TracePath, VulnerabilityAnalysis
+from reporting.report_generator import JSONLReporter
+
+
+def _analysis(finding_id: str, file_path: str, classification: str) -> VulnerabilityAnalysis:
+    return VulnerabilityAnalysis(
+        id=finding_id,
+        classification=classification,
+        severity="High" if classification == "True Positive" else "Low",
+        trace=TracePath(file=file_path, function="handler", source_line=3, sink_line=7, flow=["name"]),
+        sanitizers=[],
+        assumptions=[],
+        justification="Veredicto anterior.",
+    )
+
+
+def test_prior_verdict_requires_the_same_vulnerability_type(tmp_path):
+    file_path = str(tmp_path / "app.py")
+    report = str(tmp_path / "report.jsonl")
+    with JSONLReporter().open(report) as reporter:
+        reporter.write_one(_analysis("1", file_path, "True Positive"), "SQL Injection")
+        reporter.write_one(_analysis("2", file_path, "False Positive"), "XSS")
+
+    previous = load_previous_verdicts(report)
+    assert [v.vulnerability_type for v in previous] == ["SQL Injection", "XSS"]
+
+    plan = IncrementalPlan({}, previous)
+    reused = plan.prior_verdict("new-id", file_path, "py/sql-injection", 3, 7)
+    assert reused is not None
+    assert reused.id == "new-id"
+    assert reused.classification == "True Positive"
+    assert plan.prior_verdict("other", file_path, "Command Injection", 3, 7) is None
+
+
+def test_previous_report_without_types_is_not_reused(tmp_path):
+    file_path = str(tmp_path / "app.py")
+    plan = IncrementalPlan({}, [PreviousVerdict(_analysis("1", file_path, "False Positive"), None)])
+    assert plan.prior_verdict("1", file_path, "SQL Injection", 3, 7) is None
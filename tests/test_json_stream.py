@@ -0,0 +1,49 @@
+import io
+import json
+
+import pytest
+
+from ingestion.json_stream import JsonStream
+
+DOCUMENTS = [
+    "[1.5]",
+    '{"a": -25000000000.0, "b": 1}',
+    '[1e10, 2E-3, -0.25, true, false, null, "x\\u00e9y", {"k": [10, 20]}]',
+]
+
+
+class CountingReader(io.StringIO):
+    """StringIO que cuenta los caracteres entregados al lector."""
+
+    def __init__(self, text: str):
+        super().__init__(text)
+        self.consumed = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.consumed += len(chunk)
+        return chunk
+
+
+def _decode(stream: JsonStream):
+    if stream.peek() == "[":
+        return list(stream.iter_items())
+    return {key: stream.read_value() for key in stream.iter_object()}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 4, 5, 7, 64])
+@pytest.mark.parametrize("document", DOCUMENTS)
+def test_values_cut_at_chunk_boundaries(document, chunk_size):
+    stream = JsonStream(io.StringIO(document), chunk_size=chunk_size)
+    assert _decode(stream) == json.loads(document)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 64])
+def test_syntax_error_fails_without_reading_the_rest(chunk_size):
+    valid = ", ".join('{"a": %d}' % i for i in range(10_000))
+    document = '[{"a": 1}, {"a": 2 "b": 3}, ' + valid + "]"
+    reader = CountingReader(document)
+    stream = JsonStream(reader, chunk_size=chunk_size)
+    with pytest.raises(ValueError):
+        _decode(stream)
+    assert reader.consumed < 1024
@@ -0,0 +1,41 @@
+import os
+
+from agent.run_journal import RunJournal
+from agent.schemas import Finding, TracePath, VulnerabilityAnalysis
+
+
+def _finding(finding_id: str) -> Finding:
+    return Finding(id=finding_id, vulnerability_type="SQL Injection", file_path="app.py", source_line=1, sink_line=2)
+
+
+def _analysis(finding: Finding) -> VulnerabilityAnalysis:
+    return VulnerabilityAnalysis(
+        id=finding.id,
+        classification="False Positive",
+        severity="Low",
+        trace=TracePath(file="app.py", function="f", source_line=1, sink_line=2, flow=[]),
+        sanitizers=[],
+        assumptions=[],
+        justification="Consulta parametrizada.",
+    )
+
+
+def test_only_entries_from_a_previous_run_count_as_resumed(tmp_path):
+    path = str(tmp_path / "run.journal.jsonl")
+    first, second = _finding("a"), _finding("b")
+
+    journal = RunJournal(path)
+    journal.record(first, _analysis(first))
+    # Repetido dentro de la misma ejecución: se reutiliza, pero no es una reanudación
+    assert journal.completed(first) is not None
+    assert journal.resumed == 0
+    journal.close()
+
+    resumed = RunJournal(path, resume=True)
+    assert resumed.completed(first) is not None
+    assert resumed.completed(second) is None
+    resumed.record(second, _analysis(second))
+    assert resumed.completed(second) is not None
+    assert resumed.resumed == 1
+    resumed.discard()
+    assert not os.path.exists(path)
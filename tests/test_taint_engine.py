@@ -0,0 +1,99 @@
+import textwrap
+
+import pytest
+
+from tools.taint_engine import get_taint_engine
+
+SOURCE = textwrap.dedent(
+    """\
+    import os
+    import shlex
+
+
+    def overwritten(name):
+        name = "fixed"
+        os.system("echo " + name)
+
+
+    def branches(name, flag):
+        value = "fixed"
+        if flag:
+            value = name
+        os.system("echo " + value)
+
+
+    def looped(items):
+        command = ""
+        for item in items:
+            command = command + item
+        os.system(command)
+
+
+    def from_env():
+        os.system("ls " + os.getenv("DIR"))
+
+
+    def wrap(value):
+        return "[" + value + "]"
+
+
+    def wrapped(name):
+        os.system(wrap(name))
+
+
+    def quote(value):
+        return shlex.quote(value)
+
+
+    def quoted(name):
+        os.system("echo " + quote(name))
+    """
+)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    path = tmp_path / "flows.py"
+    path.write_text(SOURCE, encoding="utf-8")
+    return get_taint_engine(str(path))
+
+
+def _lines(function):
+    """(línea del def, línea del os.system) de la función."""
+    lines = SOURCE.splitlines()
+    start = next(i for i, line in enumerate(lines, 1) if line.startswith(f"def {function}("))
+    sink = next(i for i, line in enumerate(lines, 1) if i > start and "os.system" in line)
+    return start, sink
+
+
+@pytest.mark.parametrize(
+    "function, tainted",
+    [
+        ("overwritten", False),
+        ("branches", True),
+        ("looped", True),
+        ("wrapped", True),
+    ],
+)
+def test_reaching_definitions(engine, function, tainted):
+    source_line, sink_line = _lines(function)
+    assert engine.query(source_line, sink_line).data_flow_detected is tainted
+
+
+def test_external_call_result_is_a_seed(engine):
+    _, sink_line = _lines("from_env")
+    assert any(var in engine.external_calls for var in engine.seeds_at(sink_line))
+    assert engine.query(sink_line, sink_line).data_flow_detected
+
+
+def test_summary_records_sanitizer_inside_helper(engine):
+    assert engine.summaries["quote"].return_params == set()
+    assert engine.summaries["quote"].sanitized_returns == {"shlex.quote": {"value"}}
+    assert engine.summaries["wrap"].return_params == {"value"}
+    source_line, sink_line = _lines("quoted")
+    seeds = engine.seeds_at(source_line)
+    info = next(c for c in engine.calls_at(sink_line) if c.resolved == "os.system")
+    dangerous = engine.argument_deps(info, 0)
+    barriers = {v for v, name in engine.sanitizer_calls.items() if name == "shlex.quote"}
+    assert engine.flows(dangerous, seeds)
+    assert not engine.flows(dangerous, seeds, blocked=barriers)
@@ -0,0 +1,26 @@
+import json
+
+from pydantic import BaseModel
+
+from agent.tool_registry import SmartToolRegistry
+
+
+class EchoInput(BaseModel):
+    text: str
+    repeat: int = 1
+
+
+def test_omitted_default_and_explicit_default_share_a_memo_entry():
+    calls = []
+
+    def echo(data: EchoInput) -> str:
+        calls.append(data)
+        return data.text * data.repeat
+
+    registry = SmartToolRegistry(memoize=True, max_workers=1)
+    registry.register("echo", echo, EchoInput)
+
+    assert registry.execute("echo", json.dumps({"text": "a"})) == "a"
+    assert registry.execute("echo", json.dumps({"repeat": 1, "text": "a"})) == "a"
+    assert len(calls) == 1
+    assert registry.memo_stats()["hits"] == 1
@@ -0,0 +1,71 @@
+import ast
+from fnmatch import fnmatchcase
+from typing import Dict, Optional
+
+from tools.source_index import SourceIndex
+
+
+def collect_import_aliases(tree: ast.AST) -> Dict[str, str]:
+    """
+    Mapa nombre local -> nombre cualificado a partir de los imports del archivo.
+
+    import subprocess as sp          -> {"sp": "subprocess"}
+    from subprocess import run as r  -> {"r": "subprocess.run"}
+    import os.path                   -> {"os": "os"}
+    """
+    aliases: Dict[str, str] = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.asname:
+                    aliases[alias.asname] = alias.name
+                else:
+                    root = alias.name.split(".")[0]
+                    aliases[root] = root
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            for alias in node.names:
+                if alias.name != "*":
+                    aliases[alias.asname or alias.name] = f"{node.module}.{alias.name}"
+    return aliases
+
+
+def dotted_name(node: ast.AST) -> Optional[str]:
+    """Nombre con puntos de una expresión Name/Attribute (p. ej. 'cur.execute'); None si no lo es."""
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if isinstance(node, ast.Name):
+        parts.append(node.id)
+    elif isinstance(node, ast.Call):
+        # Receptor resultado de otra llamada: conn.cursor().execute -> '?.execute'
+        parts.append("?")
+    else:
+        return None
+    return ".".join(reversed(parts))
+
+
+def resolve_call(func: ast.AST, aliases: Dict[str, str]) -> Optional[str]:
+    """Nombre cualificado del destino de una llamada, siguiendo los alias de import."""
+    name = dotted_name(func)
+    if name is None:
+        return None
+    head, _, rest = name.partition(".")
+    if head in aliases:
+        head = aliases[head]
+    return f"{head}.{rest}" if rest else head
+
+
+def call_matches(resolved: Optional[str], pattern: Optional[str]) -> bool:
+    """Compara un nombre cualificado con el patrón 'call' de una regla (admite comodines)."""
+    if not resolved or not pattern:
+        return False
+    return fnmatchcase(resolved, pattern)
+
+
+def get_import_aliases(index: SourceIndex) -> Dict[str, str]:
+    """Alias de import del archivo, calculados una vez por SourceIndex."""
+    return index.derived(
+        "import_aliases",
+        lambda idx: collect_import_aliases(idx.tree) if idx.tree is not None else {},
+    )
@@ -1,6 +1,8 @@
 from pydantic import BaseModel, Field
-from typing import Optional
-import os
+from typing import List, Literal, Optional, Tuple
+
+from tools.context_builder import build_trimmed_context
+from tools.source_index import get_source_index
 
 
 class CodeContextInput(BaseModel):
@@ -11,6 +13,20 @@ class CodeContextInput(BaseModel):
         5,
         description="Número de líneas adicionales antes y después para contexto"
     )
+    mode: Literal["radius", "function"] = Field(
+        "radius",
+        description="'radius' devuelve context_radius líneas alrededor de source y sink; "
+                    "'function' devuelve la función completa que contiene source y sink"
+    )
+    max_lines: Optional[int] = Field(
+        None,
+        description="Máximo de líneas a devolver; si el fragmento es mayor se conservan source, sink, "
+                    "firma de la función y el slice entre ambos, y el resto se omite con marcas",
+    )
+    max_tokens: Optional[int] = Field(
+        None,
+        description="Máximo aproximado de tokens del fragmento (mismo recorte que max_lines)",
+    )
 
 
 class CodeContextOutput(BaseModel):
@@ -18,32 +34,51 @@ class CodeContextOutput(BaseModel):
     function_name: Optional[str]
     start_line: int
     end_line: int
+    function_start_line: Optional[int] = None
+    function_end_line: Optional[int] = None
+    elided_ranges: List[Tuple[int, int]] = []
 
 
 def code_context_tool(input_data: CodeContextInput) -> CodeContextOutput:
     """
     Recupera un fragmento de código alrededor de las líneas de interés.
     """
-    if not os.path.exists(input_data.file_path):
-        raise FileNotFoundError(f"File not found: {input_data.file_path}")
-
-    with open(input_data.file_path, "r", encoding="utf-8") as f:
-        lines = f.readlines()
+    index = get_source_index(input_data.file_path)
+    lines = index.lines
 
-    start = max(0, input_data.source_line - input_data.context_radius - 1)
-    end = min(len(lines), input_data.sink_line + input_data.context_radius)
+    # La función de referencia es la que contiene el source; si está a nivel de módulo, la del sink
+    span = index.function_span(input_data.source_line) or index.function_span(input_data.sink_line)
+    sink_span = index.function_span(input_data.sink_line)
 
-    snippet = "".join(lines[start:end])
+    if input_data.mode == "function" and span is not None:
+        start = span.start_line - 1
+        end = span.end_line
+        if sink_span is not None:
+            start = min(start, sink_span.start_line - 1)
+            end = max(end, sink_span.end_line)
+    else:
+        start = max(0, input_data.source_line - input_data.context_radius - 1)
+        end = min(len(lines), input_data.sink_line + input_data.context_radius)
 
-    function_name = None
-    for i in range(start, -1, -1):
-        if lines[i].strip().startswith("def "):
-            function_name = lines[i].strip().split("(")[0].replace("def ", "")
-            break
+    if input_data.max_lines is not None or input_data.max_tokens is not None:
+        snippet, elided = build_trimmed_context(
+            index,
+            input_data.source_line,
+            input_data.sink_line,
+            start + 1,
+            end,
+            max_lines=input_data.max_lines,
+            max_tokens=input_data.max_tokens,
+        )
+    else:
+        snippet, elided = "".join(lines[start:end]), []
 
     return CodeContextOutput(
         snippet=snippet,
-        function_name=function_name,
+        function_name=span.qualname if span else None,
         start_line=start + 1,
-        end_line=end
+        end_line=end,
+        function_start_line=span.start_line if span else None,
+        function_end_line=span.end_line if span else None,
+        elided_ranges=elided,
     )
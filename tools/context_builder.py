@@ -0,0 +1,179 @@
+import ast
+from typing import Iterable, List, Optional, Set, Tuple
+
+from tools.source_index import SourceIndex
+from tools.taint_engine import get_taint_engine
+
+# Coste aproximado de la marca que sustituye a un bloque omitido
+MARKER_TOKENS = 12
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimación aproximada de tokens (~4 caracteres por token) sin depender de un tokenizador."""
+    return len(text) // 4 + 1
+
+
+def _header_range(stmt: ast.stmt) -> Tuple[int, int]:
+    """Líneas de la cabecera de una sentencia compuesta (def, if, for...) o de la sentencia completa."""
+    body = getattr(stmt, "body", None)
+    if isinstance(body, list) and body and isinstance(body[0], ast.stmt):
+        return stmt.lineno, max(stmt.lineno, body[0].lineno - 1)
+    return stmt.lineno, stmt.end_lineno or stmt.lineno
+
+
+def _statement_range(index: SourceIndex, line: int) -> Tuple[int, int]:
+    stmt = index.statement_at(line)
+    if stmt is None:
+        return line, line
+    start, end = _header_range(stmt)
+    if start <= line <= end:
+        return start, end
+    return line, line
+
+
+class ContextBudget:
+    """
+    Construye un fragmento de código acotado por un presupuesto de líneas y/o tokens.
+
+    Se añaden bloques por prioridad: sentencias de source y sink y firmas de las
+    funciones que los contienen (siempre), sentencias que definen variables del slice entre
+    source y sink y cabeceras de los bloques que las contienen; el presupuesto restante
+    se llena con las sentencias más cercanas a source y sink que quepan. Lo demás se sustituye por
+    marcas con los números de línea omitidos.
+    """
+
+    def __init__(self, index: SourceIndex, start_line: int, end_line: int,
+                 max_lines: Optional[int] = None, max_tokens: Optional[int] = None):
+        self.index = index
+        self.start_line = start_line
+        self.end_line = end_line
+        self.max_lines = max_lines
+        self.max_tokens = max_tokens
+        self.kept: Set[int] = set()
+        self._tokens = 0
+
+    def fits(self) -> bool:
+        """Indica si el rango completo cabe en el presupuesto sin recortar."""
+        lines = self.end_line - self.start_line + 1
+        if self.max_lines is not None and lines > self.max_lines:
+            return False
+        if self.max_tokens is not None and estimate_tokens(self.index.slice(self.start_line, self.end_line)) > self.max_tokens:
+            return False
+        return True
+
+    def add(self, start: int, end: int, force: bool = False) -> bool:
+        """Añade las líneas [start, end] si caben en el presupuesto (o siempre con force)."""
+        start, end = max(start, self.start_line), min(end, self.end_line)
+        new = [n for n in range(start, end + 1) if n not in self.kept]
+        if not new:
+            return True
+        cost = sum(estimate_tokens(self.index.line(n)) for n in new) + MARKER_TOKENS
+        if not force:
+            if self.max_lines is not None and len(self.kept) + len(new) > self.max_lines:
+                return False
+            if self.max_tokens is not None and self._tokens + cost > self.max_tokens:
+                return False
+        self.kept.update(new)
+        self._tokens += cost
+        return True
+
+    def add_statements(self, lines: Iterable[int], force: bool = False):
+        """Añade las sentencias que contienen las líneas, en el orden de prioridad recibido."""
+        for line in dict.fromkeys(lines):
+            self.add(*_statement_range(self.index, line), force=force)
+
+    def render(self) -> Tuple[str, List[Tuple[int, int]]]:
+        """Texto con marcas de omisión y lista de rangos (inicio, fin) omitidos."""
+        parts: List[str] = []
+        elided: List[Tuple[int, int]] = []
+        line = self.start_line
+        while line <= self.end_line:
+            if line in self.kept:
+                parts.append(self.index.line(line))
+                line += 1
+                continue
+            gap_start = line
+            while line <= self.end_line and line not in self.kept:
+                line += 1
+            gap_end = line - 1
+            elided.append((gap_start, gap_end))
+            first = self.index.line(gap_start)
+            indent = first[:len(first) - len(first.lstrip())]
+            if gap_start == gap_end:
+                parts.append(f"{indent}# ... línea {gap_start} omitida ...\n")
+            else:
+                parts.append(f"{indent}# ... líneas {gap_start}-{gap_end} omitidas ...\n")
+        return "".join(parts), elided
+
+
+def _enclosing_headers(index: SourceIndex, lines: Set[int]) -> Set[int]:
+    """Primeras líneas de las sentencias compuestas que contienen alguna de las líneas dadas."""
+    headers: Set[int] = set()
+    if index.tree is None:
+        return headers
+    for node in ast.walk(index.tree):
+        if not isinstance(node, ast.stmt) or not isinstance(getattr(node, "body", None), list):
+            continue
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        end = node.end_lineno or node.lineno
+        if any(node.lineno < line <= end for line in lines):
+            headers.add(node.lineno)
+    return headers
+
+
+def slice_lines(index: SourceIndex, source_line: int, sink_line: int, start: int, end: int) -> Set[int]:
+    """Líneas dentro de [start, end] que definen variables del slice source -> sink."""
+    engine = get_taint_engine(index.path)
+    if engine.reachability is None:
+        return set()
+    seeds = engine.seeds_at(source_line)
+    backward = set()
+    for var in engine.sink_variables_at(sink_line):
+        backward.update(engine.reachability.dependencies(var))
+    chop = {v for v in backward if engine.reachability.depends_on(v, seeds)}
+
+    found = set()
+    for line in range(start, end + 1):
+        if engine.defs_by_line.get(line, set()) & chop:
+            found.add(line)
+    return found
+
+
+def build_trimmed_context(
+    index: SourceIndex,
+    source_line: int,
+    sink_line: int,
+    start_line: int,
+    end_line: int,
+    max_lines: Optional[int] = None,
+    max_tokens: Optional[int] = None,
+) -> Tuple[str, List[Tuple[int, int]]]:
+    """
+    Fragmento [start_line, end_line] recortado al presupuesto. Devuelve el texto y los
+    rangos omitidos (lista vacía si el rango completo cabía).
+    """
+    budget = ContextBudget(index, start_line, end_line, max_lines, max_tokens)
+    if budget.fits():
+        return index.slice(start_line, end_line), []
+
+    budget.add_statements([source_line, sink_line], force=True)
+
+    for line in (source_line, sink_line):
+        span = index.function_span(line)
+        if span is not None:
+            budget.add(*_header_range(span.node), force=True)
+
+    sliced = slice_lines(index, source_line, sink_line, start_line, end_line)
+    budget.add_statements(sorted(sliced, key=lambda n: min(abs(n - sink_line), abs(n - source_line))))
+    budget.add_statements(_enclosing_headers(index, sliced | {source_line, sink_line}))
+
+    # Resto del presupuesto: sentencias más cercanas a source y sink, alternando. Una
+    # sentencia larga que no cabe no impide añadir otras más cortas a mayor distancia
+    for distance in range(1, end_line - start_line + 1):
+        for anchor in (sink_line, source_line):
+            for line in (anchor - distance, anchor + distance):
+                if start_line <= line <= end_line and line not in budget.kept:
+                    budget.add(*_statement_range(index, line))
+
+    return budget.render()
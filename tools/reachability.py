@@ -0,0 +1,153 @@
+from collections import deque
+from typing import Dict, Generic, Hashable, Iterable, List, Mapping, Optional, Set, TypeVar
+
+Node = TypeVar("Node", bound=Hashable)
+
+
+class ReachabilityIndex(Generic[Node]):
+    """
+    Índice de alcanzabilidad sobre un grafo de dependencias (nodo -> nodos de los que depende).
+
+    Se construye una sola vez: las componentes fuertemente conexas se calculan con
+    Tarjan iterativo (sin recursión, por lo que cadenas largas no agotan la pila), el
+    grafo condensado se recorre en orden topológico inverso y la clausura transitiva
+    de cada componente se guarda como bitset (un int de Python). Así, todas las
+    consultas "¿depende a de b?" se responden con una operación AND.
+    """
+
+    def __init__(self, graph: Mapping[Node, Iterable[Node]]):
+        self._graph: Dict[Node, List[Node]] = {}
+        for node, deps in graph.items():
+            self._graph.setdefault(node, [])
+            for dep in deps:
+                self._graph[node].append(dep)
+                self._graph.setdefault(dep, [])
+
+        self._component: Dict[Node, int] = {}
+        self._components: List[List[Node]] = []
+        self._tarjan()
+        self._closure: List[int] = self._transitive_closure()
+
+    def _tarjan(self):
+        counter = 0
+        indices: Dict[Node, int] = {}
+        lowlink: Dict[Node, int] = {}
+        on_stack: Set[Node] = set()
+        stack: List[Node] = []
+
+        for root in self._graph:
+            if root in indices:
+                continue
+            work = [(root, iter(self._graph[root]))]
+            indices[root] = lowlink[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack.add(root)
+
+            while work:
+                node, children = work[-1]
+                advanced = False
+                for child in children:
+                    if child not in indices:
+                        indices[child] = lowlink[child] = counter
+                        counter += 1
+                        stack.append(child)
+                        on_stack.add(child)
+                        work.append((child, iter(self._graph[child])))
+                        advanced = True
+                        break
+                    if child in on_stack:
+                        lowlink[node] = min(lowlink[node], indices[child])
+                if advanced:
+                    continue
+
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+
+                if lowlink[node] == indices[node]:
+                    component_id = len(self._components)
+                    members = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        self._component[member] = component_id
+                        members.append(member)
+                        if member == node:
+                            break
+                    self._components.append(members)
+
+    def _transitive_closure(self) -> List[int]:
+        # Tarjan emite las componentes en orden topológico inverso: las dependencias primero
+        closure = [0] * len(self._components)
+        for component_id, members in enumerate(self._components):
+            bits = 1 << component_id
+            for member in members:
+                for dep in self._graph[member]:
+                    dep_component = self._component[dep]
+                    if dep_component != component_id:
+                        bits |= closure[dep_component]
+            closure[component_id] = bits
+        return closure
+
+    def __contains__(self, node: Node) -> bool:
+        return node in self._component
+
+    def _mask(self, nodes: Iterable[Node]) -> int:
+        mask = 0
+        for node in nodes:
+            component_id = self._component.get(node)
+            if component_id is not None:
+                mask |= 1 << component_id
+        return mask
+
+    def depends_on(self, node: Node, targets: Iterable[Node]) -> bool:
+        """Indica si node depende (transitivamente, incluido él mismo) de alguno de targets."""
+        component_id = self._component.get(node)
+        if component_id is None:
+            return node in set(targets)
+        return bool(self._closure[component_id] & self._mask(targets))
+
+    def dependencies(self, node: Node) -> Set[Node]:
+        """Todos los nodos de los que node depende transitivamente (incluido él mismo)."""
+        component_id = self._component.get(node)
+        if component_id is None:
+            return {node}
+        bits = self._closure[component_id]
+        found: Set[Node] = set()
+        while bits:
+            low = bits & -bits
+            found.update(self._components[low.bit_length() - 1])
+            bits ^= low
+        return found
+
+    def shortest_path(self, starts: Iterable[Node], targets: Iterable[Node]) -> List[Node]:
+        """
+        Camino más corto (en aristas de dependencia) desde alguno de starts hasta
+        alguno de targets, devuelto en orden target -> start. Vacío si no existe.
+        Solo se explora si la clausura confirma que el camino existe.
+        """
+        targets = set(targets)
+        starts = [s for s in starts if self.depends_on(s, targets)]
+        if not starts:
+            return []
+
+        target_mask = self._mask(targets)
+        parents: Dict[Node, Optional[Node]] = {s: None for s in starts}
+        queue = deque(starts)
+        while queue:
+            node = queue.popleft()
+            if node in targets:
+                path = []
+                current: Optional[Node] = node
+                while current is not None:
+                    path.append(current)
+                    current = parents[current]
+                return path
+            for dep in self._graph.get(node, ()):
+                # Poda: solo seguir dependencias desde las que todavía se alcanza un target
+                if dep not in parents and self._closure[self._component[dep]] & target_mask:
+                    parents[dep] = node
+                    queue.append(dep)
+        return []
@@ -0,0 +1,251 @@
+import json
+import os
+import re
+import threading
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Literal, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+from tools.call_resolver import call_matches
+
+RULES_FILE_ENV = "TRIAGE_RULES_FILE"
+
+# Alias para tipos de vulnerabilidad que no coinciden exactamente con las claves del catálogo
+TYPE_ALIASES = {
+    "sql": "sql injection",
+    "command": "command injection",
+    "rce": "command injection",
+    "xss": "xss",
+    "ssrf": "ssrf",
+}
+
+GENERIC_TYPE = "*"
+
+# Cadena literal de una línea ('...' o "...") que contiene el marcador dado
+_IN_STRING = r"""(?:'[^'\n]*{0}[^'\n]*'|"[^"\n]*{0}[^"\n]*")"""
+
+DEFAULT_RULES: List[Dict] = [
+    # Sinks
+    {"id": "sql.execute", "kind": "sink", "types": ["sql injection"], "pattern": "execute", "name": "execute", "call": "*.execute", "arg": 0, "keywords": ["sql", "query", "statement"]},
+    {"id": "sql.cursor", "kind": "sink", "types": ["sql injection"], "pattern": "cursor", "name": "cursor"},
+    {"id": "sql.raw_sql", "kind": "sink", "types": ["sql injection"], "pattern": "raw_sql", "name": "raw_sql", "call": "*raw_sql", "arg": 0},
+    {"id": "sql.executemany", "kind": "sink", "types": ["sql injection"], "pattern": "executemany", "name": "executemany", "call": "*.executemany", "arg": 0, "keywords": ["sql", "query"]},
+    {"id": "cmd.system", "kind": "sink", "types": ["command injection"], "pattern": "os.system", "name": "system", "call": "os.system", "arg": 0, "keywords": ["command"]},
+    {"id": "cmd.popen", "kind": "sink", "types": ["command injection"], "pattern": "popen", "name": "popen", "call": "os.popen", "arg": 0, "keywords": ["cmd"]},
+    {"id": "cmd.subprocess", "kind": "sink", "types": ["command injection"], "pattern": "subprocess", "name": "subprocess", "call": "subprocess.*", "arg": 0, "keywords": ["args", "cmd"]},
+    {"id": "cmd.subprocess_call", "kind": "sink", "types": ["command injection"], "pattern": "subprocess.call", "name": "call", "call": "subprocess.call", "arg": 0, "keywords": ["args"]},
+    {"id": "cmd.subprocess_check_output", "kind": "sink", "types": ["command injection"], "pattern": "subprocess.check_output", "name": "check_output", "call": "subprocess.check_output", "arg": 0, "keywords": ["args"]},
+    {"id": "cmd.subprocess_run", "kind": "sink", "types": ["command injection"], "pattern": "subprocess.run", "name": "run", "call": "subprocess.run", "arg": 0, "keywords": ["args"]},
+    {"id": "cmd.subprocess_popen", "kind": "sink", "types": ["command injection"], "call": "subprocess.Popen", "arg": 0, "keywords": ["args"], "name": "Popen"},
+    {"id": "xss.render_template_string", "kind": "sink", "types": ["xss"], "pattern": "render_template_string", "name": "render_template_string", "call": "*render_template_string", "arg": 0, "keywords": ["source"]},
+    {"id": "xss.response", "kind": "sink", "types": ["xss"], "regex": r"(?<![\w.])(?:make_)?response\s*\(", "name": "response", "call": "*[Rr]esponse", "arg": 0, "keywords": ["response"]},
+    {"id": "xss.markup", "kind": "sink", "types": ["xss"], "pattern": "markup", "name": "markup", "call": "*Markup", "arg": 0},
+    {"id": "ssrf.requests_get", "kind": "sink", "types": ["ssrf"], "pattern": "requests.get", "name": "requests.get", "call": "requests.get", "arg": 0, "keywords": ["url"]},
+    {"id": "ssrf.requests_post", "kind": "sink", "types": ["ssrf"], "pattern": "requests.post", "name": "requests.post", "call": "requests.post", "arg": 0, "keywords": ["url"]},
+    {"id": "ssrf.requests_request", "kind": "sink", "types": ["ssrf"], "call": "requests.request", "arg": 1, "keywords": ["url"], "name": "requests.request"},
+    {"id": "ssrf.urlopen", "kind": "sink", "types": ["ssrf"], "pattern": "urlopen", "name": "urlopen", "call": "*urlopen", "arg": 0, "keywords": ["url"]},
+    {"id": "ssrf.httpclient", "kind": "sink", "types": ["ssrf"], "pattern": "httpclient", "name": "httpclient"},
+    {"id": "ssrf.httpx_get", "kind": "sink", "types": ["ssrf"], "pattern": "httpx.get", "name": "get", "call": "httpx.get", "arg": 0, "keywords": ["url"]},
+    {"id": "ssrf.session_get", "kind": "sink", "types": ["ssrf"], "pattern": "session.get", "name": "get", "call": "*session.get", "arg": 0, "keywords": ["url"]},
+    {"id": "generic.exec", "kind": "sink", "types": [GENERIC_TYPE], "call": "exec", "arg": 0, "name": "Generic Execution"},
+    {"id": "generic.execute", "kind": "sink", "types": [GENERIC_TYPE], "pattern": "execute", "name": "Generic Execution"},
+    {"id": "generic.eval", "kind": "sink", "types": [GENERIC_TYPE], "pattern": "eval", "name": "Generic Execution", "call": "eval", "arg": 0},
+    # Sanitizers
+    {"id": "sql.placeholder", "kind": "sanitizer", "types": ["sql injection"], "regex": _IN_STRING.format(r"\?"), "name": "Parameterized Query (Placeholder)"},
+    {"id": "sql.placeholder_pyformat", "kind": "sanitizer", "types": ["sql injection"], "regex": _IN_STRING.format(r"%s"), "name": "Parameterized Query (Placeholder Postgres/MySQL)"},
+    {"id": "sql.named_param", "kind": "sanitizer", "types": ["sql injection"], "regex": _IN_STRING.format(r"(?<![:\w]):[A-Za-z_]\w*"), "name": "Named Parameter"},
+    {"id": "sql.literal", "kind": "sanitizer", "types": ["sql injection"], "pattern": "literal", "name": "SQLAlchemy Literal"},
+    {"id": "cmd.shlex_quote", "kind": "sanitizer", "types": ["command injection"], "pattern": "shlex.quote", "name": "Shell Escape", "call": "shlex.quote", "arg": 0},
+    {"id": "cmd.list_args", "kind": "sanitizer", "types": ["command injection"], "regex": r"subprocess\.(?:run|call|check_call|check_output|Popen)\s*\(\s*\[", "name": "Subprocess List Args (Implicit)"},
+    {"id": "xss.escape", "kind": "sanitizer", "types": ["xss"], "pattern": "escape", "name": "HTML Escape", "call": "html.escape", "arg": 0},
+    {"id": "xss.markupsafe_escape", "kind": "sanitizer", "types": ["xss"], "call": "markupsafe.escape", "arg": 0, "name": "HTML Escape"},
+    {"id": "xss.flask_escape", "kind": "sanitizer", "types": ["xss"], "call": "flask.escape", "arg": 0, "name": "HTML Escape"},
+    {"id": "xss.bleach", "kind": "sanitizer", "types": ["xss"], "pattern": "bleach", "name": "Bleach Sanitizer", "call": "bleach.clean", "arg": 0},
+]
+
+
+class Rule(BaseModel):
+    id: str = Field(..., description="Identificador único de la regla")
+    kind: Literal["sink", "sanitizer"] = Field(..., description="Tipo de regla")
+    types: List[str] = Field(..., description="Tipos de vulnerabilidad a los que aplica ('*' = genérica)")
+    name: str = Field(..., description="Nombre que se reporta cuando la regla coincide")
+    pattern: Optional[str] = Field(None, description="Token literal, con segmentos separados por puntos (p. ej. 'os.system')")
+    regex: Optional[str] = Field(None, description="Expresión regular, alternativa a pattern")
+    call: Optional[str] = Field(
+        None,
+        description="Destino cualificado de la llamada para el modo AST (admite comodines, p. ej. '*.execute')",
+    )
+    arg: Optional[int] = Field(None, description="Posición del argumento peligroso (modo AST)")
+    keywords: List[str] = Field(default_factory=list, description="Nombres de keyword del argumento peligroso (modo AST)")
+
+
+class RuleMatch(BaseModel):
+    rule_id: str
+    name: str
+    line: int
+    column: int
+    text: str
+
+
+def normalize_type(vulnerability_type: str) -> str:
+    """Normaliza el tipo de vulnerabilidad a una clave del catálogo."""
+    key = (vulnerability_type or "").strip().lower()
+    if key == GENERIC_TYPE or key in TYPE_ALIASES.values():
+        return key
+    for alias, normalized in TYPE_ALIASES.items():
+        if alias in key:
+            return normalized
+    return key
+
+
+# Identificadores con puntos (os.system, cur.execute, requests.get...) no precedidos de otro identificador
+_TOKEN = re.compile(r"(?<![\w.])[A-Za-z_]\w*(?:\s*\.\s*[A-Za-z_]\w*)*")
+_DOT = re.compile(r"\s*\.\s*")
+
+
+class RuleCatalog:
+    """
+    Catálogo de reglas de sinks y sanitizers compilado una sola vez.
+
+    Las reglas de token literal ('execute', 'os.system') se indexan en un diccionario
+    por segmentos; el texto se tokeniza una vez en identificadores con puntos y cada
+    token se busca por sus sub-secuencias de segmentos, de modo que 'execute' coincide
+    con 'cur.execute' pero no con 'executed' ni con 'my_execute'. Las reglas con regex
+    se combinan en una única alternancia con grupos con nombre. El coste de un escaneo
+    es lineal en el tamaño del texto e independiente del número de reglas literales.
+    """
+
+    def __init__(self, rules: Iterable[Dict]):
+        self.rules: List[Rule] = []
+        self._literals: Dict[Tuple[str, ...], List[int]] = {}
+        self._max_segments = 1
+        self._regexes: Dict[str, Optional[re.Pattern]] = {}
+        self._lock = threading.Lock()
+        self.extend(rules)
+
+    def extend(self, rules: Iterable[Dict]):
+        """Añade reglas (reemplazando las de mismo id) y recompila el catálogo."""
+        with self._lock:
+            by_id = {rule.id: rule for rule in self.rules}
+            for raw in rules:
+                rule = raw if isinstance(raw, Rule) else Rule(**raw)
+                if not rule.pattern and not rule.regex and not rule.call:
+                    raise ValueError(f"La regla '{rule.id}' necesita 'pattern', 'regex' o 'call'")
+                by_id[rule.id] = rule
+            self.rules = list(by_id.values())
+
+            self._literals = {}
+            for i, rule in enumerate(self.rules):
+                if rule.pattern and not rule.regex:
+                    key = tuple(_DOT.split(rule.pattern.strip().lower()))
+                    self._literals.setdefault(key, []).append(i)
+            self._max_segments = max((len(k) for k in self._literals), default=1)
+            self._regexes = {
+                kind: self._compile([i for i, r in enumerate(self.rules) if r.kind == kind and r.regex])
+                for kind in ("sink", "sanitizer")
+            }
+
+    def _compile(self, rule_indexes: List[int]) -> Optional[re.Pattern]:
+        if not rule_indexes:
+            return None
+        alternatives = [f"(?P<r{i}>{self.rules[i].regex})" for i in rule_indexes]
+        return re.compile("|".join(alternatives), re.IGNORECASE)
+
+    def rules_for(self, kind: str, vulnerability_type: str) -> List[Rule]:
+        key = normalize_type(vulnerability_type)
+        return [r for r in self.rules if r.kind == kind and key in r.types]
+
+    def scan(self, text: str, kind: str, first_line: int = 1) -> List[RuleMatch]:
+        """Todas las coincidencias de reglas de un tipo en el texto, con su línea."""
+        line_starts = [0] + [m.end() for m in re.finditer(r"\n", text)]
+
+        def make_match(rule: Rule, start: int, matched: str) -> RuleMatch:
+            line_index = bisect_right(line_starts, start) - 1
+            return RuleMatch(
+                rule_id=rule.id,
+                name=rule.name,
+                line=first_line + line_index,
+                column=start - line_starts[line_index],
+                text=matched,
+            )
+
+        matches = []
+        for token in _TOKEN.finditer(text):
+            segments = _DOT.split(token.group(0).lower())
+            seen = set()
+            for size in range(1, min(self._max_segments, len(segments)) + 1):
+                for offset in range(len(segments) - size + 1):
+                    for i in self._literals.get(tuple(segments[offset:offset + size]), ()):
+                        rule = self.rules[i]
+                        if rule.kind == kind and i not in seen:
+                            seen.add(i)
+                            matches.append(make_match(rule, token.start(), token.group(0)))
+
+        regex = self._regexes.get(kind)
+        if regex is not None:
+            for m in regex.finditer(text):
+                rule = self.rules[int(m.lastgroup[1:])]
+                matches.append(make_match(rule, m.start(), m.group(0)))
+
+        matches.sort(key=lambda m: (m.line, m.column))
+        return matches
+
+    def match(self, text: str, kind: str, vulnerability_type: str, first_line: int = 1) -> List[RuleMatch]:
+        """Coincidencias de las reglas aplicables al tipo de vulnerabilidad, en orden del catálogo."""
+        applicable = {r.id: position for position, r in enumerate(self.rules_for(kind, vulnerability_type))}
+        found = [m for m in self.scan(text, kind, first_line) if m.rule_id in applicable]
+        return sorted(found, key=lambda m: (applicable[m.rule_id], m.line, m.column))
+
+    def match_generic(self, text: str, kind: str, first_line: int = 1) -> List[RuleMatch]:
+        return self.match(text, kind, GENERIC_TYPE, first_line)
+
+    def call_rules(self, kind: str, vulnerability_type: Optional[str] = None) -> List[Rule]:
+        """Reglas con destino de llamada (modo AST), opcionalmente filtradas por tipo."""
+        rules = self.rules_for(kind, vulnerability_type) if vulnerability_type is not None else [
+            r for r in self.rules if r.kind == kind
+        ]
+        return [r for r in rules if r.call]
+
+    def match_call(self, resolved: Optional[str], kind: str, vulnerability_type: Optional[str] = None) -> Optional[Rule]:
+        """
+        Regla AST más específica cuyo patrón 'call' coincide con el nombre cualificado de
+        la llamada: un patrón exacto gana a uno con comodines ('subprocess.run' frente a
+        'subprocess.*'); a igualdad, el orden del catálogo.
+        """
+        best: Optional[Rule] = None
+        best_rank: Tuple[int, int] = (-1, -1)
+        for rule in self.call_rules(kind, vulnerability_type):
+            if call_matches(resolved, rule.call):
+                rank = (0 if "*" in rule.call else 1, len(rule.call.replace("*", "")))
+                if rank > best_rank:
+                    best, best_rank = rule, rank
+        return best
+
+
+def load_rules_file(path: str) -> List[Dict]:
+    """Carga reglas adicionales desde un archivo JSON o YAML (lista o {"rules": [...]})."""
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("Se requiere PyYAML para cargar reglas YAML (pip install pyyaml)")
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+
+    if isinstance(data, dict):
+        data = data.get("rules", [])
+    return data
+
+
+def _build_default_catalog() -> RuleCatalog:
+    catalog = RuleCatalog(DEFAULT_RULES)
+    rules_file = os.environ.get(RULES_FILE_ENV)
+    if rules_file:
+        catalog.extend(load_rules_file(rules_file))
+    return catalog
+
+
+default_catalog = _build_default_catalog()
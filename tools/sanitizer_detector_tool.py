@@ -1,59 +1,127 @@
 from pydantic import BaseModel, Field
-from typing import List
+from typing import List, Literal, Optional
+
+from tools.rule_catalog import RuleMatch, default_catalog
+from tools.sink_resolution import analyze_sink_calls
+from tools.source_index import resolve_snippet
 
 
 class SanitizerDetectorInput(BaseModel):
-    snippet: str = Field(..., description="Bloque de código a analizar")
+    snippet: str = Field("", description="Bloque de código a analizar")
     vulnerability_type: str = Field(..., description="Tipo de vulnerabilidad reportada")
+    file_path: Optional[str] = Field(
+        None,
+        description="Ruta del archivo fuente. Si se indica sin snippet, el bloque se lee del índice compartido del archivo",
+    )
+    start_line: Optional[int] = Field(None, description="Primera línea del bloque a leer de file_path")
+    end_line: Optional[int] = Field(None, description="Última línea del bloque a leer de file_path")
+    mode: Literal["pattern", "ast"] = Field(
+        "pattern",
+        description="'pattern' busca tokens en el texto; 'ast' comprueba si el flujo hasta el sink de sink_line pasa por un sanitizer",
+    )
+    sink_line: Optional[int] = Field(None, description="Línea del sink (modo 'ast'; por defecto end_line)")
+    source_line: Optional[int] = Field(None, description="Línea del source (modo 'ast')")
+    tainted_variables: Optional[List[str]] = Field(
+        None,
+        description="Variables taint en el ámbito del sink, alternativa a source_line (modo 'ast')",
+    )
 
 
 class SanitizerDetectionOutput(BaseModel):
     sanitizers_found: List[str]
     sufficient: bool
     explanation: str
+    matches: List[RuleMatch] = []
 
 
 def sanitizer_detector_tool(input_data: SanitizerDetectorInput) -> SanitizerDetectionOutput:
     """
     Identifica mecanismos de sanitización o validación en el código.
     """
-    snippet = input_data.snippet.lower()
+    if input_data.mode == "ast" and input_data.file_path:
+        return _detect_ast(input_data)
+
+    snippet = resolve_snippet(input_data)
+    first_line = input_data.start_line or 1 if not input_data.snippet else 1
 
     sanitizers_found = []
     sufficient = False
     explanation = "No se detectaron sanitizers relevantes."
 
-    SANITIZERS = {
-        "sql injection": [
-            {"pattern": "?", "name": "Parameterized Query (Placeholder)"},
-            {"pattern": "%s", "name": "Parameterized Query (Placeholder Postgres/MySQL)"},
-            {"pattern": ":", "name": "Named Parameter"},
-            {"pattern": "literal", "name": "SQLAlchemy Literal"}
-        ],
-        "command injection": [
-            {"pattern": "shlex.quote", "name": "Shell Escape"},
-            {"pattern": "subprocess.run", "name": "Subprocess List Args (Implicit)"} 
-        ],
-        "xss": [
-            {"pattern": "escape", "name": "HTML Escape"},
-            {"pattern": "bleach", "name": "Bleach Sanitizer"}
-        ]
-    }
-
-    vuln_type_key = input_data.vulnerability_type.lower()
-    checks = SANITIZERS.get(vuln_type_key, [])
-    
-    if not checks:
-        if "sql" in vuln_type_key: checks = SANITIZERS["sql injection"]
-
-    for check in checks:
-        if check["pattern"] in snippet:
-            sanitizers_found.append(check["name"])
+    matches = default_catalog.match(snippet, "sanitizer", input_data.vulnerability_type, first_line)
+    for match in matches:
+        if match.name not in sanitizers_found:
+            sanitizers_found.append(match.name)
             sufficient = True
-            explanation = f"Se detectó mitigación: {check['name']}."
+            explanation = f"Se detectó mitigación: {match.name} (línea {match.line})."
+
+    return SanitizerDetectionOutput(
+        sanitizers_found=sanitizers_found,
+        sufficient=sufficient,
+        explanation=explanation,
+        matches=matches,
+    )
+
+
+def _detect_ast(input_data: SanitizerDetectorInput) -> SanitizerDetectionOutput:
+    """
+    Modo AST: la mitigación solo cuenta si protege el argumento peligroso del sink.
+    Un html.escape en otra rama o sobre otra variable no hace suficiente el hallazgo.
+    """
+    sink_line = input_data.sink_line or input_data.end_line or input_data.start_line
+    if sink_line is None:
+        return SanitizerDetectionOutput(
+            sanitizers_found=[],
+            sufficient=False,
+            explanation="El modo 'ast' requiere sink_line, start_line o end_line.",
+        )
+
+    calls = analyze_sink_calls(
+        input_data.file_path,
+        sink_line,
+        input_data.vulnerability_type,
+        source_line=input_data.source_line,
+        tainted_variables=input_data.tainted_variables,
+    )
+    if not calls:
+        return SanitizerDetectionOutput(
+            sanitizers_found=[],
+            sufficient=False,
+            explanation=f"Ninguna llamada de la línea {sink_line} resuelve a un sink conocido.",
+        )
+
+    sanitizers_found: List[str] = []
+    matches: List[RuleMatch] = []
+    sufficient = True
+    reasons = []
+    for call in calls:
+        found = list(call.sanitized_by)
+        if call.parameterized and not call.tainted:
+            found.append("Parameterized Query")
+        if call.list_args and not call.shell:
+            found.append("Subprocess List Args")
+        for name in found:
+            if name not in sanitizers_found:
+                sanitizers_found.append(name)
+            matches.append(RuleMatch(rule_id=call.rule_id, name=name, line=call.line, column=call.column, text=call.call))
+
+        if call.tainted and not (call.list_args and not call.shell):
+            sufficient = False
+            reasons.append(f"'{call.call}' (línea {call.line}) recibe datos no confiables sin sanitizar")
+        elif found:
+            reasons.append(f"'{call.call}' (línea {call.line}) protegido por {', '.join(found)}")
+
+    sufficient = sufficient and bool(sanitizers_found)
+    if sufficient:
+        explanation = f"Se detectó mitigación efectiva: {'; '.join(reasons)}."
+    elif reasons:
+        explanation = f"Mitigación insuficiente: {'; '.join(reasons)}."
+    else:
+        explanation = "No se detectaron sanitizers en el flujo hacia el sink."
 
     return SanitizerDetectionOutput(
         sanitizers_found=sanitizers_found,
         sufficient=sufficient,
-        explanation=explanation
+        explanation=explanation,
+        matches=matches,
     )
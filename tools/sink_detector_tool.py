@@ -1,58 +1,126 @@
 from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+
+from tools.rule_catalog import RuleMatch, default_catalog
+from tools.sink_resolution import analyze_sink_calls
+from tools.source_index import resolve_snippet
 
 
 class SinkDetectorInput(BaseModel):
-    snippet: str = Field(..., description="Bloque de código a analizar")
+    snippet: str = Field("", description="Bloque de código a analizar")
     vulnerability_type: str = Field(..., description="Tipo de vulnerabilidad reportada")
+    file_path: Optional[str] = Field(
+        None,
+        description="Ruta del archivo fuente. Si se indica sin snippet, el bloque se lee del índice compartido del archivo",
+    )
+    start_line: Optional[int] = Field(None, description="Primera línea del bloque a leer de file_path")
+    end_line: Optional[int] = Field(None, description="Última línea del bloque a leer de file_path")
+    mode: Literal["pattern", "ast"] = Field(
+        "pattern",
+        description="'pattern' busca tokens en el texto; 'ast' resuelve las llamadas de sink_line en el AST de file_path",
+    )
+    sink_line: Optional[int] = Field(None, description="Línea del sink (modo 'ast'; por defecto start_line)")
+    source_line: Optional[int] = Field(None, description="Línea del source, para exigir flujo taint hasta el argumento peligroso (modo 'ast')")
+    tainted_variables: Optional[List[str]] = Field(
+        None,
+        description="Variables taint en el ámbito del sink, alternativa a source_line (modo 'ast')",
+    )
 
 
 class SinkDetectionOutput(BaseModel):
     sink_detected: bool
     sink_type: str
     explanation: str
+    matches: List[RuleMatch] = []
 
 
 def sink_detector_tool(input_data: SinkDetectorInput) -> SinkDetectionOutput:
     """
     Detecta si existen patrones de sinks peligrosos conocidos en el snippet.
     """
-    snippet = input_data.snippet.lower()
+    if input_data.mode == "ast" and input_data.file_path:
+        return _detect_ast(input_data)
+
+    snippet = resolve_snippet(input_data)
+    first_line = input_data.start_line or 1 if not input_data.snippet else 1
 
     sink_detected = False
     sink_type = "Unknown"
     explanation = "No se detectó un sink conocido."
 
-    SINKS = {
-        "sql injection": ["execute", "cursor", "raw_sql", "executemany"],
-        "command injection": ["system", "popen", "subprocess", "call", "run"],
-        "xss": ["render_template_string", "response", "markup"],
-        "ssrf": ["requests.get", "requests.post", "urlopen", "httpclient", "get"]
-    }
-
-    vuln_type_key = input_data.vulnerability_type.lower()
-    patterns = SINKS.get(vuln_type_key, [])
-    
-    if not patterns:
-        if "sql" in vuln_type_key: patterns = SINKS["sql injection"]
-        elif "command" in vuln_type_key or "rce" in vuln_type_key: patterns = SINKS["command injection"]
-        elif "xss" in vuln_type_key: patterns = SINKS["xss"]
-        elif "ssrf" in vuln_type_key: patterns = SINKS["ssrf"]
-
-    for pattern in patterns:
-        if pattern in snippet:
+    matches = default_catalog.match(snippet, "sink", input_data.vulnerability_type, first_line)
+    if matches:
+        sink_detected = True
+        sink_type = matches[0].name
+        lines = sorted({m.line for m in matches})
+        explanation = f"Se detectó un patrón de sink peligroso: '{matches[0].name}' asociado a {input_data.vulnerability_type} (líneas {lines})."
+    else:
+        matches = default_catalog.match_generic(snippet, "sink", first_line)
+        if matches:
             sink_detected = True
-            sink_type = pattern
-            explanation = f"Se detectó un patrón de sink peligroso: '{pattern}' asociado a {input_data.vulnerability_type}."
-            break
-            
-    if not sink_detected:
-         if "execute" in snippet or "eval" in snippet:
-             sink_detected = True
-             sink_type = "Generic Execution"
-             explanation = "Se detectó ejecución genérica potencialmente peligrosa."
+            sink_type = "Generic Execution"
+            explanation = "Se detectó ejecución genérica potencialmente peligrosa."
 
     return SinkDetectionOutput(
         sink_detected=sink_detected,
         sink_type=sink_type,
-        explanation=explanation
+        explanation=explanation,
+        matches=matches,
+    )
+
+
+def _detect_ast(input_data: SinkDetectorInput) -> SinkDetectionOutput:
+    """
+    Modo AST: solo cuenta como sink una llamada cuyo destino resuelto (siguiendo alias
+    de import) coincide con una regla del catálogo y cuyo argumento peligroso recibe
+    datos taint. Sin source_line ni tainted_variables basta con que no sea constante.
+    """
+    sink_line = input_data.sink_line or input_data.start_line
+    if sink_line is None:
+        return SinkDetectionOutput(
+            sink_detected=False,
+            sink_type="Unknown",
+            explanation="El modo 'ast' requiere sink_line o start_line.",
+        )
+
+    calls = analyze_sink_calls(
+        input_data.file_path,
+        sink_line,
+        input_data.vulnerability_type,
+        source_line=input_data.source_line,
+        tainted_variables=input_data.tainted_variables,
+    )
+    matches = [
+        RuleMatch(rule_id=c.rule_id, name=c.rule_name, line=c.line, column=c.column, text=c.call)
+        for c in calls
+    ]
+    tainted = [c for c in calls if c.tainted]
+
+    if tainted:
+        call = tainted[0]
+        flow = f" Flujo: {' -> '.join(call.path)}." if call.path else ""
+        return SinkDetectionOutput(
+            sink_detected=True,
+            sink_type=call.rule_name,
+            explanation=f"La llamada '{call.call}' (línea {call.line}) es un sink de {input_data.vulnerability_type} y su argumento peligroso recibe datos no confiables.{flow}",
+            matches=matches,
+        )
+    if calls:
+        call = calls[0]
+        if call.sanitized_by:
+            reason = f"el flujo pasa por {', '.join(call.sanitized_by)}"
+        elif call.dangerous_is_constant:
+            reason = "el argumento peligroso es constante"
+        else:
+            reason = "ningún dato taint alcanza el argumento peligroso"
+        return SinkDetectionOutput(
+            sink_detected=False,
+            sink_type=call.rule_name,
+            explanation=f"La llamada '{call.call}' (línea {call.line}) coincide con un sink, pero {reason}.",
+            matches=matches,
+        )
+    return SinkDetectionOutput(
+        sink_detected=False,
+        sink_type="Unknown",
+        explanation=f"Ninguna llamada de la línea {sink_line} resuelve a un sink conocido.",
     )
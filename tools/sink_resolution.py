@@ -0,0 +1,157 @@
+import ast
+from typing import Iterable, List, NamedTuple, Optional, Set
+
+from tools.call_resolver import call_matches
+from tools.rule_catalog import default_catalog, normalize_type
+from tools.taint_engine import MODULE_SCOPE, CallInfo, TaintEngine, Var, get_taint_engine
+
+
+class SinkCallAnalysis(NamedTuple):
+    call: str
+    rule_id: str
+    rule_name: str
+    line: int
+    column: int
+    dangerous_is_constant: bool
+    tainted: bool
+    taint_known: bool
+    path: List[str]
+    sanitized_by: List[str]
+    parameterized: bool
+    list_args: bool
+    shell: bool
+
+
+def _keyword_is_true(node: ast.Call, name: str) -> bool:
+    for kw in node.keywords:
+        if kw.arg == name:
+            return not (isinstance(kw.value, ast.Constant) and not kw.value.value)
+    return False
+
+
+def _dangerous_node(info: CallInfo, position: Optional[int], keywords: Iterable[str]) -> Optional[ast.AST]:
+    if position is not None and position < len(info.node.args):
+        return info.node.args[position]
+    for kw in info.node.keywords:
+        if kw.arg in keywords:
+            return kw.value
+    return None
+
+
+def _is_literal(node: ast.AST) -> bool:
+    """Indica si la expresión es un literal o una concatenación/f-string formada solo por literales."""
+    if isinstance(node, ast.Constant):
+        return True
+    if isinstance(node, ast.JoinedStr):
+        return all(
+            isinstance(value, ast.Constant) or (isinstance(value, ast.FormattedValue) and _is_literal(value.value))
+            for value in node.values
+        )
+    if isinstance(node, ast.BinOp):
+        return _is_literal(node.left) and _is_literal(node.right)
+    return False
+
+
+def _external_inputs(engine: TaintEngine) -> Set[Var]:
+    """
+    Nodos sin definición en el archivo: parámetros de función, nombres libres (salvo
+    módulos importados) y resultados de llamadas externas.
+    """
+    inputs = {(qualname, p) for qualname, summary in engine.summaries.items() for p in summary.params}
+    inputs.update(engine.external_calls)
+    for deps in engine.graph.values():
+        inputs.update(
+            dep for dep in deps
+            if dep not in engine.graph and not (dep[0] == MODULE_SCOPE and dep[1] in engine.aliases)
+        )
+    return inputs
+
+
+def _barriers_reached(engine: TaintEngine, starts: Set[Var], barriers: Set[Var]) -> Set[Var]:
+    return {b for b in barriers if engine.flows(starts, [b])}
+
+
+def resolve_seeds(
+    engine: TaintEngine,
+    sink_line: int,
+    source_line: Optional[int] = None,
+    tainted_variables: Optional[List[str]] = None,
+) -> Optional[Set[Var]]:
+    """Variables taint: las del source_line, o las primeras definiciones de los nombres indicados en el ámbito del sink. None si se desconocen."""
+    if source_line is not None:
+        return engine.seeds_at(source_line)
+    if tainted_variables:
+        return {var for name in tainted_variables for var in engine.origins(name, sink_line)}
+    return None
+
+
+def analyze_sink_calls(
+    file_path: str,
+    sink_line: int,
+    vulnerability_type: str,
+    source_line: Optional[int] = None,
+    tainted_variables: Optional[List[str]] = None,
+) -> List[SinkCallAnalysis]:
+    """
+    Resuelve desde el AST las llamadas de la línea del sink que coinciden con reglas
+    de sink del catálogo (siguiendo alias de import) y determina si el argumento
+    peligroso recibe datos taint, si el flujo pasa por un sanitizer y si la llamada
+    usa parámetros separados (SQL) o lista de argumentos sin shell (comandos).
+    """
+    engine = get_taint_engine(file_path)
+    seeds = resolve_seeds(engine, sink_line, source_line, tainted_variables)
+    vuln_key = normalize_type(vulnerability_type)
+
+    sanitizer_rules = default_catalog.call_rules("sanitizer", vulnerability_type)
+    barriers = {
+        node for node, resolved in engine.sanitizer_calls.items()
+        if any(call_matches(resolved, rule.call) for rule in sanitizer_rules)
+    }
+
+    results = []
+    for info in engine.calls_at(sink_line):
+        rule = default_catalog.match_call(info.resolved, "sink", vulnerability_type)
+        if rule is None:
+            rule = default_catalog.match_call(info.resolved, "sink", "*")
+        if rule is None:
+            continue
+
+        dangerous = engine.argument_deps(info, rule.arg, rule.keywords)
+        dangerous_node = _dangerous_node(info, rule.arg, rule.keywords)
+
+        path: List[Var] = []
+        if seeds is None:
+            # Sin información de taint: cuenta cualquier entrada externa (parámetros, nombres
+            # no definidos en el archivo) que alcance el argumento sin pasar por un sanitizer
+            inputs = _external_inputs(engine)
+            unsanitized = engine.flows(dangerous, inputs, blocked=barriers)
+            sanitized_nodes = set() if unsanitized else _barriers_reached(engine, dangerous, barriers)
+            tainted = bool(unsanitized)
+            path = unsanitized
+        else:
+            path = engine.flows(dangerous, seeds)
+            unsanitized = engine.flows(dangerous, seeds, blocked=barriers) if barriers else path
+            sanitized_nodes = {v for v in path if v in barriers} if path and not unsanitized else set()
+            tainted = bool(unsanitized)
+            path = unsanitized or path
+        sanitized_by = sorted({engine.sanitizer_calls[v] for v in sanitized_nodes})
+
+        extra_args = len(info.node.args) > 1 or any(kw.arg in ("parameters", "params", "args") for kw in info.node.keywords)
+        results.append(
+            SinkCallAnalysis(
+                call=info.resolved or "?",
+                rule_id=rule.id,
+                rule_name=rule.name,
+                line=info.node.lineno,
+                column=info.node.col_offset,
+                dangerous_is_constant=dangerous_node is not None and _is_literal(dangerous_node),
+                tainted=tainted,
+                taint_known=seeds is not None,
+                path=engine.display_path(path, sink_line),
+                sanitized_by=sanitized_by,
+                parameterized=vuln_key == "sql injection" and extra_args,
+                list_args=isinstance(dangerous_node, (ast.List, ast.Tuple)),
+                shell=_keyword_is_true(info.node, "shell"),
+            )
+        )
+    return results
@@ -0,0 +1,295 @@
+import ast
+import os
+import textwrap
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+FunctionNode = (ast.FunctionDef, ast.AsyncFunctionDef)
+
+
+class ScopeSpan(NamedTuple):
+    start_line: int
+    end_line: int
+    qualname: str
+    kind: str
+    node: ast.AST
+    parent: Optional[int]
+
+
+class SourceIndex:
+    """
+    Índice de un archivo fuente construido una sola vez y compartido por todas las herramientas.
+
+    Contiene las líneas, los offsets de inicio de cada línea, el AST completo, el
+    mapa línea -> sentencia más interna y un índice de intervalos de funciones y
+    clases (ordenado por línea de inicio) para resolver la función contenedora con bisect.
+    Las líneas se numeran desde 1, igual que en los hallazgos SAST.
+    """
+
+    def __init__(self, path: str, text: str):
+        self.path = path
+        self.text = text
+        self.lines: List[str] = text.splitlines(keepends=True)
+
+        self.line_offsets: List[int] = []
+        offset = 0
+        for line in self.lines:
+            self.line_offsets.append(offset)
+            offset += len(line)
+
+        self.syntax_error: Optional[SyntaxError] = None
+        try:
+            self.tree: Optional[ast.Module] = ast.parse(text, filename=path)
+        except SyntaxError as e:
+            self.tree = None
+            self.syntax_error = e
+
+        self._derived: Dict[str, Any] = {}
+        self._derived_lock = threading.RLock()
+        self._statement_by_line: List[Optional[ast.stmt]] = [None] * (len(self.lines) + 1)
+        self.scopes: List[ScopeSpan] = []
+        self._scope_starts: List[int] = []
+        if self.tree is not None:
+            self._build_line_maps(self.tree)
+            self._build_scope_index(self.tree)
+
+    @classmethod
+    def from_file(cls, path: str) -> "SourceIndex":
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"File not found: {path}")
+
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(path, f.read())
+
+    def _build_line_maps(self, tree: ast.Module):
+        # ast.walk recorre en anchura: los nodos internos sobrescriben a sus contenedores
+        for node in ast.walk(tree):
+            if not isinstance(node, ast.stmt):
+                continue
+            end = min(node.end_lineno or node.lineno, len(self.lines))
+            for line in range(node.lineno, end + 1):
+                self._statement_by_line[line] = node
+
+    def _build_scope_index(self, tree: ast.Module):
+        # Recorrido en profundidad en orden de aparición: los padres quedan antes que sus hijos
+        stack: List[Tuple[ast.AST, Optional[int], str]] = [
+            (child, None, "") for child in reversed(tree.body)
+        ]
+        while stack:
+            node, parent, prefix = stack.pop()
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                decorators = [d.lineno for d in node.decorator_list]
+                start = min([node.lineno] + decorators)
+                kind = "class" if isinstance(node, ast.ClassDef) else "function"
+                qualname = f"{prefix}{node.name}"
+                self.scopes.append(ScopeSpan(start, node.end_lineno or node.lineno, qualname, kind, node, parent))
+                parent = len(self.scopes) - 1
+                prefix = f"{qualname}.<locals>." if kind == "function" else f"{qualname}."
+
+            for child in reversed(list(ast.iter_child_nodes(node))):
+                if isinstance(child, ast.stmt):
+                    stack.append((child, parent, prefix))
+
+        self._scope_starts = [scope.start_line for scope in self.scopes]
+
+    @property
+    def line_count(self) -> int:
+        return len(self.lines)
+
+    def line(self, line_number: int) -> str:
+        """Devuelve el texto de una línea (1-indexada) o cadena vacía si está fuera de rango."""
+        if 1 <= line_number <= len(self.lines):
+            return self.lines[line_number - 1]
+        return ""
+
+    def slice(self, start_line: int, end_line: int) -> str:
+        """Devuelve el texto entre start_line y end_line, ambas incluidas."""
+        start = max(1, start_line)
+        end = min(len(self.lines), end_line)
+        return "".join(self.lines[start - 1:end])
+
+    def offset(self, line_number: int, col: int = 0) -> int:
+        """Convierte (línea, columna) en un offset absoluto dentro del texto."""
+        return self.line_offsets[line_number - 1] + col
+
+    def enclosing_scope(self, line_number: int, kinds: Tuple[str, ...] = ("function", "class")) -> Optional[ScopeSpan]:
+        """
+        Función o clase más interna que contiene la línea.
+
+        bisect localiza el último ámbito que empieza antes de la línea; como los
+        ámbitos están anidados, basta con subir por sus padres hasta uno que la contenga.
+        """
+        position = bisect_right(self._scope_starts, line_number) - 1
+        candidate = position if position >= 0 else None
+        while candidate is not None:
+            scope = self.scopes[candidate]
+            if scope.end_line >= line_number and scope.kind in kinds:
+                return scope
+            candidate = scope.parent
+        return None
+
+    def function_span(self, line_number: int) -> Optional[ScopeSpan]:
+        """Función (def o async def, incluidos métodos) más interna que contiene la línea."""
+        return self.enclosing_scope(line_number, kinds=("function",))
+
+    def enclosing_function(self, line_number: int) -> Optional[ast.AST]:
+        """Nodo FunctionDef/AsyncFunctionDef más interno que contiene la línea."""
+        span = self.function_span(line_number)
+        return span.node if span is not None else None
+
+    def statement_at(self, line_number: int) -> Optional[ast.stmt]:
+        """Sentencia más interna que cubre la línea."""
+        if 1 <= line_number <= len(self.lines):
+            return self._statement_by_line[line_number]
+        return None
+
+    def derived(self, name: str, factory: Callable[["SourceIndex"], Any]) -> Any:
+        """
+        Devuelve un análisis derivado del índice (p. ej. el motor de taint), construido
+        una sola vez y descartado junto con el índice cuando cambia el archivo.
+        """
+        with self._derived_lock:
+            if name not in self._derived:
+                self._derived[name] = factory(self)
+            return self._derived[name]
+
+
+# Memoria aproximada por carácter de fuente de un índice con sus análisis derivados
+# (AST, mapas de líneas, motor de taint); medida con tracemalloc sobre código típico
+INDEX_BYTES_PER_CHAR = 100
+
+
+class SourceIndexCache:
+    """
+    Caché de SourceIndex por ruta absoluta, invalidada por mtime y tamaño del archivo.
+
+    Con max_bytes, los índices menos usados recientemente se descartan cuando la memoria
+    estimada (INDEX_BYTES_PER_CHAR por carácter de fuente) supera el límite; el índice
+    recién cargado nunca se descarta. Las cargas concurrentes de un mismo archivo esperan
+    a un único parseo.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[Tuple[int, int], SourceIndex, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: Dict[str, threading.Lock] = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def _lookup(self, key: str, stamp: Tuple[int, int]) -> Optional[SourceIndex]:
+        """Entrada vigente para la ruta, o None. Requiere el lock."""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != stamp:
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def get(self, path: str) -> SourceIndex:
+        key = os.path.abspath(path)
+        try:
+            stat = os.stat(key)
+        except OSError:
+            raise FileNotFoundError(f"File not found: {path}")
+        stamp = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            index = self._lookup(key, stamp)
+            if index is not None:
+                return index
+            loading = self._loading.setdefault(key, threading.Lock())
+
+        with loading:
+            with self._lock:
+                index = self._lookup(key, stamp)
+                if index is not None:
+                    return index
+            try:
+                index = SourceIndex.from_file(path)
+            except BaseException:
+                with self._lock:
+                    self._loading.pop(key, None)
+                raise
+            with self._lock:
+                self._store(key, stamp, index)
+                self._loading.pop(key, None)
+        return index
+
+    def _store(self, key: str, stamp: Tuple[int, int], index: SourceIndex):
+        """Inserta el índice y descarta los menos recientes si se supera max_bytes. Requiere el lock."""
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.total_bytes -= previous[2]
+        size = len(index.text) * INDEX_BYTES_PER_CHAR
+        self._entries[key] = (stamp, index, size)
+        self.total_bytes += size
+        self.loads += 1
+        if self.max_bytes is None:
+            return
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self.total_bytes -= evicted_size
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+
+_default_cache = SourceIndexCache()
+
+
+def get_source_index(path: str) -> SourceIndex:
+    """Devuelve el SourceIndex compartido de la ejecución para un archivo."""
+    return _default_cache.get(path)
+
+
+def configure_source_index_cache(max_bytes: Optional[int]):
+    """Fija el límite de memoria de la caché compartida de índices (None = sin límite)."""
+    with _default_cache._lock:
+        _default_cache.max_bytes = max_bytes
+
+
+def source_index_cache_stats() -> Dict[str, int]:
+    """Contadores de la caché compartida de índices (entradas, bytes estimados, aciertos, cargas, descartes)."""
+    return _default_cache.stats()
+
+
+@lru_cache(maxsize=256)
+def parse_snippet(snippet: str) -> Optional[ast.Module]:
+    """Parsea (tras dedent) un fragmento de código; None si no es Python válido."""
+    try:
+        return ast.parse(textwrap.dedent(snippet))
+    except SyntaxError:
+        return None
+
+
+def resolve_snippet(input_data) -> str:
+    """
+    Devuelve el snippet de una entrada de herramienta; si viene vacío y se indicó
+    file_path, lo extrae del índice compartido (todo el archivo si no hay rango).
+    """
+    if input_data.snippet or not input_data.file_path:
+        return input_data.snippet
+
+    index = get_source_index(input_data.file_path)
+    start = input_data.start_line or 1
+    end = input_data.end_line or index.line_count
+    return index.slice(start, end)
@@ -0,0 +1,810 @@
+import ast
+import threading
+from collections import deque
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from tools.call_resolver import get_import_aliases, resolve_call
+from tools.reachability import ReachabilityIndex
+from tools.rule_catalog import default_catalog
+from tools.source_index import SourceIndex, get_source_index
+
+MODULE_SCOPE = "<module>"
+RETURN_VAR = "<return>"
+
+Var = Tuple[str, str]
+
+# Definiciones que alcanzan un punto del código: nombre local -> versiones posibles
+Env = Dict[str, FrozenSet[Var]]
+
+# Sufijo del nodo que agrega todas las definiciones de un parámetro (lecturas desde closures)
+ALL_VERSIONS = "#*"
+
+
+class CallInfo(NamedTuple):
+    node: ast.Call
+    scope: str
+    name: Optional[str]
+    resolved: Optional[str]
+    callee: Optional[str]
+    arg_deps: List[Set[Var]]
+    keyword_deps: Dict[Optional[str], Set[Var]]
+    result: Optional[Var]
+
+
+class FunctionSummary(NamedTuple):
+    qualname: str
+    params: List[str]
+    # Parámetros que llegan al return sin pasar por un sanitizer
+    return_params: Set[str]
+    # Sanitizer -> parámetros que llegan al return a través de él
+    sanitized_returns: Dict[str, Set[str]]
+    sink_params: Set[str]
+
+
+class TaintResult(NamedTuple):
+    data_flow_detected: bool
+    path: List[str]
+    seeds: List[str]
+    sink_variables: List[str]
+
+
+def _call_name(func: ast.AST) -> Optional[str]:
+    if isinstance(func, ast.Name):
+        return func.id
+    if isinstance(func, ast.Attribute):
+        return func.attr
+    return None
+
+
+def _statement_children(body: Iterable[ast.stmt]) -> Iterable[ast.stmt]:
+    """Recorre las sentencias de un ámbito sin entrar en funciones ni clases anidadas."""
+    stack = list(reversed(list(body)))
+    while stack:
+        stmt = stack.pop()
+        yield stmt
+        if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        nested = []
+        for field in ("body", "orelse", "finalbody"):
+            nested.extend(getattr(stmt, field, []) or [])
+        for handler in getattr(stmt, "handlers", []) or []:
+            nested.extend(handler.body)
+        for case in getattr(stmt, "cases", []) or []:
+            nested.extend(case.body)
+        stack.extend(reversed(nested))
+
+
+def _terminates(stmt: ast.stmt) -> bool:
+    return isinstance(stmt, (ast.Return, ast.Raise, ast.Break, ast.Continue))
+
+
+def _merge(envs: Iterable[Optional[Env]]) -> Optional[Env]:
+    """Unión de las definiciones de varias ramas; None si ninguna rama llega al final."""
+    merged: Optional[Env] = None
+    for env in envs:
+        if env is None:
+            continue
+        if merged is None:
+            merged = dict(env)
+            continue
+        for name, versions in env.items():
+            merged[name] = merged.get(name, frozenset()) | versions
+    return merged
+
+
+class TaintEngine:
+    """
+    Motor de taint inter-procedural para un archivo completo.
+
+    Se construye una vez por SourceIndex: grafo def-use (variable -> variables de las
+    que depende) de todos los ámbitos, grafo de llamadas entre funciones del archivo
+    y resúmenes por función (qué parámetros alcanzan el return o un sink). Las
+    consultas source -> sink recorren el grafo precalculado y se memorizan.
+
+    Cada asignación a un nombre local crea una versión propia del nodo ("x#línea:col")
+    y sustituye a las anteriores: un uso solo depende de las definiciones que lo
+    alcanzan (ramas unidas, bucles con las definiciones de su cuerpo). Así
+    `name = shlex.quote(name)` deja de exponer el parámetro original a los usos
+    posteriores. Los parámetros conservan el nodo (función, nombre) como entrada, y las
+    lecturas desde otros ámbitos (closures, globales) ven todas las versiones.
+
+    Las llamadas a sanitizers del catálogo (html.escape, shlex.quote...) se modelan
+    como nodos propios del grafo, de modo que una consulta puede tratarlos como barrera.
+    Una llamada a una función local que sanea su parámetro antes de devolverlo recibe,
+    en el sitio de llamada, un nodo sanitizer equivalente. El resultado de una llamada
+    externa sin resolver (input(), os.getenv()...) es también un nodo propio: un valor
+    desconocido que cuenta como entrada externa aunque no dependa de nada del archivo.
+    """
+
+    def __init__(self, index: SourceIndex):
+        self.index = index
+        self.graph: Dict[Var, Set[Var]] = {}
+        self.defs_by_line: Dict[int, Set[Var]] = {}
+        self.calls_by_line: Dict[int, List[CallInfo]] = {}
+        self.call_sites: List[CallInfo] = []
+        self.call_graph: Dict[str, Set[str]] = {}
+        self.summaries: Dict[str, FunctionSummary] = {}
+        self.sanitizer_calls: Dict[Var, str] = {}
+        self.external_calls: Dict[Var, str] = {}
+        self.aliases = get_import_aliases(index)
+        self._functions: Dict[str, ast.AST] = {}
+        self._params: Dict[str, List[str]] = {}
+        self._locals: Dict[str, Set[str]] = {}
+        self._parents: Dict[str, Optional[str]] = {}
+        self._classes: Dict[str, Optional[str]] = {}
+        self._kinds: Dict[str, str] = {MODULE_SCOPE: "module"}
+        self._queries: Dict[Tuple[int, int], TaintResult] = {}
+        self._envs: Dict[Tuple[int, int], Env] = {}
+        self.reachability: Optional[ReachabilityIndex] = None
+        self._lock = threading.Lock()
+
+        if index.tree is not None:
+            self._build(index.tree)
+
+    # ------------------------------------------------------------------ construcción
+
+    def _build(self, tree: ast.Module):
+        scopes: List[Tuple[str, List[ast.stmt]]] = [(MODULE_SCOPE, tree.body)]
+        self._parents[MODULE_SCOPE] = None
+        self._classes[MODULE_SCOPE] = None
+        self._locals[MODULE_SCOPE] = set()
+
+        for span in self.index.scopes:
+            parent_name = self.index.scopes[span.parent].qualname if span.parent is not None else MODULE_SCOPE
+            self._parents[span.qualname] = parent_name
+            self._kinds[span.qualname] = span.kind
+            self._locals[span.qualname] = set()
+            if span.kind == "function":
+                self._functions[span.qualname] = span.node
+                owner = self.index.scopes[span.parent] if span.parent is not None else None
+                self._classes[span.qualname] = owner.qualname if owner is not None and owner.kind == "class" else None
+                args = span.node.args
+                params = [a.arg for a in args.posonlyargs + args.args]
+                if args.vararg:
+                    params.append(args.vararg.arg)
+                params.extend(a.arg for a in args.kwonlyargs)
+                if args.kwarg:
+                    params.append(args.kwarg.arg)
+                self._params[span.qualname] = params
+                self._locals[span.qualname].update(params)
+                for param in params:
+                    self.graph.setdefault((span.qualname, param + ALL_VERSIONS), set()).add((span.qualname, param))
+                body_start = span.node.body[0].lineno if span.node.body else span.node.lineno + 1
+                for line in range(span.node.lineno, max(span.node.lineno + 1, body_start)):
+                    self.defs_by_line.setdefault(line, set()).update((span.qualname, p) for p in params)
+            else:
+                self._classes[span.qualname] = None
+            scopes.append((span.qualname, span.node.body))
+
+        # Primera pasada: nombres locales de cada ámbito (asignaciones y declaraciones global)
+        globals_by_scope: Dict[str, Set[str]] = {}
+        for scope, body in scopes:
+            for stmt in _statement_children(body):
+                if isinstance(stmt, (ast.Global, ast.Nonlocal)):
+                    globals_by_scope.setdefault(scope, set()).update(stmt.names)
+                for name in self._stored_names(stmt):
+                    self._locals[scope].add(name)
+        for scope, names in globals_by_scope.items():
+            self._locals[scope].difference_update(names)
+
+        # Segunda pasada: aristas def-use y sitios de llamada, en orden de ejecución
+        for scope, body in scopes:
+            env: Env = {p: frozenset({(scope, p)}) for p in self._params.get(scope, [])}
+            self._visit_block(body, scope, env)
+
+        self._compute_summaries()
+        self.reachability = ReachabilityIndex(self.graph)
+
+    def _stored_names(self, stmt: ast.stmt) -> Set[str]:
+        names = set()
+        targets: List[ast.AST] = []
+        if isinstance(stmt, ast.Assign):
+            targets = stmt.targets
+        elif isinstance(stmt, (ast.AugAssign, ast.AnnAssign)):
+            targets = [stmt.target]
+        elif isinstance(stmt, (ast.For, ast.AsyncFor)):
+            targets = [stmt.target]
+        elif isinstance(stmt, (ast.With, ast.AsyncWith)):
+            targets = [item.optional_vars for item in stmt.items if item.optional_vars is not None]
+        elif isinstance(stmt, (ast.Import, ast.ImportFrom)):
+            for alias in stmt.names:
+                names.add((alias.asname or alias.name).split(".")[0])
+        elif isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(stmt.name)
+            return names
+
+        for field, value in ast.iter_fields(stmt):
+            if field in ("body", "orelse", "finalbody", "handlers", "cases"):
+                continue
+            for child in value if isinstance(value, list) else [value]:
+                if isinstance(child, ast.AST):
+                    names.update(n.target.id for n in ast.walk(child) if isinstance(n, ast.NamedExpr))
+        for target in targets:
+            names.update(self._target_names(target, include_bases=False))
+        return names
+
+    @staticmethod
+    def _target_names(target: ast.AST, include_bases: bool = True) -> Set[str]:
+        """
+        Nombres asignados por un target, incluido el desempaquetado. Con include_bases,
+        obj.attr / obj[i] cuentan como escritura sobre obj.
+        """
+        names = set()
+        stack = [target]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, ast.Name):
+                names.add(node.id)
+            elif isinstance(node, (ast.Tuple, ast.List)):
+                stack.extend(node.elts)
+            elif isinstance(node, ast.Starred):
+                stack.append(node.value)
+            elif isinstance(node, (ast.Attribute, ast.Subscript)) and include_bases:
+                stack.append(node.value)
+        return names
+
+    def _resolve(self, scope: str, name: str) -> Var:
+        current: Optional[str] = scope
+        while current is not None:
+            # Los cuerpos de clase no son visibles desde sus métodos
+            visible = current == scope or self._kinds.get(current) != "class"
+            if visible and name in self._locals.get(current, ()):
+                return (current, name)
+            current = self._parents.get(current)
+        return (MODULE_SCOPE, name)
+
+    def _resolve_callee(self, func: ast.AST, scope: str) -> Optional[str]:
+        if isinstance(func, ast.Name):
+            owner, _ = self._resolve(scope, func.id)
+            prefix = "" if owner == MODULE_SCOPE else f"{owner}.<locals>."
+            candidate = f"{prefix}{func.id}"
+            return candidate if candidate in self._functions else None
+        if (
+            isinstance(func, ast.Attribute)
+            and isinstance(func.value, ast.Name)
+            and func.value.id in ("self", "cls")
+        ):
+            owner_class = self._classes.get(scope)
+            if owner_class:
+                candidate = f"{owner_class}.{func.attr}"
+                return candidate if candidate in self._functions else None
+        return None
+
+    @staticmethod
+    def _target_name_nodes(target: ast.AST) -> List[Tuple[ast.Name, bool]]:
+        """
+        Nombres escritos por un target con su tipo de escritura: obj.attr / obj[i]
+        modifican obj sin reemplazarlo (escritura débil, conserva las definiciones previas).
+        """
+        found = []
+        stack: List[Tuple[ast.AST, bool]] = [(target, False)]
+        while stack:
+            node, weak = stack.pop()
+            if isinstance(node, ast.Name):
+                found.append((node, weak))
+            elif isinstance(node, (ast.Tuple, ast.List)):
+                stack.extend((elt, weak) for elt in node.elts)
+            elif isinstance(node, ast.Starred):
+                stack.append((node.value, weak))
+            elif isinstance(node, (ast.Attribute, ast.Subscript)):
+                stack.append((node.value, True))
+        return found
+
+    @staticmethod
+    def _statement_targets(stmt: ast.stmt) -> List[ast.AST]:
+        if isinstance(stmt, ast.Assign):
+            return list(stmt.targets)
+        if isinstance(stmt, ast.AugAssign) or (isinstance(stmt, ast.AnnAssign) and stmt.value is not None):
+            return [stmt.target]
+        if isinstance(stmt, (ast.For, ast.AsyncFor)):
+            return [stmt.target]
+        if isinstance(stmt, (ast.With, ast.AsyncWith)):
+            return [item.optional_vars for item in stmt.items if item.optional_vars is not None]
+        return []
+
+    @staticmethod
+    def _version(scope: str, node: ast.Name) -> Var:
+        return (scope, f"{node.id}#{node.lineno}:{node.col_offset}")
+
+    def _aggregate(self, var: Var) -> Var:
+        """Nodo con todas las definiciones de la variable; para un parámetro incluye su entrada."""
+        scope, name = var
+        return (scope, name + ALL_VERSIONS) if name in self._params.get(scope, ()) else var
+
+    def _block_definitions(self, body: Iterable[ast.stmt], scope: str) -> Env:
+        """Versiones definidas en un bloque (sin entrar en funciones anidadas), para bucles y try."""
+        defs: Dict[str, Set[Var]] = {}
+        for stmt in _statement_children(body):
+            nodes = [node for target in self._statement_targets(stmt) for node, _ in self._target_name_nodes(target)]
+            for field, value in ast.iter_fields(stmt):
+                if field in ("body", "orelse", "finalbody", "handlers", "cases"):
+                    continue
+                for child in value if isinstance(value, list) else [value]:
+                    if isinstance(child, ast.AST):
+                        nodes.extend(n.target for n in ast.walk(child) if isinstance(n, ast.NamedExpr))
+            for node in nodes:
+                if self._resolve(scope, node.id)[0] == scope:
+                    defs.setdefault(node.id, set()).add(self._version(scope, node))
+        return {name: frozenset(versions) for name, versions in defs.items()}
+
+    def _load(self, scope: str, name: str, env: Env) -> Set[Var]:
+        var = self._resolve(scope, name)
+        if var[0] == scope and env.get(name):
+            return set(env[name])
+        return {self._aggregate(var)}
+
+    def _define(self, scope: str, node: ast.Name, deps: Set[Var], env: Env, lines: Tuple[int, int], weak: bool = False):
+        """Registra una escritura de node.id; si es local, crea una versión que sustituye a las anteriores."""
+        var = self._resolve(scope, node.id)
+        if var[0] == scope:
+            target = self._version(scope, node)
+            if weak:
+                deps = deps | self._load(scope, node.id, env)
+            self.graph.setdefault(self._aggregate(var), set()).add(target)
+            env[node.id] = frozenset({target})
+        else:
+            # Escritura global o nonlocal: se acumula en el nodo del ámbito propietario
+            target = self._aggregate(var)
+        self.graph.setdefault(target, set()).update(deps)
+        for line in range(lines[0], lines[1] + 1):
+            self.defs_by_line.setdefault(line, set()).add(target)
+
+    def _assign(self, target: ast.AST, deps: Set[Var], stmt: ast.stmt, scope: str, env: Env):
+        lines = (stmt.lineno, stmt.end_lineno or stmt.lineno)
+        for node, weak in self._target_name_nodes(target):
+            self._define(scope, node, deps, env, lines, weak)
+
+    def _visit_block(self, body: Iterable[ast.stmt], scope: str, env: Env) -> Optional[Env]:
+        """Recorre un bloque en orden; devuelve las definiciones a la salida o None si no hay salida normal."""
+        for stmt in body:
+            env = self._visit_statement(stmt, scope, env)
+            if env is None:
+                return None
+        return env
+
+    def _visit_loop(self, stmt: ast.stmt, scope: str, env: Env) -> Optional[Env]:
+        # La entrada de cada iteración ve también las definiciones de iteraciones anteriores
+        entry = _merge([env, self._block_definitions([stmt], scope)])
+        if isinstance(stmt, (ast.For, ast.AsyncFor)):
+            deps = self._expr_deps(stmt.iter, scope, env)
+            body_env = dict(entry)
+            self._assign(stmt.target, deps, stmt, scope, body_env)
+        else:
+            self._expr_deps(stmt.test, scope, entry)
+            body_env = dict(entry)
+        after = _merge([entry, self._visit_block(stmt.body, scope, body_env)])
+        return self._visit_block(stmt.orelse, scope, after)
+
+    def _visit_try(self, stmt: ast.stmt, scope: str, env: Env) -> Optional[Env]:
+        body_exit = self._visit_block(stmt.body, scope, dict(env))
+        # Una excepción puede saltar desde cualquier punto del cuerpo
+        raised = _merge([env, self._block_definitions(stmt.body, scope)])
+        exits = [self._visit_block(stmt.orelse, scope, body_exit) if body_exit is not None else None]
+        for handler in stmt.handlers:
+            if handler.type is not None:
+                self._expr_deps(handler.type, scope, raised)
+            exits.append(self._visit_block(handler.body, scope, dict(raised)))
+        after = _merge(exits)
+        if not stmt.finalbody:
+            return after
+        final_exit = self._visit_block(stmt.finalbody, scope, _merge([after, raised]))
+        return final_exit if after is not None else None
+
+    def _visit_statement(self, stmt: ast.stmt, scope: str, env: Env) -> Optional[Env]:
+        env = dict(env)
+        self._envs[(stmt.lineno, stmt.col_offset)] = env.copy()
+
+        if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            for decorator in stmt.decorator_list:
+                self._expr_deps(decorator, scope, env)
+            return env
+
+        if isinstance(stmt, ast.Assign):
+            deps = self._expr_deps(stmt.value, scope, env)
+            for target in stmt.targets:
+                self._visit_target_subexpressions(target, scope, env)
+                self._assign(target, deps, stmt, scope, env)
+        elif isinstance(stmt, ast.AugAssign):
+            deps = self._expr_deps(stmt.value, scope, env)
+            self._visit_target_subexpressions(stmt.target, scope, env)
+            for node, _ in self._target_name_nodes(stmt.target):
+                lines = (stmt.lineno, stmt.end_lineno or stmt.lineno)
+                self._define(scope, node, deps, env, lines, weak=True)
+        elif isinstance(stmt, ast.AnnAssign):
+            if stmt.value is not None:
+                deps = self._expr_deps(stmt.value, scope, env)
+                self._assign(stmt.target, deps, stmt, scope, env)
+        elif isinstance(stmt, (ast.For, ast.AsyncFor, ast.While)):
+            return self._visit_loop(stmt, scope, env)
+        elif isinstance(stmt, ast.If):
+            self._expr_deps(stmt.test, scope, env)
+            return _merge([
+                self._visit_block(stmt.body, scope, dict(env)),
+                self._visit_block(stmt.orelse, scope, dict(env)),
+            ])
+        elif isinstance(stmt, (ast.With, ast.AsyncWith)):
+            for item in stmt.items:
+                deps = self._expr_deps(item.context_expr, scope, env)
+                if item.optional_vars is not None:
+                    self._assign(item.optional_vars, deps, stmt, scope, env)
+            return self._visit_block(stmt.body, scope, env)
+        elif isinstance(stmt, ast.Try) or type(stmt).__name__ == "TryStar":
+            return self._visit_try(stmt, scope, env)
+        elif isinstance(stmt, ast.Match):
+            self._expr_deps(stmt.subject, scope, env)
+            exits = [self._visit_block(case.body, scope, dict(env)) for case in stmt.cases]
+            return _merge(exits + [env])
+        elif isinstance(stmt, ast.Return):
+            if stmt.value is not None and scope in self._functions:
+                deps = self._expr_deps(stmt.value, scope, env)
+                self.graph.setdefault((scope, RETURN_VAR), set()).update(deps)
+            elif stmt.value is not None:
+                self._expr_deps(stmt.value, scope, env)
+        else:
+            # Resto de sentencias: solo interesan las llamadas y walrus que contengan
+            for field, value in ast.iter_fields(stmt):
+                if field in ("body", "orelse", "finalbody", "handlers", "cases"):
+                    continue
+                for node in value if isinstance(value, list) else [value]:
+                    if isinstance(node, ast.expr):
+                        self._expr_deps(node, scope, env)
+
+        return None if _terminates(stmt) else env
+
+    def _visit_target_subexpressions(self, target: ast.AST, scope: str, env: Env):
+        """Registra las llamadas dentro de índices de un target (p. ej. d[f(x)] = y)."""
+        for node in ast.walk(target):
+            if isinstance(node, ast.Subscript):
+                self._expr_deps(node.slice, scope, env)
+
+    def _expr_deps(self, expr: ast.AST, scope: str, env: Env) -> Set[Var]:
+        """Variables de las que depende el valor de una expresión; registra las llamadas encontradas."""
+        deps: Set[Var] = set()
+        stack = [expr]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, ast.Name):
+                if isinstance(node.ctx, ast.Load):
+                    deps.update(self._load(scope, node.id, env))
+            elif isinstance(node, ast.Call):
+                deps.update(self._visit_call(node, scope, env))
+            elif isinstance(node, ast.NamedExpr):
+                value_deps = self._expr_deps(node.value, scope, env)
+                self._define(scope, node.target, value_deps, env, (node.lineno, node.lineno))
+                deps.update(self._load(scope, node.target.id, env))
+            elif isinstance(node, ast.Lambda):
+                stack.append(node.body)
+            else:
+                stack.extend(ast.iter_child_nodes(node))
+        return deps
+
+    def _visit_call(self, node: ast.Call, scope: str, env: Env) -> Set[Var]:
+        arg_deps = [self._expr_deps(arg, scope, env) for arg in node.args]
+        keyword_deps = {kw.arg: self._expr_deps(kw.value, scope, env) for kw in node.keywords}
+        receiver_deps: Set[Var] = set()
+        if isinstance(node.func, ast.Attribute):
+            receiver_deps = self._expr_deps(node.func.value, scope, env)
+        elif not isinstance(node.func, ast.Name):
+            receiver_deps = self._expr_deps(node.func, scope, env)
+
+        callee = self._resolve_callee(node.func, scope)
+        resolved = resolve_call(node.func, self.aliases)
+        result: Optional[Var] = None
+        if callee is not None:
+            result = (scope, f"{callee.split('.')[-1]}()@{node.lineno}:{node.col_offset}")
+            self.graph.setdefault(result, set())
+            self.call_graph.setdefault(scope, set()).add(callee)
+            self._link_params(callee, node, arg_deps, keyword_deps)
+        elif default_catalog.match_call(resolved, "sanitizer") is not None:
+            result = (scope, f"{resolved}()@{node.lineno}:{node.col_offset}")
+            deps = set(receiver_deps)
+            for arg in arg_deps:
+                deps.update(arg)
+            for kw in keyword_deps.values():
+                deps.update(kw)
+            self.graph.setdefault(result, set()).update(deps)
+            self.sanitizer_calls[result] = resolved
+        else:
+            # Valor devuelto por código fuera del archivo: no se sabe de dónde viene
+            label = resolved or _call_name(node.func) or "<call>"
+            result = (scope, f"{label}()@{node.lineno}:{node.col_offset}")
+            deps = set(receiver_deps)
+            for arg in arg_deps:
+                deps.update(arg)
+            for kw in keyword_deps.values():
+                deps.update(kw)
+            self.graph.setdefault(result, set()).update(deps)
+            self.external_calls[result] = label
+
+        info = CallInfo(node, scope, _call_name(node.func), resolved, callee, arg_deps, keyword_deps, result)
+        self.call_sites.append(info)
+        end = node.end_lineno or node.lineno
+        for line in range(node.lineno, end + 1):
+            self.calls_by_line.setdefault(line, []).append(info)
+
+        return {result}
+
+    def _bound_params(self, callee: str, node: ast.Call) -> List[str]:
+        params = list(self._params.get(callee, []))
+        # Llamadas self.metodo(...): el primer parámetro es el receptor
+        if self._classes.get(callee) and isinstance(node.func, ast.Attribute) and params:
+            params = params[1:]
+        return params
+
+    def _link_params(self, callee: str, node: ast.Call, arg_deps: List[Set[Var]], keyword_deps: Dict[Optional[str], Set[Var]]):
+        params = self._bound_params(callee, node)
+        for position, deps in enumerate(arg_deps):
+            if isinstance(node.args[position], ast.Starred):
+                targets = params[position:]
+            else:
+                targets = params[position:position + 1]
+            for param in targets:
+                self.graph.setdefault((callee, param), set()).update(deps)
+        for name, deps in keyword_deps.items():
+            targets = params if name is None else [name] if name in params else []
+            for param in targets:
+                self.graph.setdefault((callee, param), set()).update(deps)
+
+    def _param_args(self, info: CallInfo, params: Set[str]) -> Set[Var]:
+        """Dependencias de los argumentos de una llamada ligados a los parámetros dados."""
+        bound = self._bound_params(info.callee, info.node)
+        deps: Set[Var] = set()
+        for position, arg in enumerate(info.arg_deps):
+            if isinstance(info.node.args[position], ast.Starred):
+                names = bound[position:]
+            else:
+                names = bound[position:position + 1]
+            if params.intersection(names):
+                deps.update(arg)
+        for name, arg in info.keyword_deps.items():
+            if name is None or name in params:
+                deps.update(arg)
+        return deps
+
+    def _compute_summaries(self):
+        """Resúmenes param -> return / sink por función, iterados hasta punto fijo."""
+        return_params: Dict[str, Set[str]] = {f: set() for f in self._functions}
+        sanitized_returns: Dict[str, Dict[str, Set[str]]] = {f: {} for f in self._functions}
+        local_calls = [info for info in self.call_sites if info.callee is not None]
+        sink_calls = [
+            (info, rule) for info in self.call_sites
+            for rule in [default_catalog.match_call(info.resolved, "sink")] if rule is not None
+        ]
+
+        for _ in range(len(self._functions) + 1):
+            for info in local_calls:
+                deps = self._param_args(info, return_params[info.callee])
+                # El saneado interno de la función se repite en el sitio de llamada
+                for sanitizer, params in sanitized_returns[info.callee].items():
+                    proxy = (info.scope, f"{info.result[1]}/{sanitizer}")
+                    self.graph[proxy] = self._param_args(info, params)
+                    self.sanitizer_calls[proxy] = sanitizer
+                    deps.add(proxy)
+                self.graph[info.result] = deps
+
+            changed = False
+            barriers = set(self.sanitizer_calls)
+            for function in self._functions:
+                crossed: Set[Var] = set()
+                reached = self._params_reaching(function, [(function, RETURN_VAR)], barriers, crossed)
+                through: Dict[str, Set[str]] = {}
+                for barrier in crossed:
+                    params = self._params_reaching(function, self.graph.get(barrier, ()))
+                    if params:
+                        through.setdefault(self.sanitizer_calls[barrier], set()).update(params)
+                if reached != return_params[function] or through != sanitized_returns[function]:
+                    return_params[function] = reached
+                    sanitized_returns[function] = through
+                    changed = True
+            if not changed:
+                break
+
+        for function in self._functions:
+            sink_deps: List[Var] = []
+            for info, rule in sink_calls:
+                if info.scope == function:
+                    sink_deps.extend(self.argument_deps(info, rule.arg, rule.keywords))
+            self.summaries[function] = FunctionSummary(
+                qualname=function,
+                params=self._params[function],
+                return_params=return_params[function],
+                sanitized_returns=sanitized_returns[function],
+                sink_params=self._params_reaching(function, sink_deps),
+            )
+
+    def _params_reaching(
+        self,
+        function: str,
+        start: Iterable[Var],
+        blocked: Set[Var] = frozenset(),
+        crossed: Optional[Set[Var]] = None,
+    ) -> Set[str]:
+        """
+        Parámetros de la función alcanzables desde start sin salir hacia los llamantes ni
+        atravesar los nodos bloqueados; los bloqueados encontrados se añaden a crossed.
+        """
+        params = set(self._params[function])
+        found: Set[str] = set()
+        seen: Set[Var] = set()
+        queue = deque(start)
+        while queue:
+            var = queue.popleft()
+            if var in seen:
+                continue
+            seen.add(var)
+            if var in blocked:
+                if crossed is not None:
+                    crossed.add(var)
+                continue
+            if var[0] == function and var[1] in params:
+                found.add(var[1])
+                continue
+            if var[1] in self._params.get(var[0], ()):
+                continue
+            queue.extend(self.graph.get(var, ()))
+        return found
+
+    # ------------------------------------------------------------------ consultas
+
+    def scope_at(self, line: int) -> str:
+        span = self.index.function_span(line)
+        return span.qualname if span else MODULE_SCOPE
+
+    def resolve(self, scope: str, name: str) -> Var:
+        """Variable del grafo a la que se refiere un nombre usado en el ámbito dado."""
+        return self._resolve(scope, name)
+
+    def reaching(self, name: str, line: int) -> Set[Var]:
+        """Definiciones de name que alcanzan la sentencia de la línea (todas si no se conoce)."""
+        scope = self.scope_at(line)
+        statement = self.index.statement_at(line)
+        env = self._envs.get((statement.lineno, statement.col_offset), {}) if statement is not None else {}
+        return self._load(scope, name, env)
+
+    def calls_at(self, line: int) -> List[CallInfo]:
+        """Llamadas que empiezan en la línea o, si no hay, la más interna que la abarca."""
+        calls = self.calls_by_line.get(line, [])
+        exact = [c for c in calls if c.node.lineno == line]
+        if exact or not calls:
+            return exact
+        return [min(calls, key=lambda c: (c.node.end_lineno or c.node.lineno) - c.node.lineno)]
+
+    @staticmethod
+    def argument_deps(info: CallInfo, position: Optional[int], keywords: Iterable[str] = ()) -> Set[Var]:
+        """Dependencias del argumento en la posición o keyword indicados (todos si position es None)."""
+        if position is None:
+            deps: Set[Var] = set()
+            for arg in info.arg_deps:
+                deps.update(arg)
+            for arg in info.keyword_deps.values():
+                deps.update(arg)
+            return deps
+
+        if position < len(info.arg_deps):
+            return set(info.arg_deps[position])
+        for keyword in keywords:
+            if keyword in info.keyword_deps:
+                return set(info.keyword_deps[keyword])
+        return set()
+
+    def flows(self, starts: Iterable[Var], seeds: Iterable[Var], blocked: Iterable[Var] = ()) -> List[Var]:
+        """
+        Camino seed -> start que no atraviesa los nodos bloqueados (p. ej. sanitizers).
+        Sin bloqueos se responde con el índice de alcanzabilidad.
+        """
+        starts, seeds, blocked = set(starts), set(seeds), set(blocked)
+        if not blocked:
+            return self.reachability.shortest_path(starts, seeds) if self.reachability else []
+
+        parents: Dict[Var, Optional[Var]] = {v: None for v in starts if v not in blocked}
+        queue = deque(parents)
+        while queue:
+            var = queue.popleft()
+            if var in seeds:
+                path = []
+                current: Optional[Var] = var
+                while current is not None:
+                    path.append(current)
+                    current = parents[current]
+                return path
+            for dep in self.graph.get(var, ()):
+                if dep not in parents and dep not in blocked:
+                    parents[dep] = var
+                    queue.append(dep)
+        return []
+
+    def seeds_at(self, line: int) -> Set[Var]:
+        """
+        Variables taint en la línea del source: definiciones o, en su defecto, variables
+        usadas y resultados de llamadas externas (p. ej. input()) de la línea.
+        """
+        seeds = set(self.defs_by_line.get(line, set()))
+        if seeds:
+            return seeds
+
+        for info in self.calls_by_line.get(line, []):
+            if info.node.lineno == line and info.result in self.external_calls:
+                seeds.add(info.result)
+
+        statement = self.index.statement_at(line)
+        if statement is None:
+            return seeds
+        for node in ast.walk(statement):
+            if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and node.lineno == line:
+                seeds.update(self.reaching(node.id, line))
+        return seeds
+
+    def sink_variables_at(self, line: int) -> Set[Var]:
+        """Variables usadas como argumento de las llamadas en la línea del sink."""
+        sink_vars: Set[Var] = set()
+        for info in self.calls_at(line):
+            sink_vars.update(self.argument_deps(info, None))
+        return sink_vars
+
+    def query(self, source_line: int, sink_line: int) -> TaintResult:
+        """Consulta source -> sink sobre el grafo precalculado (memorizada)."""
+        key = (source_line, sink_line)
+        with self._lock:
+            cached = self._queries.get(key)
+        if cached is not None:
+            return cached
+
+        seeds = self.seeds_at(source_line)
+        sink_vars = self.sink_variables_at(sink_line)
+        path = self.reachability.shortest_path(sink_vars, seeds) if self.reachability else []
+
+        result = TaintResult(
+            data_flow_detected=bool(path),
+            path=self.display_path(path, sink_line),
+            seeds=sorted({self.display_name(v, sink_line) for v in seeds}),
+            sink_variables=sorted({self.display_name(v, sink_line) for v in sink_vars}),
+        )
+        with self._lock:
+            self._queries[key] = result
+        return result
+
+    def origins(self, name: str, line: int) -> Set[Var]:
+        """
+        Primeras definiciones de name en el ámbito de la línea: la entrada del parámetro y
+        las asignaciones que no derivan de otra versión del mismo nombre (p. ej. no
+        `name = shlex.quote(name)`). Un nombre de otro ámbito devuelve su nodo agregado.
+        """
+        scope = self.scope_at(line)
+        var = self._resolve(scope, name)
+        aggregate = self._aggregate(var)
+        if var[0] != scope:
+            return {aggregate}
+        candidates = {
+            v for v in self.graph.get(aggregate, ())
+            if v[0] == scope and (v == var or v[1].split("#", 1)[0] == name)
+        }
+        if not candidates or self.reachability is None:
+            return {aggregate}
+        first = {
+            v for v in candidates
+            if not self.reachability.depends_on(v, [other for other in candidates if other != v])
+        }
+        return first or candidates
+
+    def display_name(self, var: Var, line: int) -> str:
+        scope, name = var
+        name = name.split("#", 1)[0]
+        span = self.index.function_span(line)
+        current = span.qualname if span else MODULE_SCOPE
+        if scope == current or scope == MODULE_SCOPE:
+            return name
+        return f"{scope}:{name}"
+
+    def display_path(self, path: Iterable[Var], line: int) -> List[str]:
+        """Nombres legibles de un camino; las versiones consecutivas de una variable se muestran una vez."""
+        names: List[str] = []
+        for var in path:
+            name = self.display_name(var, line)
+            if not names or names[-1] != name:
+                names.append(name)
+        return names
+
+
+def get_taint_engine(path: str) -> TaintEngine:
+    """Devuelve el motor de taint del archivo, construido una vez por versión del SourceIndex."""
+    return get_source_index(path).derived("taint_engine", TaintEngine)
@@ -1,12 +1,20 @@
 from pydantic import BaseModel, Field
-from typing import List
+from typing import List, Optional
 import ast
-import textwrap
 from typing import Set, Dict, Any
 
+from tools.reachability import ReachabilityIndex
+from tools.source_index import get_source_index, parse_snippet
+from tools.taint_engine import get_taint_engine
+
 
 class TaintTraceInput(BaseModel):
-    snippet: str = Field(..., description="Bloque de código a analizar")
+    snippet: str = Field("", description="Bloque de código a analizar")
+    file_path: Optional[str] = Field(
+        None,
+        description="Ruta del archivo fuente. Si se indica, se usa el motor de taint inter-procedural "
+                    "del archivo completo con números de línea absolutos (el snippet se ignora).",
+    )
     source_line: int = Field(..., description="Línea del source")
     sink_line: int = Field(..., description="Línea del sink")
 
@@ -67,15 +75,44 @@ class DependencyTracker(ast.NodeVisitor):
         self.generic_visit(node)
 
 
+def _trace_file(input_data: TaintTraceInput) -> TaintTraceOutput:
+    """Responde la consulta source -> sink con el motor de taint del archivo completo."""
+    index = get_source_index(input_data.file_path)
+    if index.tree is None:
+        return TaintTraceOutput(
+            data_flow_detected=False,
+            flow_variables=[],
+            explanation=f"Error de sintaxis al parsear {input_data.file_path}: {index.syntax_error}"
+        )
+
+    result = get_taint_engine(input_data.file_path).query(input_data.source_line, input_data.sink_line)
+
+    if result.data_flow_detected:
+        explanation = f"Flujo detectado (análisis inter-procedural del archivo): {' -> '.join(result.path)}."
+    elif not result.seeds:
+        explanation = f"No se identificaron variables taint en la línea {input_data.source_line}."
+    elif not result.sink_variables:
+        explanation = f"No se identificaron variables en llamadas de la línea {input_data.sink_line}."
+    else:
+        explanation = f"No hay flujo de datos entre source {result.seeds} y sink {result.sink_variables}."
+
+    return TaintTraceOutput(
+        data_flow_detected=result.data_flow_detected,
+        flow_variables=result.path,
+        explanation=explanation
+    )
+
+
 def taint_trace_tool(input_data: TaintTraceInput) -> TaintTraceOutput:
     """
     Herramienta de análisis de flujo de Taint utilizando AST.
     """
-    cleaned_snippet = textwrap.dedent(input_data.snippet)
-    
-    try:
-        tree = ast.parse(cleaned_snippet)
-    except SyntaxError:
+    if input_data.file_path:
+        return _trace_file(input_data)
+
+    tree = parse_snippet(input_data.snippet)
+
+    if tree is None:
         return TaintTraceOutput(
             data_flow_detected=False,
             flow_variables=[],
@@ -85,35 +122,21 @@ def taint_trace_tool(input_data: TaintTraceInput) -> TaintTraceOutput:
     tracker = DependencyTracker(input_data.source_line, input_data.sink_line)
     tracker.visit(tree)
     
-    reachable_flow = []
-    data_flow_detected = False
-    
     graph = tracker.dependencies
-    
-    def get_tainted_deps(var_name, visited=None):
-        if visited is None: visited = set()
-        if var_name in visited: return set()
-        visited.add(var_name)
-        
-        deps = set()
-        if var_name in graph:
-            for dep in graph[var_name]:
-                deps.add(dep)
-                deps.update(get_tainted_deps(dep, visited))
-        return deps
+    reachability = ReachabilityIndex(graph)
 
+    data_flow_detected = False
     matched_vars = []
-    
-    for sink_var in tracker.sink_candidates:
-        all_deps = get_tainted_deps(sink_var)
-        intersection = all_deps.intersection(tracker.tainted_seeds)
-        
-        if sink_var in tracker.tainted_seeds:
-            intersection.add(sink_var)
-            
+    flow_path: List[str] = []
+
+    for sink_var in sorted(tracker.sink_candidates):
+        intersection = reachability.dependencies(sink_var) & tracker.tainted_seeds
         if intersection:
             data_flow_detected = True
             matched_vars.append(f"{sink_var} (depende de {intersection})")
+
+    if data_flow_detected:
+        flow_path = reachability.shortest_path(tracker.sink_candidates, tracker.tainted_seeds)
             
     explanation = ""
     if data_flow_detected:
@@ -128,6 +151,6 @@ def taint_trace_tool(input_data: TaintTraceInput) -> TaintTraceOutput:
 
     return TaintTraceOutput(
         data_flow_detected=data_flow_detected,
-        flow_variables=list(graph.keys()),
+        flow_variables=flow_path,
         explanation=explanation
     )